@@ -1,61 +1,334 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import pandas as pd
 from datetime import datetime
+import argparse
 import os
-import json
+import queue
+import threading
+from trade_journal import TradeJournal, JournalWriter
+from position_sizing import calculate_position_size
+from exposure import ExposureBook, load_limits
+from recompute import calculator_graph, FRAME_MS
+from watchlist import Watchlist, DebouncedSaver, DEFAULT_CATEGORY
+from journal_analytics import JournalStats
+from contract_specs import ContractSpecFile
+from leverage_rules import shared_rules
+
+# How often to pick up trades saved or closed by other calculators on the same journal
+JOURNAL_SYNC_MS = 5000
 
 class PositionSizeCalculator:
-    def __init__(self, root):
+    def __init__(self, root, price_feed=None, metrics=None, metrics_file=None, account=None):
         self.root = root
+        self.metrics = metrics
+        self.metrics_file = metrics_file
+        if metrics is not None:
+            self.start_metrics()
+        
         self.root.title("Advanced Position Size Calculator")
-        self.root.geometry("500x650")  # Made taller for watchlist management
+        self.root.geometry("500x865")  # Made taller for watchlist management, journal status, portfolio totals, order and VaR
         self.root.resizable(False, False)
         
         # Initialize files
         self.excel_file = 'trade_journal.xlsx'
+        self.journal_db = 'trade_journal.db'
         self.watchlist_file = 'watchlist.json'
+        self.limits_file = 'portfolio_limits.json'
+        self.stats_file = 'trade_journal.stats.json'
+        self.specs_file = 'contract_specs.json'
+        self.contract_specs = ContractSpecFile(self.specs_file)
+        # Leverage tiers and input limits, per account and symbol; the same compiled
+        # rules position_sizing uses
+        self.rules_file = 'leverage_rules.json'
+        self.leverage_rules = shared_rules(self.rules_file)
+        self.account = account
+        self.ohlcv_dir = 'ohlcv'
+        self.portfolio_risk = None
+        self.portfolio_risk_error = None
         self.initialize_journal()
         self.load_watchlist()
+        self.watchlist_saver = DebouncedSaver(self.root, self.save_watchlist)
         
-        self.setup_icon()
         self.create_widgets()
         self.setup_layout()
         self.setup_validation()
+        self.root.after(2000, self.check_rule_files)
+        
+        # The icon needs PIL, so load it once the window is up
+        self.root.after_idle(self.setup_icon)
+        self.root.after_idle(self.start_portfolio_risk)
+        
+        # Pick up journal write results and flush pending trades on exit
+        self.root.after(100, self.poll_journal_writer)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Live P&L of open trades, only when started with a price feed
+        self.feed_runner = None
+        if price_feed is not None:
+            self.start_price_feed(price_feed)
         
     def initialize_journal(self):
-        # Create Excel file if it doesn't exist
-        if not os.path.exists(self.excel_file):
-            df = pd.DataFrame(columns=[
-                'Date', 'Symbol', 'Direction', 'Entry Price', 'Position Size',
-                'Stop Loss', 'Risk Amount', 'Leverage', 'Status',
-                'Exit Price', 'Profit/Loss', 'Notes'
+        # Trades live in SQLite; an existing Excel journal is migrated on first start
+        # The writer thread opens the journal, so a migration never delays the window
+        self.journal = TradeJournal(self.journal_db, self.excel_file)
+        if self.metrics is not None:
+            self.metrics.instrument(self.journal, 'journal', [
+                'initialize', 'append_many', 'contains', 'count', 'max_id', 'open_trades', 'close_trade',
+                'export_excel'
             ])
-            df.to_excel(self.excel_file, index=False)
+            self.journal.write_lock.metrics = self.metrics
+        self.journal_cache = None
+        self.journal_writer = JournalWriter(
+            self.journal, on_ready=self.load_journal_state, on_change=self.sync_journal_state
+        )
+        
+        # Open trades by id, their totals and performance stats, filled in once the writer has opened the journal
+        self.open_trades = {}
+        self.open_trades_window = None
+        self.journal_snapshot = None
+        self.journal_viewer = None
+        self.exporting = False
+        self.exposure = ExposureBook()
+        self.exposure_ready = False
+        self.stats = None
+        self.portfolio_limits = load_limits(self.limits_file)
     
-    def load_watchlist(self):
-        # Default watchlist with trading pairs
-        self.symbols = [
-            "BTCUSDT", "ETHUSDT", "SUIUSDT", "SEIUSDT", "INJUSDT",
-            "AEVOUSDT", "PYTHUSDT", "BNBUSDT", "APTUSDT",
-            "ZKUSDT", "ZROUSDT",
-            "BSUSDT", "WUSDT", "TIAUSDT", "JUPUSDT"
-        ]
+    def load_journal_state(self):
+        # Runs on the writer thread, so neither numpy nor the reading delays the window
+        from journal_cache import JournalCache
         
-        if os.path.exists(self.watchlist_file):
-            with open(self.watchlist_file, 'r') as f:
-                data = json.load(f)
-                self.symbols = data.get("Symbols", self.symbols)
-        else:
-            self.save_watchlist()
+        self.journal_cache = JournalCache(self.journal)
+        if self.metrics is not None:
+            self.metrics.instrument(self.journal_cache, 'cache', ['open', 'refresh', 'trades'])
+            self.journal_cache.lock.metrics = self.metrics
+        self.journal_cache.open()
+        return {
+            'open_trades': self.journal_cache.trades(self.journal_cache.open_mask()),
+            'stats': JournalStats.load(self.stats_file, self.journal_cache),
+            'snapshot': self.journal_cache.snapshot()
+        }
+    
+    def sync_journal_state(self):
+        # Writer thread, after our own writes and every few seconds: brings the
+        # cache up to date and returns new trades and closes from every calculator
+        # sharing the journal, so all of them show the same totals, plus a
+        # snapshot of the cache for the journal viewer
+        changes = self.journal_cache.refresh()
+        if changes is None:
+            return None
+        return changes + (self.journal_cache.snapshot(),)
+    
+    def request_journal_sync(self):
+        self.journal_writer.request_sync()
+        self.root.after(JOURNAL_SYNC_MS, self.request_journal_sync)
+    
+    def poll_journal_writer(self):
+        # Re-armed even when a handler fails, so one bad event never stops saves and syncs
+        try:
+            while True:
+                try:
+                    event, payload = self.journal_writer.results.get_nowait()
+                except queue.Empty:
+                    break
+                if event == 'ready':
+                    self.open_trades = {trade['id']: trade for trade in payload['open_trades']}
+                    self.refresh_open_trades()
+                    self.exposure.load(payload['open_trades'])
+                    self.exposure_ready = True
+                    if self.feed_runner:
+                        for trade in payload['open_trades']:
+                            self.feed_runner.add_trade(trade)
+                    self.stats = payload['stats']
+                    self.journal_snapshot = payload['snapshot']
+                    self.root.after(JOURNAL_SYNC_MS, self.request_journal_sync)
+                    if self.metrics is not None:
+                        self.metrics.instrument(self.stats, 'stats', ['save'])
+                    self.stats.save(self.stats_file)
+                    self.refresh_stats()
+                elif event == 'synced':
+                    new_trades, updates, self.journal_snapshot = payload
+                    self.apply_journal_changes(new_trades, updates)
+                    if self.journal_viewer is not None:
+                        self.journal_viewer.set_snapshot(self.journal_snapshot)
+                elif event == 'saved':
+                    count = len(payload)
+                    self.journal_status.config(
+                        text=f"Saved {count} trade{'s' if count > 1 else ''} to journal",
+                        style='Suggestion.TLabel'
+                    )
+                elif event == 'closed':
+                    seq, trade = payload
+                    pnl = trade['Profit/Loss']
+                    self.journal_status.config(
+                        text=f"Closed {trade['Symbol']} #{trade['id']} at {trade['Exit Price']:g}"
+                             + (f", P/L ${pnl:,.2f}" if pnl is not None else ""),
+                        style='Suggestion.TLabel'
+                    )
+                elif event == 'error':
+                    trades, error = payload
+                    if trades:
+                        text = f"Failed to save {len(trades)} trade{'s' if len(trades) > 1 else ''}: {error}"
+                    else:
+                        text = f"Journal error: {error}"
+                    self.journal_status.config(text=text, style='Warning.TLabel')
+        finally:
+            self.root.after(100, self.poll_journal_writer)
+    
+    def apply_journal_changes(self, new_trades, updates):
+        # Trades arrive in their current state, so one logged and already
+        # closed elsewhere never shows up as open here
+        for trade in new_trades:
+            if trade['Status'] == 'OPEN':
+                self.open_trades[trade['id']] = trade
+                self.add_open_trade_row(trade)
+                self.exposure.add_trade(trade)
+                if self.feed_runner:
+                    self.feed_runner.add_trade(trade)
+        for seq, trade in updates:
+            if self.open_trades.pop(trade['id'], None) is not None:
+                self.exposure.close_trade(trade['id'])
+                if self.feed_runner:
+                    self.feed_runner.remove_trade(trade['id'])
+                if self.open_trades_window is not None and self.open_trades_tree.exists(str(trade['id'])):
+                    self.open_trades_tree.delete(str(trade['id']))
+        self.stats.catch_up(new_trades, updates)
+        self.stats.save(self.stats_file)
+        self.refresh_stats()
+    
+    def refresh_stats(self, *args):
+        if self.stats is None:
+            return
+        summary = self.stats.summary()
+        if not summary['trades']:
+            self.stats_label.config(text=f"Performance: no closed trades yet ({summary['logged']} logged)")
+            return
+        
+        parts = [f"Win {summary['win_rate']*100:.1f}%"]
+        if summary['average_r'] is not None:
+            parts.append(f"Avg {summary['average_r']:.2f}R")
+        parts.append(f"Exp ${summary['expectancy']:,.2f}")
+        parts.append(f"PF {format_profit_factor(summary['profit_factor'])}")
+        parts.append(f"Max DD ${summary['max_drawdown']:,.2f}")
+        text = f"Performance ({summary['trades']} closed): " + " | ".join(parts)
+        
+        symbol = self.symbol_combo.get()
+        by_symbol = self.stats.symbol_summary(symbol)
+        if symbol and by_symbol['trades']:
+            text += (
+                f"\n{symbol}: {by_symbol['trades']} closed, Win {by_symbol['win_rate']*100:.1f}%, "
+                f"P/L ${by_symbol['total_pnl']:,.2f}"
+            )
+        self.stats_label.config(text=text)
+    
+    def start_price_feed(self, feed):
+        # asyncio is slow to import, so only load the feed code when it's used
+        from price_feed import TkBridge, FeedRunner
+        
+        self.live_marks = {}
+        self.feed_error = None
+        self.mtm_label = ttk.Label(self.journal_frame, text="Open P/L: waiting for prices...")
+        self.mtm_label.grid(row=7, column=0, columnspan=3, sticky="w", padx=5, pady=(0, 5))
+        self.root.geometry("500x895")
+        
+        bridge = TkBridge(self.root, self.show_marks)
+        self.feed_runner = FeedRunner(feed, bridge, self.watchlist)
+        self.feed_runner.start()
+    
+    def show_marks(self, updates):
+        # Called at most a few times a second with the latest mark per trade
+        if 'error' in updates:
+            self.feed_error = updates.pop('error')
+        total = updates.pop('total', None)
+        for trade_id, mark in updates.items():
+            if mark is None:
+                self.live_marks.pop(trade_id, None)
+            else:
+                self.live_marks[trade_id] = mark
+        if self.feed_error is not None:
+            self.mtm_label.config(text=f"Price feed stopped: {self.feed_error}", style='Warning.TLabel')
+            return
+        if not self.live_marks:
+            self.mtm_label.config(text="Open P/L: no open trades marked", style='TLabel')
+            return
+        if total is None:
+            # Marks without a total would show a stale sum
+            self.mtm_label.config(text="Open P/L: waiting for prices...", style='TLabel')
+            return
+        
+        closest = min(self.live_marks.values(), key=lambda m: m['stop_distance'])
+        self.mtm_label.config(
+            text=f"Open P/L: ${total:,.2f} ({len(self.live_marks)} marked) | "
+                 f"Closest to stop: {closest['symbol']} {closest['stop_distance']:.2f}%",
+            style='TLabel'
+        )
+    
+    def start_metrics(self):
+        # Time every callback, input trace, file operation and calculation on this instance only,
+        # so a calculator started without metrics runs the plain methods
+        from instrumentation import LagProbe
+        
+        self.metrics.instrument(self, 'ui', [
+            'load_watchlist', 'save_watchlist', 'setup_icon', 'validate_fields', 'validate_entry',
+            'calculate_position', 'show_results', 'show_portfolio_effect', 'show_portfolio_var', 'recompute',
+            'show_leverage_suggestion', 'show_order', 'save_trade', 'view_journal', 'export_journal',
+            'update_symbol_list', 'filter_symbols', 'add_to_watchlist', 'remove_from_watchlist', 'show_open_trades',
+            'close_selected_trade', 'apply_journal_changes', 'poll_journal_writer', 'refresh_stats', 'show_marks',
+            'input_changed', 'direction_changed', 'check_rule_files'
+        ])
+        LagProbe(self.root, self.metrics)
+        if self.metrics_file:
+            self.root.after(10000, self.write_metrics)
+    
+    def write_metrics(self):
+        try:
+            self.metrics.write_json(self.metrics_file)
+        except OSError:
+            pass
+        self.root.after(10000, self.write_metrics)
+    
+    def on_close(self):
+        # Make sure every saved trade is on disk before the window goes away
+        if self.feed_runner:
+            self.feed_runner.stop()
+        self.watchlist_saver.flush()
+        if self.portfolio_risk is not None:
+            self.portfolio_risk.stop()
+        self.journal_writer.close()
+        if self.metrics is not None and self.metrics_file:
+            self.metrics.write_json(self.metrics_file)
+        self.root.destroy()
+    
+    def start_portfolio_risk(self):
+        # Price history is read on its own thread; until it is ready the
+        # results just say so. Only used when there is an ohlcv directory
+        if os.path.isdir(self.ohlcv_dir):
+            exposed = [s for s in self.exposure.by_symbol if self.exposure.net_exposure(s)]
+            threading.Thread(target=self.load_portfolio_risk, args=(list(self.watchlist), exposed),
+                             name='portfolio-risk-load', daemon=True).start()
+    
+    def load_portfolio_risk(self, symbols, exposed):
+        from portfolio_var import PortfolioRisk
+        
+        try:
+            risk = PortfolioRisk(self.ohlcv_dir, symbols, exposed=exposed).start()
+        except Exception as e:
+            self.portfolio_risk_error = e
+            return
+        old, self.portfolio_risk = self.portfolio_risk, risk
+        self.portfolio_risk_error = None
+        if old is not None:
+            old.stop()
+    
+    def load_watchlist(self):
+        # Creates the file with the default pairs on first start
+        self.watchlist = Watchlist.load(self.watchlist_file)
     
     def save_watchlist(self):
-        with open(self.watchlist_file, 'w') as f:
-            json.dump({"Symbols": self.symbols}, f, indent=4)
+        self.watchlist.save(self.watchlist_file)
     
     def setup_icon(self):
         try:
+            from PIL import Image, ImageTk
             img = Image.open('calculator.png')
             photo = ImageTk.PhotoImage(img)
             self.root.iconphoto(False, photo)
@@ -136,6 +409,17 @@ class PositionSizeCalculator:
             text="View Journal",
             command=self.view_journal
         )
+        self.close_trade_btn = ttk.Button(
+            self.journal_frame,
+            text="Close Trade",
+            command=self.show_open_trades
+        )
+        
+        # Save status, filled in by the journal writer
+        self.journal_status = ttk.Label(self.journal_frame, text="")
+        
+        # Running performance stats over closed trades
+        self.stats_label = ttk.Label(self.journal_frame, text="Performance: loading journal...")
         
         # Add/Remove Symbol buttons
         self.new_symbol_label = ttk.Label(self.root, text="Add New Symbol:")
@@ -156,6 +440,10 @@ class PositionSizeCalculator:
         self.position_size_label = ttk.Label(self.result_frame, text="Position Size: ")
         self.risk_amount_label = ttk.Label(self.result_frame, text="Risk Amount: ")
         self.margin_required_label = ttk.Label(self.result_frame, text="Margin Required: ")
+        self.order_label = ttk.Label(self.result_frame, text="Order Quantity: ")
+        self.portfolio_label = ttk.Label(self.result_frame, text="Portfolio With Trade: ")
+        self.var_label = ttk.Label(self.result_frame, text="")
+        self.portfolio_warning = ttk.Label(self.result_frame, text="", style='Warning.TLabel')
         
         # Message Frame
         self.message_frame = ttk.LabelFrame(self.root, text="Messages")
@@ -179,8 +467,14 @@ class PositionSizeCalculator:
         
         # Symbol selection
         self.symbol_label = ttk.Label(self.watchlist_frame, text="Symbol:")
-        self.symbol_combo = ttk.Combobox(
+        self.symbol_combo = ttk.Combobox(self.watchlist_frame)
+        
+        # Category filter
+        self.category_label = ttk.Label(self.watchlist_frame, text="Category:")
+        self.category_var = tk.StringVar(value="All")
+        self.category_combo = ttk.Combobox(
             self.watchlist_frame,
+            textvariable=self.category_var,
             state="readonly"
         )
         
@@ -226,6 +520,10 @@ class PositionSizeCalculator:
         self.position_size_label.pack(anchor="w", padx=5, pady=2)
         self.risk_amount_label.pack(anchor="w", padx=5, pady=2)
         self.margin_required_label.pack(anchor="w", padx=5, pady=2)
+        self.order_label.pack(anchor="w", padx=5, pady=2)
+        self.portfolio_label.pack(anchor="w", padx=5, pady=2)
+        self.var_label.pack(anchor="w", padx=5, pady=2)
+        self.portfolio_warning.pack(anchor="w", padx=5, pady=2)
         
         # Symbol Management
         self.new_symbol_label.grid(row=6, column=0, sticky="e", padx=5, pady=2)
@@ -239,10 +537,16 @@ class PositionSizeCalculator:
         self.symbol_label.grid(row=0, column=0, sticky="e", padx=5, pady=2)
         self.symbol_combo.grid(row=0, column=1, sticky="ew", padx=5, pady=2)
         self.remove_symbol_btn.grid(row=0, column=2, padx=5, pady=2)
+        self.category_label.grid(row=1, column=0, sticky="e", padx=5, pady=2)
+        self.category_combo.grid(row=1, column=1, sticky="ew", padx=5, pady=2)
         
         # Update symbol list
         self.update_symbol_list()
         
+        # Type-ahead: narrow the dropdown to symbols starting with what's typed
+        self.symbol_combo.bind('<KeyRelease>', self.filter_symbols)
+        self.category_combo.bind('<<ComboboxSelected>>', lambda e: self.update_symbol_list())
+        
         # Direction
         self.direction_frame.grid(row=1, column=1, sticky="ew", padx=5, pady=2)
         self.long_radio.pack(side=tk.LEFT, padx=10)
@@ -259,6 +563,10 @@ class PositionSizeCalculator:
         # Journal Buttons
         self.save_trade_btn.grid(row=4, column=0, padx=5, pady=10)
         self.view_journal_btn.grid(row=4, column=1, padx=5, pady=10)
+        self.close_trade_btn.grid(row=4, column=2, padx=5, pady=10)
+        self.journal_status.grid(row=5, column=0, columnspan=3, sticky="w", padx=5, pady=(0, 5))
+        self.stats_label.grid(row=6, column=0, columnspan=3, sticky="w", padx=5, pady=(0, 5))
+        self.symbol_combo.bind('<<ComboboxSelected>>', self.refresh_stats)
         
         # Watchlist Management Frame
         self.watchlist_frame.grid(row=8, column=0, columnspan=3, sticky="ew", padx=10, pady=5)
@@ -278,85 +586,147 @@ class PositionSizeCalculator:
         self.root.grid_columnconfigure(1, weight=1)
     
     def setup_validation(self):
+        # Limits are looked up when an entry is checked, so rule file edits apply at once
         validation = {
-            self.risk_entry: (0.01, 5, "Risk should be 0.01-5%"),
-            self.capital_entry: (0.01, float('inf'), "Capital must be positive"),
-            self.stop_loss_entry: (0.01, 4, "Stop loss must be 0.01-4%"),
-            self.leverage_entry: (1, 10, "Leverage must be between 1-10x")
+            self.risk_entry: 'Risk',
+            self.capital_entry: 'Capital',
+            self.stop_loss_entry: 'Stop Loss',
+            self.leverage_entry: 'Leverage'
         }
         
         # Set default risk to 3%
         self.risk_entry.insert(0, "3")
         
-        for entry, (min_val, max_val, warning_text) in validation.items():
+        for entry, limit in validation.items():
             validate_cmd = (self.root.register(
-                lambda val, min=min_val, max=max_val, text=warning_text, e=entry: 
-                self.validate_entry(e, val, min, max, text)
+                lambda val, limit=limit, e=entry: self.validate_entry(e, val, limit)
             ), '%P')
             entry.configure(validate='focusout', validatecommand=validate_cmd)
         
-        # Add trace to stop loss entry to suggest leverage
-        self.stop_loss_var = tk.StringVar()
-        self.stop_loss_entry.config(textvariable=self.stop_loss_var)
-        self.stop_loss_var.trace_add('write', self.suggest_leverage)
+        # Keystrokes only update the input graph; one recompute runs per frame
+        self.inputs = calculator_graph()
+        self.recompute_pending = False
+        self.input_vars = {}
+        for name, entry in [('risk', self.risk_entry), ('capital', self.capital_entry),
+                            ('stop_loss', self.stop_loss_entry), ('leverage', self.leverage_entry),
+                            ('entry_price', self.entry_price_entry), ('symbol', self.symbol_combo)]:
+            var = tk.StringVar(value=entry.get())
+            entry.config(textvariable=var)
+            var.trace_add('write', lambda *args, name=name: self.input_changed(name))
+            self.input_vars[name] = var
+            self.inputs.set(name + '_text', var.get())
+        self.direction_var.trace_add('write', lambda *args: self.direction_changed())
+        self.inputs.set('direction', self.direction_var.get())
+        self.inputs.set('specs', self.contract_specs.current())
+        self.inputs.set('rules', self.leverage_rules.current())
+        self.inputs.set('account', self.account)
+        self.schedule_recompute()
+    
+    def input_changed(self, name):
+        if self.inputs.set(name + '_text', self.input_vars[name].get()):
+            self.schedule_recompute()
+    
+    def direction_changed(self):
+        if self.inputs.set('direction', self.direction_var.get()):
+            self.schedule_recompute()
+    
+    def check_rule_files(self):
+        # Edits to the spec and leverage rule files apply without a restart
+        specs_changed = self.inputs.set('specs', self.contract_specs.current())
+        if self.inputs.set('rules', self.leverage_rules.current()) or specs_changed:
+            self.schedule_recompute()
+        self.root.after(2000, self.check_rule_files)
+    
+    def schedule_recompute(self):
+        if not self.recompute_pending:
+            self.recompute_pending = True
+            self.root.after(FRAME_MS, self.recompute)
+    
+    def recompute(self):
+        self.recompute_pending = False
+        changed = self.inputs.flush()
+        
+        # Fill in leverage only when the suggestion itself moves, so a leverage
+        # typed by hand stays put while the stop loss stays in the same tier.
+        # The graph gets the value first, so the entry's trace sees no change
+        suggested = self.inputs.get('suggested_leverage')
+        if 'suggested_leverage' in changed and suggested is not None:
+            text = f"{suggested:g}"
+            self.inputs.set('leverage_text', text)
+            self.input_vars['leverage'].set(text)
+            changed |= self.inputs.flush()
         
-        # Also trace changes to leverage entry to update suggestion message
-        self.leverage_var = tk.StringVar()
-        self.leverage_entry.config(textvariable=self.leverage_var)
-        self.leverage_var.trace_add('write', self.check_leverage_against_suggestion)
+        if changed & {'suggested_leverage', 'stop_loss', 'leverage'}:
+            self.show_leverage_suggestion()
+        if 'position' in changed:
+            position = self.inputs.get('position')
+            if position is None:
+                self.clear_results()
+            else:
+                self.show_results(self.inputs.get('capital'), self.inputs.get('risk'),
+                                  self.inputs.get('leverage'), *position)
+        if changed & {'order', 'position', 'leverage'}:
+            self.show_order()
     
-    def suggest_leverage(self, *args):
-        try:
-            stop_loss = float(self.stop_loss_var.get())
-            
-            # Get suggested leverage based on stop loss
-            if stop_loss <= 1:
-                suggested = "10"
-            elif 1 < stop_loss <= 2.5:
-                suggested = "8"
-            elif 2.5 < stop_loss <= 3:
-                suggested = "6"
-            elif 3 < stop_loss <= 4:
-                suggested = "5"
+    def show_order(self):
+        # The sized position as an order the exchange accepts, rounded down to
+        # the lot step so it stays within the risk budget
+        order = self.inputs.get('order')
+        symbol = self.inputs.get('symbol')
+        style = 'TLabel'
+        if self.inputs.get('position') is None:
+            text = "Order Quantity: "
+        elif order is None:
+            if symbol and symbol not in self.inputs.get('specs'):
+                text = f"Order Quantity: no contract spec for {symbol}"
             else:
-                self.leverage_suggestion.config(text="")
-                return
-            
-            # Update leverage entry and message
-            current_leverage = self.leverage_entry.get().strip()
-            
-            # If current leverage is empty or different from suggestion, update it
-            if not current_leverage or float(current_leverage) != float(suggested):
-                self.leverage_entry.delete(0, tk.END)
-                self.leverage_entry.insert(0, suggested)
-            
-            # Always update the suggestion message
-            self.leverage_suggestion.config(
-                text=f"Suggested Leverage For {stop_loss:.1f}% Stop Loss: {suggested}x"
-            )
-            
-            # Clear any warning if the leverage is at suggested value
-            if current_leverage == suggested:
-                self.leverage_warning.config(text="")
-                
-        except ValueError:
+                text = "Order Quantity: enter an entry price"
+        elif not order['quantity']:
+            text = f"Order Quantity: below the {symbol} minimum of {order['min_qty']:.{order['qty_decimals']}f}"
+            style = 'Warning.TLabel'
+        else:
+            decimals = order['price_decimals']
+            text = (f"Order Quantity: {order['quantity']:.{order['qty_decimals']}f} {symbol} "
+                    f"@ {order['price']:.{decimals}f}, stop {order['stop_price']:.{decimals}f} "
+                    f"(${order['notional']:,.2f})")
+            leverage = self.inputs.get('leverage')
+            if leverage is not None and leverage > order['max_leverage']:
+                text += f"\n{symbol} allows at most {order['max_leverage']:g}x leverage"
+                style = 'Warning.TLabel'
+        self.order_label.config(text=text, style=style)
+    
+    def show_leverage_suggestion(self):
+        stop_loss = self.inputs.get('stop_loss')
+        suggested = self.inputs.get('suggested_leverage')
+        current_leverage = self.inputs.get('leverage')
+        if suggested is None:
             self.leverage_suggestion.config(text="")
+            return
+        
+        text = f"Suggested Leverage For {stop_loss:.1f}% Stop Loss: {suggested:g}x"
+        if current_leverage is not None and current_leverage != suggested:
+            text += f" (Current: {current_leverage:.0f}x)"
+        else:
+            # Clear any warning if the leverage is at suggested value
+            self.leverage_warning.config(text="")
+        self.leverage_suggestion.config(text=text)
     
-    def validate_entry(self, entry, value, min_val, max_val, warning_text):
+    def validate_entry(self, entry, value, limit):
         try:
             if not value.strip():
                 self.clear_warning(entry)
                 return True
                 
             val = float(value)
-            if min_val <= val <= max_val:
+            table = self.leverage_rules.current().table(self.inputs.get('symbol'), self.account)
+            if table.in_limits(limit, val):
                 # Special validation for leverage based on stop loss
                 if entry == self.leverage_entry:
                     try:
                         stop_loss = float(self.stop_loss_entry.get())
-                        max_leverage = self.get_max_leverage(stop_loss)
-                        if val > max_leverage:
-                            self.show_warning(entry, f"Max leverage for {stop_loss:.1f}% stop loss is {max_leverage}x")
+                        max_leverage = table.max_leverage(stop_loss)
+                        if max_leverage is not None and val > max_leverage:
+                            self.show_warning(entry, f"Max leverage for {stop_loss:.1f}% stop loss is {max_leverage:g}x")
                             return False
                     except ValueError:
                         pass
@@ -364,23 +734,13 @@ class PositionSizeCalculator:
                 self.clear_warning(entry)
                 return True
             else:
-                self.show_warning(entry, warning_text)
+                self.show_warning(entry, limit_warning(limit, *table.limits[limit]))
                 return False
         except ValueError:
             if value.strip():  # Only warn if there's actually input
                 self.show_warning(entry, "Must be a number")
             return False
     
-    def get_max_leverage(self, stop_loss):
-        if stop_loss <= 1:
-            return 10
-        elif 1 < stop_loss <= 2.5:
-            return 8
-        elif 2.5 < stop_loss <= 3:
-            return 6
-        else:  # 3 < stop_loss <= 4
-            return 5
-    
     def show_warning(self, entry, text):
         if entry == self.risk_entry:
             self.risk_warning.config(text=text)
@@ -419,31 +779,81 @@ class PositionSizeCalculator:
     def calculate_position(self):
         try:
             capital = float(self.capital_entry.get())
-            stop_loss_pct = float(self.stop_loss_entry.get()) / 100
+            stop_loss = float(self.stop_loss_entry.get())
             leverage = float(self.leverage_entry.get())
-            risk_percent = float(self.risk_entry.get()) / 100
+            risk_percent = float(self.risk_entry.get())
 
             # Core calculations
-            risk_amount = risk_percent * capital
-            position_size = risk_amount / (leverage * stop_loss_pct)
-            margin_required = position_size / leverage
-            
-            # Display results
-            self.position_size_label.config(
-                text=f"Position Size: ${position_size:,.2f}"
-            )
-            
-            self.risk_amount_label.config(
-                text=f"Risk Amount: ${risk_amount:,.2f} ({risk_percent*100:.2f}% of capital)"
-            )
-            
-            self.margin_required_label.config(
-                text=f"Margin Required: ${margin_required:,.2f} ({(margin_required/capital*100):.1f}% of capital)"
+            position_size, risk_amount, margin_required = calculate_position_size(
+                capital, risk_percent, stop_loss, leverage
             )
+            self.show_results(capital, risk_percent, leverage, position_size, risk_amount, margin_required)
             
         except ValueError as e:
             messagebox.showerror("Calculation Error", f"Invalid input: {str(e)}")
     
+    def show_results(self, capital, risk_percent, leverage, position_size, risk_amount, margin_required):
+        self.position_size_label.config(
+            text=f"Position Size: ${position_size:,.2f}"
+        )
+        
+        self.risk_amount_label.config(
+            text=f"Risk Amount: ${risk_amount:,.2f} ({risk_percent:.2f}% of capital)"
+        )
+        
+        self.margin_required_label.config(
+            text=f"Margin Required: ${margin_required:,.2f} ({(margin_required/capital*100):.1f}% of capital)"
+        )
+        
+        self.show_portfolio_effect(capital, position_size, leverage, risk_amount)
+    
+    def show_portfolio_effect(self, capital, position_size, leverage, risk_amount):
+        if not self.exposure_ready:
+            self.portfolio_label.config(text="Portfolio With Trade: loading journal...")
+            self.portfolio_warning.config(text="")
+            return
+        
+        symbol = self.symbol_combo.get()
+        direction = self.direction_var.get()
+        totals = self.exposure.with_trade(symbol, direction, position_size, leverage, risk_amount)
+        
+        self.portfolio_label.config(
+            text=f"Portfolio With Trade ({totals['open_trades']} open): "
+                 f"Risk ${totals['total_risk']:,.2f} ({totals['total_risk']/capital*100:.1f}%), "
+                 f"Margin ${totals['total_margin']:,.2f} ({totals['total_margin']/capital*100:.1f}%)\n"
+                 f"Notional ${totals['total_notional']:,.2f}, Net {symbol or 'symbol'} ${totals['net_exposure']:,.2f}"
+        )
+        
+        breaches = self.exposure.check_limits(totals, capital, self.portfolio_limits)
+        self.portfolio_warning.config(text="; ".join(breaches))
+        self.show_portfolio_var(capital, symbol, direction, position_size)
+    
+    def show_portfolio_var(self, capital, symbol, direction, position_size):
+        # Correlation-aware loss estimate over one bar of the OHLCV history,
+        # for the open trades and with this one added
+        risk = self.portfolio_risk
+        if risk is None:
+            if self.portfolio_risk_error is not None:
+                text = f"Portfolio VaR: could not read price history: {self.portfolio_risk_error}"
+            else:
+                text = "Portfolio VaR: loading price history..." if os.path.isdir(self.ohlcv_dir) else ""
+            self.var_label.config(text=text)
+            return
+        
+        positions = {s: self.exposure.net_exposure(s) for s in self.exposure.by_symbol}
+        report = risk.report(positions, symbol, position_size if direction == 'LONG' else -position_size)
+        if report is None:
+            self.var_label.config(text="Portfolio VaR: not enough price history")
+            return
+        
+        param_var, param_cvar, hist_var, hist_cvar = report['with_trade']
+        text = (f"VaR {report['confidence']:.0%} With Trade: ${param_var:,.2f} ({param_var/capital*100:.1f}%), "
+                f"CVaR ${param_cvar:,.2f}, historical ${hist_var:,.2f} / ${hist_cvar:,.2f}\n"
+                f"This trade adds ${report['incremental'][0]:,.2f} (historical ${report['incremental'][2]:,.2f})")
+        if report['uncovered']:
+            text += f"; no history for {', '.join(report['uncovered'])}"
+        self.var_label.config(text=text)
+    
     def clear_fields(self):
         # Clear all entries except risk which gets reset to 3%
         self.capital_entry.delete(0, tk.END)
@@ -459,58 +869,39 @@ class PositionSizeCalculator:
                        self.stop_loss_warning, self.leverage_warning]:
             warning.config(text="")
         self.leverage_suggestion.config(text="")
-        
-        # Clear results
+        self.clear_results()
+    
+    def clear_results(self):
         self.position_size_label.config(text="Position Size: ")
         self.risk_amount_label.config(text="Risk Amount: ")
         self.margin_required_label.config(text="Margin Required: ")
-
-    def check_leverage_against_suggestion(self, *args):
-        try:
-            stop_loss = float(self.stop_loss_entry.get())
-            current_leverage = float(self.leverage_entry.get())
-            
-            # Get suggested leverage
-            if stop_loss <= 1:
-                suggested = 10
-            elif 1 < stop_loss <= 2.5:
-                suggested = 8
-            elif 2.5 < stop_loss <= 3:
-                suggested = 6
-            elif 3 < stop_loss <= 4:
-                suggested = 5
-            else:
-                return
-            
-            # Update message to show if current leverage differs from suggestion
-            if current_leverage != suggested:
-                self.leverage_suggestion.config(
-                    text=f"Suggested Leverage For {stop_loss:.1f}% Stop Loss: {suggested}x (Current: {current_leverage:.0f}x)"
-                )
-            else:
-                self.leverage_suggestion.config(
-                    text=f"Suggested Leverage For {stop_loss:.1f}% Stop Loss: {suggested}x"
-                )
-                
-        except ValueError:
-            pass  # Ignore invalid values while typing
+        self.order_label.config(text="Order Quantity: ", style='TLabel')
+        self.portfolio_label.config(text="Portfolio With Trade: ")
+        self.var_label.config(text="")
+        self.portfolio_warning.config(text="")
 
     def save_trade(self):
         try:
             # Get current values
-            symbol = self.symbol_combo.get()
-            if not symbol:
-                messagebox.showerror("Error", "Please select a symbol")
+            symbol = self.symbol_combo.get().strip().upper()
+            if symbol not in self.watchlist:
+                messagebox.showerror("Error", "Please select a symbol from the watchlist")
                 return
                 
             direction = self.direction_var.get()
             entry_price = float(self.entry_price_entry.get() or 0)
-            position_size = float(self.position_size_label.get().split('$')[1].replace(',', ''))
+            position_size = float(self.position_size_label.cget('text').split('$')[1].replace(',', ''))
             stop_loss = float(self.stop_loss_entry.get())
-            risk_amount = float(self.risk_amount_label.get().split('$')[1].split(' ')[0].replace(',', ''))
+            risk_amount = float(self.risk_amount_label.cget('text').split('$')[1].split(' ')[0].replace(',', ''))
             leverage = float(self.leverage_entry.get())
             notes = self.notes_entry.get()
             
+            # Record what can actually be ordered, when the symbol has a contract spec
+            order = self.inputs.get('order')
+            if order is not None and order['quantity'] and self.inputs.get('symbol') == symbol:
+                entry_price = order['price']
+                position_size = order['notional']
+            
             # Create new trade entry
             new_trade = {
                 'Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -527,19 +918,9 @@ class PositionSizeCalculator:
                 'Notes': notes
             }
             
-            # Read existing trades
-            if os.path.exists(self.excel_file):
-                df = pd.read_excel(self.excel_file)
-            else:
-                df = pd.DataFrame(columns=list(new_trade.keys()))
-            
-            # Append new trade
-            df = pd.concat([df, pd.DataFrame([new_trade])], ignore_index=True)
-            
-            # Save to Excel
-            df.to_excel(self.excel_file, index=False)
-            
-            messagebox.showinfo("Success", "Trade saved successfully!")
+            # Queue for the journal writer; the result shows up in the status line
+            self.journal_writer.submit(new_trade)
+            self.journal_status.config(text="Saving trade...", style='TLabel')
             
             # Clear journal fields
             self.entry_price_entry.delete(0, tk.END)
@@ -548,17 +929,157 @@ class PositionSizeCalculator:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save trade: {str(e)}")
 
+    def show_open_trades(self):
+        # One panel, brought back to the front if it is already open
+        if self.open_trades_window is not None:
+            self.open_trades_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Open Trades")
+        window.protocol("WM_DELETE_WINDOW", self.hide_open_trades)
+        
+        columns = ('ID', 'Date', 'Symbol', 'Direction', 'Entry Price', 'Position Size', 'Stop Loss')
+        widths = (50, 130, 90, 70, 90, 100, 70)
+        tree = ttk.Treeview(window, columns=columns, show='headings', height=12, selectmode='browse')
+        for column, width in zip(columns, widths):
+            tree.heading(column, text=column)
+            tree.column(column, width=width, anchor='e' if column not in ('Date', 'Symbol', 'Direction') else 'w')
+        scrollbar = ttk.Scrollbar(window, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.bind('<<TreeviewSelect>>', self.fill_exit_price)
+        
+        exit_frame = ttk.Frame(window)
+        ttk.Label(exit_frame, text="Exit Price:").pack(side=tk.LEFT, padx=5)
+        self.exit_price_entry = ttk.Entry(exit_frame, width=15)
+        self.exit_price_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Button(exit_frame, text="Close Selected", command=self.close_selected_trade).pack(side=tk.LEFT, padx=5)
+        
+        tree.grid(row=0, column=0, sticky="nsew", padx=(10, 0), pady=10)
+        scrollbar.grid(row=0, column=1, sticky="ns", padx=(0, 10), pady=10)
+        exit_frame.grid(row=1, column=0, columnspan=2, sticky="w", padx=5, pady=(0, 10))
+        
+        self.open_trades_window = window
+        self.open_trades_tree = tree
+        self.refresh_open_trades()
+    
+    def hide_open_trades(self):
+        self.open_trades_window.destroy()
+        self.open_trades_window = None
+    
+    def refresh_open_trades(self):
+        if self.open_trades_window is None:
+            return
+        self.open_trades_tree.delete(*self.open_trades_tree.get_children())
+        for trade_id in sorted(self.open_trades):
+            self.add_open_trade_row(self.open_trades[trade_id])
+    
+    def add_open_trade_row(self, trade):
+        if self.open_trades_window is None:
+            return
+        self.open_trades_tree.insert('', 'end', iid=str(trade['id']), values=(
+            trade['id'], trade['Date'], trade['Symbol'], trade['Direction'],
+            f"{trade['Entry Price'] or 0:g}", f"${trade['Position Size'] or 0:,.2f}",
+            f"{trade['Stop Loss']:g}%" if trade['Stop Loss'] is not None else ""
+        ))
+    
+    def fill_exit_price(self, event=None):
+        # Start from the live price when a feed is running
+        selection = self.open_trades_tree.selection()
+        mark = getattr(self, 'live_marks', {}).get(int(selection[0])) if selection else None
+        if mark is not None:
+            self.exit_price_entry.delete(0, tk.END)
+            self.exit_price_entry.insert(0, f"{mark['price']:g}")
+    
+    def close_selected_trade(self):
+        selection = self.open_trades_tree.selection()
+        if not selection:
+            messagebox.showerror("Error", "Please select a trade to close", parent=self.open_trades_window)
+            return
+        try:
+            exit_price = float(self.exit_price_entry.get())
+            if exit_price <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Exit price must be a positive number", parent=self.open_trades_window)
+            return
+        
+        # The writer updates just this row; the result shows up in the status line
+        trade_id = int(selection[0])
+        self.journal_writer.submit_close(trade_id, exit_price)
+        self.journal_status.config(text=f"Closing trade #{trade_id}...", style='TLabel')
+        self.exit_price_entry.delete(0, tk.END)
+    
     def view_journal(self):
+        # The journal in a window of its own, paged from the cache, so even a
+        # huge journal opens at once and on any platform
+        if self.journal_viewer is not None:
+            self.journal_viewer.lift()
+            return
+        if self.journal_snapshot is None:
+            self.journal_status.config(text="Journal is still loading...", style='TLabel')
+            return
+        from journal_viewer import JournalViewer
+        
+        self.journal_viewer = JournalViewer(self.root, self.journal_snapshot, on_export=self.export_journal,
+                                            on_close=self.hide_journal_viewer)
+    
+    def hide_journal_viewer(self):
+        self.journal_viewer = None
+    
+    def export_journal(self, **filters):
+        # Export the trades the viewer shows to Excel; big journals take a
+        # while, so the export streams on its own thread
+        if self.exporting:
+            return
+        self.exporting = True
+        self.journal_status.config(text="Exporting journal...", style='Suggestion.TLabel')
+        results = queue.Queue()
+        
+        def export():
+            try:
+                results.put((True, self.journal.export_excel(**filters)))
+            except Exception as e:
+                results.put((False, e))
+        
+        threading.Thread(target=export, name='journal-export', daemon=True).start()
+        self.poll_export(results)
+    
+    def poll_export(self, results):
+        try:
+            ok, result = results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_export, results)
+            return
+        self.exporting = False
         try:
-            # Try to open the Excel file
-            os.startfile(self.excel_file)
+            if not ok:
+                raise result
+            self.journal_status.config(text=f"Journal exported to {result}", style='Suggestion.TLabel')
+            # Only Windows can hand the file to Excel from here
+            if hasattr(os, 'startfile'):
+                os.startfile(os.path.abspath(result))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to open trade journal: {str(e)}")
+            self.journal_status.config(text="")
+            messagebox.showerror("Error", f"Failed to export trade journal: {str(e)}")
 
-    def update_symbol_list(self):
-        self.symbol_combo['values'] = sorted(self.symbols)
-        if self.symbols:
-            self.symbol_combo.set(self.symbols[0])
+    def selected_category(self):
+        category = self.category_var.get()
+        return None if category == "All" else category
+    
+    def filter_symbols(self, event=None):
+        # Leave the list alone while moving through it
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        self.symbol_combo['values'] = self.watchlist.search(self.symbol_combo.get(), self.selected_category())
+    
+    def update_symbol_list(self, selected=None):
+        if getattr(self, 'feed_runner', None):
+            self.feed_runner.symbols = set(self.watchlist)
+        self.category_combo['values'] = ["All"] + sorted(self.watchlist.categories)
+        matches = self.watchlist.search('', self.selected_category())
+        self.symbol_combo['values'] = matches
+        self.symbol_combo.set(selected or (matches[0] if matches else ""))
 
     def add_to_watchlist(self):
         new_symbol = self.new_symbol_entry.get().strip().upper()
@@ -567,30 +1088,77 @@ class PositionSizeCalculator:
             messagebox.showerror("Error", "Please enter a symbol")
             return
             
-        if new_symbol not in self.symbols:
-            self.symbols.append(new_symbol)
-            self.symbols.sort()
-            self.save_watchlist()
-            self.update_symbol_list()
+        if self.watchlist.add(new_symbol, self.selected_category() or DEFAULT_CATEGORY):
+            self.watchlist_saver.schedule()
+            self.update_symbol_list(new_symbol)
+            self.start_portfolio_risk()
             self.new_symbol_entry.delete(0, tk.END)
             messagebox.showinfo("Success", f"Added {new_symbol}")
         else:
             messagebox.showinfo("Info", f"{new_symbol} already in watchlist")
 
     def remove_from_watchlist(self):
-        symbol = self.symbol_combo.get()
+        symbol = self.symbol_combo.get().strip().upper()
         
         if not symbol:
             messagebox.showerror("Error", "Please select a symbol to remove")
             return
             
-        if symbol in self.symbols:
-            self.symbols.remove(symbol)
-            self.save_watchlist()
+        if self.watchlist.remove(symbol):
+            self.watchlist_saver.schedule()
             self.update_symbol_list()
+            self.start_portfolio_risk()
             messagebox.showinfo("Success", f"Removed {symbol}")
 
+def format_profit_factor(profit_factor):
+    # None when every closed trade broke even, infinite with no losing trade
+    if profit_factor is None:
+        return "–"
+    if profit_factor == float('inf'):
+        return "∞ (no losses)"
+    return f"{profit_factor:.2f}"
+
+def limit_warning(limit, low, high):
+    if limit == 'Capital':
+        return "Capital must be positive" if high == float('inf') else f"Capital must be {low:g}-{high:g}"
+    if limit == 'Leverage':
+        return f"Leverage must be between {low:g}-{high:g}x"
+    if limit == 'Risk':
+        return f"Risk should be {low:g}-{high:g}%"
+    return f"Stop loss must be {low:g}-{high:g}%"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Position size calculator and trade journal")
+    parser.add_argument('--replay', metavar='CSV', help="Mark open trades from recorded ticks (time,symbol,price)")
+    parser.add_argument('--replay-speed', type=float, default=1.0, help="Replay speed, 0 for as fast as possible")
+    parser.add_argument('--feed', metavar='HOST:PORT', help="Mark open trades from a JSON-lines tick stream")
+    parser.add_argument('--metrics', nargs='?', const='trading_metrics.json', metavar='FILE',
+                        help="Time callbacks and I/O and write p50/p99 to FILE (or set TRADING_CALC_METRICS)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="Serve metrics in Prometheus format on localhost:PORT (or set TRADING_CALC_METRICS_PORT)")
+    parser.add_argument('--account', help="Use this account's leverage tiers and limits from leverage_rules.json")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    price_feed = None
+    if args.replay:
+        from price_feed import ReplayFeed
+        price_feed = ReplayFeed(args.replay, args.replay_speed)
+    elif args.feed:
+        from price_feed import StreamFeed
+        host, port = args.feed.rsplit(':', 1)
+        price_feed = StreamFeed(host, int(port))
+    
+    metrics = None
+    metrics_file, metrics_port = args.metrics, args.metrics_port
+    if metrics_file or metrics_port or os.environ.get('TRADING_CALC_METRICS') or os.environ.get('TRADING_CALC_METRICS_PORT'):
+        from instrumentation import Metrics, settings_from_env
+        metrics_file, metrics_port = settings_from_env(metrics_file, metrics_port)
+        metrics = Metrics()
+        if metrics_port:
+            metrics.serve(metrics_port)
+    
     root = tk.Tk()
-    app = PositionSizeCalculator(root)
+    app = PositionSizeCalculator(root, price_feed, metrics, metrics_file, args.account)
     root.mainloop()
\ No newline at end of file
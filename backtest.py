@@ -0,0 +1,395 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from file_lock import atomic_output
+from portfolio_var import TIME_COLUMNS
+from leverage_rules import LeverageRules
+from position_sizing import calculate_position_size
+
+DEFAULT_RISK_GRID = [1, 2, 3, 4, 5]
+DEFAULT_STOP_GRID = [0.5, 1, 2, 2.5, 3, 4]
+
+# Bars are searched for the exit in chunks that start small, since most
+# trades close within a few bars, and double up to the largest size, so a
+# long trade never compares the rest of the file at once
+FIRST_CHUNK = 16
+SEARCH_CHUNK = 4096
+
+# Columns of the converted bar files
+OPEN, HIGH, LOW, CLOSE = 1, 2, 3, 4
+
+EXITS = ['stops', 'targets', 'liquidations', 'timeouts']
+STOP, TARGET, LIQUIDATION, TIMEOUT = range(len(EXITS))
+
+
+def bar_path(directory, symbol):
+    return os.path.join(directory, '.bars', symbol + '.npy')
+
+
+def convert_bars(directory, symbol):
+    """Converts <directory>/<symbol>.csv to an (n, 5) float64 .npy of time, open, high, low, close.
+
+    Workers memory-map the .npy, so only the pages a backtest touches are
+    read and every process shares the OS cache. Redone when the CSV is newer.
+    """
+    source = os.path.join(directory, symbol + '.csv')
+    target = bar_path(directory, symbol)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return target
+
+    import pandas as pd
+
+    frame = pd.read_csv(source)
+    frame.columns = [str(c).strip().lower() for c in frame.columns]
+    time_column = next((c for c in TIME_COLUMNS if c in frame.columns), None)
+    if time_column is None:
+        raise ValueError(f"{source} needs a time column")
+    times = frame[time_column]
+    if not pd.api.types.is_numeric_dtype(times):
+        times = pd.to_datetime(times, utc=True).astype('int64') // 10 ** 9
+    bars = np.column_stack([times.to_numpy(dtype=float), frame[['open', 'high', 'low', 'close']].to_numpy(dtype=float)])
+    bars = bars[np.argsort(bars[:, 0], kind='stable')]
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with atomic_output(target) as tmp:
+        with open(tmp, 'wb') as f:
+            np.save(f, bars)
+    return target
+
+
+def breakout_signal(bars, lookback=20):
+    # +1 when the close breaks above the previous `lookback` highs, -1 below their lows
+    signal = np.zeros(len(bars), dtype=np.int8)
+    if len(bars) <= lookback:
+        return signal
+    highs = sliding_window_view(bars[:-1, HIGH], lookback).max(axis=1)
+    lows = sliding_window_view(bars[:-1, LOW], lookback).min(axis=1)
+    close = bars[lookback:, CLOSE]
+    signal[lookback:] = np.where(close > highs, 1, np.where(close < lows, -1, 0))
+    return signal
+
+
+def moving_average(values, length):
+    sums = np.cumsum(values)
+    sums[length:] = sums[length:] - sums[:-length]
+    average = sums / length
+    average[:length - 1] = np.nan
+    return average
+
+
+def ma_cross_signal(bars, fast=20, slow=50):
+    # +1 on the bar the fast average crosses above the slow one, -1 when it crosses below
+    signal = np.zeros(len(bars), dtype=np.int8)
+    if len(bars) <= slow:
+        return signal
+    with np.errstate(invalid='ignore'):
+        above = moving_average(bars[:, CLOSE], fast) > moving_average(bars[:, CLOSE], slow)
+    valid = np.arange(len(bars)) >= slow
+    signal[1:][above[1:] & ~above[:-1] & valid[1:]] = 1
+    signal[1:][~above[1:] & above[:-1] & valid[1:]] = -1
+    return signal
+
+
+SIGNALS = {'breakout': breakout_signal, 'ma_cross': ma_cross_signal}
+
+
+def find_exit(bars, entry, direction, stop, target, liquidation, last):
+    """First bar from entry to last where the stop, target or liquidation price trades.
+
+    Returns (bar, exit kind, fill price). The adverse level is whichever of
+    the stop and liquidation price is nearer; a bar that reaches both it and
+    the target counts as adverse. An open that gaps through a level fills at
+    the open, and a gap past the liquidation price is a liquidation.
+    """
+    if direction > 0:
+        adverse, adverse_kind = (stop, STOP) if stop >= liquidation else (liquidation, LIQUIDATION)
+    else:
+        adverse, adverse_kind = (stop, STOP) if stop <= liquidation else (liquidation, LIQUIDATION)
+    start = entry
+    chunk = FIRST_CHUNK
+    while start <= last:
+        end = min(start + chunk, last + 1)
+        chunk = min(chunk * 2, SEARCH_CHUNK)
+        if direction > 0:
+            hit_adverse = bars[start:end, LOW] <= adverse
+            hit_target = bars[start:end, HIGH] >= target
+        else:
+            hit_adverse = bars[start:end, HIGH] >= adverse
+            hit_target = bars[start:end, LOW] <= target
+        hits = hit_adverse | hit_target
+        if hits.any():
+            bar = start + int(hits.argmax())
+            opened = bars[bar, OPEN]
+            if hit_adverse[bar - start]:
+                fill = opened if bar > entry and direction * (opened - adverse) < 0 else adverse
+                if adverse_kind == STOP and direction * (fill - liquidation) <= 0:
+                    return bar, LIQUIDATION, liquidation
+                return bar, adverse_kind, fill
+            fill = opened if bar > entry and direction * (opened - target) > 0 else target
+            return bar, TARGET, fill
+        start = end
+    return last, TIMEOUT, bars[last, CLOSE]
+
+
+def simulate(bars, signal, risk_percent, stop_loss_percent, leverage, capital=10000.0, target_r=2.0,
+             max_hold=0, fee=0.0004, maintenance=0.005, curve=False):
+    """Trades one symbol's signals with the calculator's sizing, one position at a time.
+
+    A signal on bar i enters at bar i+1's open. Size comes from
+    calculate_position_size on the current equity, so results compound.
+    Exits at the stop, at target_r times the stop distance, at liquidation
+    (1/leverage - maintenance from the entry, the whole margin lost) or
+    after max_hold bars (0 = never). fee is paid on both sides.
+    """
+    entries = np.flatnonzero(signal[:-1]) + 1
+    n = len(bars)
+    equity = capital
+    peak = capital
+    max_drawdown = 0.0
+    counts = [0] * len(EXITS)
+    wins = 0
+    times, equities = ([bars[0, 0]], [capital]) if curve else (None, None)
+    stop = stop_loss_percent / 100
+    k = 0
+    while k < len(entries):
+        entry = int(entries[k])
+        direction = int(signal[entry - 1])
+        price = bars[entry, OPEN]
+        position_size, risk_amount, margin = calculate_position_size(equity, risk_percent, stop_loss_percent,
+                                                                     leverage)
+        last = min(entry + max_hold - 1, n - 1) if max_hold else n - 1
+        bar, kind, fill = find_exit(
+            bars, entry, direction,
+            price * (1 - direction * stop), price * (1 + direction * target_r * stop),
+            price * (1 - direction * (1 / leverage - maintenance)), last
+        )
+
+        pnl = -margin if kind == LIQUIDATION else direction * position_size * (fill / price - 1)
+        pnl -= fee * position_size * (1 + fill / price)
+        equity += pnl
+        counts[kind] += 1
+        wins += pnl > 0
+        peak = max(peak, equity)
+        max_drawdown = max(max_drawdown, 1 - equity / peak)
+        if curve:
+            times.append(bars[bar, 0])
+            equities.append(equity)
+        if equity <= 0:
+            break
+        # The next trade needs a signal after this one has closed
+        k = int(np.searchsorted(entries, bar + 1))
+
+    result = {
+        'trades': sum(counts),
+        'wins': wins,
+        'final_equity': equity,
+        'return': equity / capital - 1,
+        'max_drawdown': max_drawdown,
+        'busted': equity <= 0,
+        **dict(zip(EXITS, counts))
+    }
+    if curve:
+        result['curve'] = (np.array(times), np.array(equities))
+    return result
+
+
+def leverage_for(rule, stop_loss_percent, rules, symbol=None, account=None):
+    # 'tier' uses the calculator's max leverage for the stop and symbol; a number is fixed
+    if rule != 'tier':
+        return float(rule)
+    leverage = rules.max_leverage(stop_loss_percent, symbol, account)
+    if leverage is None:
+        raise ValueError(f"No leverage tier covers a {stop_loss_percent:g}% stop loss on {symbol}")
+    return leverage
+
+
+def signal_path(bars_path, signal_name, signal_args):
+    # Next to the bars, e.g. .bars/BTCUSDT.breakout-20.npy
+    name = '-'.join([signal_name, *(f'{a:g}' for a in signal_args)])
+    return bars_path[:-len('.npy')] + f'.{name}.npy'
+
+
+def convert_signal(path, signal_name, signal_args):
+    """Works out a symbol's signal once and saves it next to its bars; returns the .npy path.
+
+    Every grid chunk of the symbol memory-maps it instead of recomputing it.
+    Redone when the bars are newer.
+    """
+    target = signal_path(path, signal_name, signal_args)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+    signal = SIGNALS[signal_name](np.load(path, mmap_mode='r'), *signal_args)
+    with atomic_output(target) as tmp:
+        with open(tmp, 'wb') as f:
+            np.save(f, signal)
+    return target
+
+
+def run_grid(bars, signal, symbol, grid, settings, rules=None, account=None):
+    # Every parameter set in grid on one symbol's bars and signal
+    rules = rules or LeverageRules()
+    results = []
+    for risk_percent, stop_loss_percent, rule in grid:
+        leverage = leverage_for(rule, stop_loss_percent, rules, symbol, account)
+        result = simulate(bars, signal, risk_percent, stop_loss_percent, leverage, **settings)
+        result.update(symbol=symbol, bars=len(bars), risk_percent=risk_percent,
+                      stop_loss_percent=stop_loss_percent, leverage=rule)
+        results.append(result)
+    return results
+
+
+def run_chunk(path, signal_file, symbol, grid, settings, rules=None, account=None):
+    # One worker task: a chunk of the grid on one symbol, from the memory-mapped bars and signal
+    return run_grid(np.load(path, mmap_mode='r'), np.load(signal_file, mmap_mode='r'), symbol, grid, settings,
+                    rules, account)
+
+
+def run_symbol(path, symbol, signal_name, signal_args, grid, settings, rules=None, account=None):
+    # The whole grid on one symbol in this process
+    bars = np.load(path, mmap_mode='r')
+    return run_grid(bars, SIGNALS[signal_name](bars, *signal_args), symbol, grid, settings, rules, account)
+
+
+def backtest(directory, symbols, grid, signal_name='breakout', signal_args=(), workers=None, rules=None,
+             account=None, chunk_size=None, **settings):
+    """Runs the grid of (risk %, stop loss %, leverage rule) over every symbol.
+
+    Each symbol's signal is worked out once, in parallel, then every
+    (symbol, chunk of chunk_size parameter sets) is its own task, so one
+    symbol with a large grid still uses every worker. By default chunks
+    are sized for about four tasks per worker. rules is the LeverageRules
+    that 'tier' looks up, with the symbol's and account's overrides.
+    Returns one result dict per symbol and parameter set.
+    """
+    workers = workers or os.cpu_count()
+    paths = {symbol: convert_bars(directory, symbol) for symbol in symbols}
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(grid) * len(paths) // (workers * 4)))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        signals = dict(zip(paths, pool.map(convert_signal, paths.values(), itertools.repeat(signal_name),
+                                           itertools.repeat(tuple(signal_args)))))
+        futures = [
+            pool.submit(run_chunk, path, signals[symbol], symbol, grid[start:start + chunk_size], settings, rules,
+                        account)
+            for symbol, path in paths.items()
+            for start in range(0, len(grid), chunk_size)
+        ]
+        for future in as_completed(futures):
+            results.extend(future.result())
+    return results
+
+
+def summarize(results, grid):
+    # One row per parameter set over all symbols, in grid order
+    rows = []
+    for risk_percent, stop_loss_percent, rule in grid:
+        matching = [r for r in results if (r['risk_percent'], r['stop_loss_percent'], r['leverage'])
+                    == (risk_percent, stop_loss_percent, rule)]
+        trades = sum(r['trades'] for r in matching)
+        row = {
+            'risk_percent': risk_percent,
+            'stop_loss_percent': stop_loss_percent,
+            'leverage': rule,
+            'symbols': len(matching),
+            'trades': trades,
+            'win_rate': sum(r['wins'] for r in matching) / trades if trades else None,
+            'mean_return': float(np.mean([r['return'] for r in matching])) if matching else None,
+            'worst_drawdown': max((r['max_drawdown'] for r in matching), default=None),
+            'mean_drawdown': float(np.mean([r['max_drawdown'] for r in matching])) if matching else None,
+            'busted': sum(r['busted'] for r in matching)
+        }
+        for exit_kind in EXITS:
+            row[exit_kind] = sum(r[exit_kind] for r in matching)
+        rows.append(row)
+    return rows
+
+
+def write_curves(directory, results):
+    # <directory>/<SYMBOL>_risk<r>_stop<s>_lev<l>.csv with time,equity after each trade
+    os.makedirs(directory, exist_ok=True)
+    for r in results:
+        name = f"{r['symbol']}_risk{r['risk_percent']:g}_stop{r['stop_loss_percent']:g}_lev{r['leverage']}.csv"
+        with open(os.path.join(directory, name), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'equity'])
+            writer.writerows(zip(*(values.tolist() for values in r['curve'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the sizing and leverage rules over local OHLCV files")
+    parser.add_argument('--ohlcv', default='ohlcv', help="Directory of <SYMBOL>.csv files")
+    parser.add_argument('--symbols', nargs='+', help="Default: every CSV in --ohlcv")
+    parser.add_argument('--signal', choices=sorted(SIGNALS), default='breakout')
+    parser.add_argument('--lookback', type=int, default=20, help="Breakout lookback, in bars")
+    parser.add_argument('--fast', type=int, default=20, help="Fast moving average for ma_cross")
+    parser.add_argument('--slow', type=int, default=50, help="Slow moving average for ma_cross")
+    parser.add_argument('--risk', type=float, nargs='+', default=DEFAULT_RISK_GRID, help="Risk per trade, %%")
+    parser.add_argument('--stop', type=float, nargs='+', default=DEFAULT_STOP_GRID, help="Stop loss, %%")
+    parser.add_argument('--leverage', nargs='+', default=['tier'],
+                        help="'tier' for the calculator's max leverage for the stop, or fixed values")
+    parser.add_argument('--rules', default='leverage_rules.json', help="Leverage tiers for 'tier'")
+    parser.add_argument('--account', help="Use this account's tiers from the rule file")
+    parser.add_argument('--capital', type=float, default=10000.0)
+    parser.add_argument('--target-r', type=float, default=2.0, help="Take profit at this many stop distances")
+    parser.add_argument('--max-hold', type=int, default=0, help="Close after this many bars, 0 for never")
+    parser.add_argument('--fee', type=float, default=0.0004, help="Fee per side, as a fraction of notional")
+    parser.add_argument('--maintenance', type=float, default=0.005, help="Maintenance margin rate")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk-size', type=int, help="Parameter sets per task; default about four tasks per worker")
+    parser.add_argument('-o', '--output', help="Write per-symbol results as CSV here")
+    parser.add_argument('--curves', metavar='DIR', help="Write each equity curve as CSV into DIR")
+    args = parser.parse_args()
+
+    symbols = args.symbols or sorted(name[:-4] for name in os.listdir(args.ohlcv) if name.endswith('.csv'))
+    if not symbols:
+        parser.error(f"No OHLCV files in {args.ohlcv}")
+    rules = LeverageRules.load(args.rules) if os.path.exists(args.rules) else LeverageRules()
+    for rule in args.leverage:
+        for stop_loss_percent in args.stop:
+            for symbol in symbols:
+                try:
+                    leverage_for(rule, stop_loss_percent, rules, symbol.upper(), args.account)
+                except ValueError as e:
+                    parser.error(str(e))
+    grid = list(itertools.product(args.risk, args.stop, args.leverage))
+    signal_args = (args.lookback,) if args.signal == 'breakout' else (args.fast, args.slow)
+
+    start = time.perf_counter()
+    results = backtest(args.ohlcv, [s.upper() for s in symbols], grid, args.signal, signal_args, args.workers,
+                       rules, args.account, args.chunk_size, capital=args.capital, target_r=args.target_r, max_hold=args.max_hold, fee=args.fee,
+                       maintenance=args.maintenance, curve=bool(args.curves))
+    elapsed = time.perf_counter() - start
+
+    bars = sum(r['bars'] for r in results) // len(grid)
+    print(f"{len(symbols)} symbols, {bars:,} bars, {len(grid)} parameter sets, {args.signal} ({elapsed:.1f}s)")
+    print(f"{'Risk %':>7} {'Stop %':>7} {'Lev':>5} {'Trades':>8} {'Win %':>6} {'Return':>9} {'Max DD':>7} "
+          f"{'Avg DD':>7} {'Stops':>7} {'Targets':>8} {'Liq':>5} {'Busted':>7}")
+    for row in summarize(results, grid):
+        win_rate = f"{row['win_rate']:.0%}" if row['win_rate'] is not None else '-'
+        print(f"{row['risk_percent']:>7.2f} {row['stop_loss_percent']:>7.2f} {row['leverage']:>5} {row['trades']:>8,} "
+              f"{win_rate:>6} {row['mean_return']:>9.1%} {row['worst_drawdown']:>7.1%} {row['mean_drawdown']:>7.1%} "
+              f"{row['stops']:>7,} {row['targets']:>8,} {row['liquidations']:>5,} {row['busted']:>7}")
+
+    if args.output:
+        columns = ['symbol', 'risk_percent', 'stop_loss_percent', 'leverage', 'bars', 'trades', 'wins', *EXITS,
+                   'final_equity', 'return', 'max_drawdown', 'busted']
+        with atomic_output(args.output) as tmp:
+            with open(tmp, 'w', newline='') as f:
+                writer = csv.DictWriter(f, columns, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(sorted(results, key=lambda r: (r['symbol'], grid.index(
+                    (r['risk_percent'], r['stop_loss_percent'], r['leverage'])))))
+    if args.curves:
+        write_curves(args.curves, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+
+import startup_budget
+from backtest import DEFAULT_STOP_GRID, convert_bars, run_symbol
+from contract_specs import ContractSpecs
+from exposure import ExposureBook
+from journal_cache import JournalCache
+from journal_export import export_journal
+from journal_viewer import JournalView
+from leverage_rules import LeverageRules
+from portfolio_var import PortfolioRisk
+from position_sizing import calculate_position_size, size_positions
+from recompute import calculator_graph
+from trade_journal import TradeJournal
+from watchlist import Watchlist, DEFAULT_CATEGORY
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SUIUSDT", "SEIUSDT", "INJUSDT", "AEVOUSDT", "PYTHUSDT", "BNBUSDT"]
+
+
+def timed(function, repeat=5):
+    # Best wall time of a few runs, in seconds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def synthetic_trades(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    for i in range(count):
+        entry = rng.uniform(1, 1000)
+        closed = rng.random() < 0.8
+        pnl = rng.gauss(5, 40) if closed else None
+        yield {
+            'Date': (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            'Symbol': rng.choice(SYMBOLS),
+            'Direction': rng.choice(['LONG', 'SHORT']),
+            'Entry Price': entry,
+            'Position Size': rng.uniform(100, 10000),
+            'Stop Loss': rng.uniform(0.5, 4),
+            'Risk Amount': rng.uniform(10, 100),
+            'Leverage': rng.choice([5, 6, 8, 10]),
+            'Status': 'CLOSED' if closed else 'OPEN',
+            'Exit Price': entry * rng.uniform(0.95, 1.05) if closed else None,
+            'Profit/Loss': pnl,
+            'Notes': 'synthetic'
+        }
+
+
+def build_journal(workdir, count):
+    journal = TradeJournal(os.path.join(workdir, f'journal_{count}.db'), os.path.join(workdir, 'none.xlsx'))
+    trades = synthetic_trades(count)
+    while True:
+        batch = [t for _, t in zip(range(50000), trades)]
+        if not batch:
+            break
+        journal.append_many(batch)
+    return journal
+
+
+def stub_calculator():
+    # A calculator with Tk replaced by stand-ins, so the GUI path runs headless
+    from Trading_calculator import PositionSizeCalculator
+
+    class StubEntry:
+        def __init__(self, value):
+            self.value = value
+
+        def get(self):
+            return self.value
+
+    app = PositionSizeCalculator.__new__(PositionSizeCalculator)
+    app.capital_entry = StubEntry("10000")
+    app.stop_loss_entry = StubEntry("2")
+    app.leverage_entry = StubEntry("8")
+    app.risk_entry = StubEntry("3")
+    app.symbol_combo = StubEntry("BTCUSDT")
+    app.direction_var = StubEntry("LONG")
+    for name in ['position_size_label', 'risk_amount_label', 'margin_required_label',
+                 'portfolio_label', 'portfolio_warning', 'var_label']:
+        setattr(app, name, mock.Mock())
+    app.ohlcv_dir = os.path.join(tempfile.gettempdir(), 'no-ohlcv')
+    app.portfolio_risk = None
+    app.portfolio_risk_error = None
+    app.exposure = ExposureBook()
+    app.exposure_ready = True
+    app.portfolio_limits = {"Max Total Risk %": 10, "Max Total Margin %": 50}
+    return app
+
+
+def bench_sizing(results):
+    calls = 100000
+    elapsed = timed(lambda: [calculate_position_size(10000, 3, 2, 8) for _ in range(calls)], 3)
+    results['sizing.single.calls_per_s'] = (calls / elapsed, 'higher')
+
+    app = stub_calculator()
+    calls = 10000
+    elapsed = timed(lambda: [app.calculate_position() for _ in range(calls)], 3)
+    results['sizing.gui_calculate_position.calls_per_s'] = (calls / elapsed, 'higher')
+
+    rules = LeverageRules()
+    stops = [0.5 + i % 40 / 10 for i in range(calls)]
+    elapsed = timed(lambda: [rules.max_leverage(stop, 'BTCUSDT') for stop in stops], 3)
+    results['sizing.leverage_lookup.calls_per_s'] = (calls / elapsed, 'higher')
+
+    # A burst of keystrokes in the stop loss entry, then the one recompute per frame
+    graph = calculator_graph()
+    graph.set('rules', rules)
+    for name, text in [('risk', '3'), ('capital', '10000'), ('stop_loss', '2'), ('leverage', '8')]:
+        graph.set(name + '_text', text)
+    graph.flush()
+
+    def burst():
+        for i in range(calls):
+            for text in ['1', '1.', f'1.{i % 10}']:
+                graph.set('stop_loss_text', text)
+            graph.flush()
+    elapsed = timed(burst, 3)
+    results['sizing.recompute_burst.calls_per_s'] = (calls / elapsed, 'higher')
+
+    rows = 1000000
+    rng = np.random.default_rng(0)
+    capital = rng.uniform(100, 1e6, rows)
+    risk = rng.uniform(0, 6, rows)
+    stop = rng.uniform(0, 5, rows)
+    leverage = rng.integers(1, 12, rows).astype(float)
+    elapsed = timed(lambda: size_positions(capital, risk, stop, leverage), 3)
+    results['sizing.batch_1m.rows_per_s'] = (rows / elapsed, 'higher')
+
+    # Lot and tick rounding for a batch over the watchlist's symbols
+    specs = ContractSpecs({s: {'Tick Size': 0.01, 'Lot Size': 0.001, 'Min Qty': 0.001, 'Max Leverage': 50}
+                           for s in SYMBOLS})
+    symbols = [SYMBOLS[i % len(SYMBOLS)] for i in range(rows)]
+    position_size = size_positions(capital, risk, stop, leverage)['position_size']
+    price = rng.uniform(0.1, 70000, rows)
+    elapsed = timed(lambda: specs.quantities(symbols, position_size, price), 3)
+    results['sizing.order_quantities_1m.rows_per_s'] = (rows / elapsed, 'higher')
+
+
+def bench_journal(results, workdir, sizes):
+    for size in sizes:
+        journal = build_journal(workdir, size)
+        prefix = f'journal.{size}'
+
+        extra = list(synthetic_trades(200, seed=size))
+        start = time.perf_counter()
+        for trade in extra[:100]:
+            journal.append(dict(trade))
+        results[f'{prefix}.append_single_s'] = ((time.perf_counter() - start) / 100, 'lower')
+
+        start = time.perf_counter()
+        journal.append_many([dict(t) for t in extra[100:]])
+        results[f'{prefix}.append_batch_100_s'] = (time.perf_counter() - start, 'lower')
+
+        results[f'{prefix}.load_sql_s'] = (timed(lambda: sum(1 for _ in journal.iter_rows()), 1), 'lower')
+        export_file = os.path.join(workdir, f'export_{size}.xlsx')
+        results[f'{prefix}.export_rows_per_s'] = (
+            journal.count() / timed(lambda: export_journal(journal, export_file), 1), 'higher'
+        )
+
+        cache_dir = os.path.join(workdir, f'cache_{size}')
+        start = time.perf_counter()
+        cache = JournalCache(journal, cache_dir).open()
+        results[f'{prefix}.cache_build_s'] = (time.perf_counter() - start, 'lower')
+        results[f'{prefix}.cache_open_s'] = (timed(lambda: JournalCache(journal, cache_dir).open()), 'lower')
+
+        results[f'{prefix}.query_open_trades_sql_s'] = (timed(journal.open_trades, 3), 'lower')
+        results[f'{prefix}.query_open_trades_cache_s'] = (timed(lambda: cache.trades(cache.open_mask()), 3), 'lower')
+        results[f'{prefix}.query_r_multiples_s'] = (timed(cache.r_multiples), 'lower')
+        ids = [random.randint(1, size) for _ in range(1000)]
+        results[f'{prefix}.lookup_by_id_s'] = (timed(lambda: [cache.row_index(i) for i in ids]) / len(ids), 'lower')
+        results[f'{prefix}.query_symbol_open_cache_s'] = (
+            timed(lambda: cache.select(symbol='BTCUSDT', status='OPEN'), 3), 'lower'
+        )
+
+        # The viewer on a fresh snapshot: first page, then a filtered and sorted page
+        results[f'{prefix}.viewer_open_s'] = (timed(lambda: JournalView(cache.snapshot()).page(0), 3), 'lower')
+
+        def filter_and_sort():
+            view = JournalView(cache.snapshot())
+            view.filter(symbol='BTCUSDT', status='CLOSED', start='2020-03', end='2020-06')
+            view.sort('Profit/Loss', descending=True)
+            view.page(len(view) // 2)
+        results[f'{prefix}.viewer_filter_sort_s'] = (timed(filter_and_sort, 3), 'lower')
+
+        open_ids = cache.column('id')[cache.open_mask()][:100].tolist()
+        start = time.perf_counter()
+        for trade_id in open_ids:
+            cache.update([journal.close_trade(trade_id, 100.0)[1]], 0)
+        results[f'{prefix}.close_single_s'] = ((time.perf_counter() - start) / max(len(open_ids), 1), 'lower')
+        journal.close()
+
+
+def bench_watchlist(results, workdir):
+    for count in [15, 5000]:
+        path = os.path.join(workdir, f'watchlist_{count}.json')
+        symbols = [f'SYM{i}USDT' for i in range(count)]
+        watchlist = Watchlist({DEFAULT_CATEGORY: symbols})
+        results[f'watchlist.{count}.build_s'] = (timed(lambda: Watchlist({DEFAULT_CATEGORY: symbols})), 'lower')
+        results[f'watchlist.{count}.save_s'] = (timed(lambda: watchlist.save(path)), 'lower')
+        results[f'watchlist.{count}.load_s'] = (timed(lambda: Watchlist.load(path)), 'lower')
+        prefixes = ['S', 'SYM', 'SYM4', 'SYM49', 'X']
+        results[f'watchlist.{count}.search_s'] = (
+            timed(lambda: [watchlist.search(p) for p in prefixes]) / len(prefixes), 'lower'
+        )
+
+
+def write_ohlcv(directory, bars, start=0, seed=0):
+    # Correlated hourly bars for SYMBOLS, one CSV each, appended after `start`
+    rng = np.random.default_rng(seed)
+    returns = rng.standard_normal((bars, len(SYMBOLS))) * 0.01 + rng.standard_normal((bars, 1)) * 0.02
+    closes = 100 * np.cumprod(1 + returns, axis=0)
+    for j, symbol in enumerate(SYMBOLS):
+        path = os.path.join(directory, symbol + '.csv')
+        with open(path, 'a' if start else 'w') as f:
+            if not start:
+                f.write('timestamp,open,high,low,close,volume\n')
+            f.writelines(f'{1700000000 + (start + i) * 3600},{c},{c},{c},{c},1\n' for i, c in enumerate(closes[:, j]))
+
+
+def bench_risk(results, workdir):
+    directory = os.path.join(workdir, 'ohlcv')
+    os.makedirs(directory)
+    write_ohlcv(directory, 20000)
+    start = time.perf_counter()
+    risk = PortfolioRisk(directory, SYMBOLS)
+    results['risk.load_20k_bars_s'] = (time.perf_counter() - start, 'lower')
+
+    bar = [20000]
+
+    def new_bar():
+        write_ohlcv(directory, 1, bar[0], seed=bar[0])
+        bar[0] += 1
+        risk.refresh()
+    results['risk.new_bar_s'] = (timed(new_bar, 20), 'lower')
+
+    positions = {symbol: 5000.0 * (-1) ** i for i, symbol in enumerate(SYMBOLS)}
+    results['risk.report_with_trade_s'] = (timed(lambda: risk.report(positions, 'ETHUSDT', 2500.0), 20), 'lower')
+
+    app = stub_calculator()
+    app.portfolio_risk = risk
+    app.exposure.load([{'id': i, 'Symbol': s, 'Direction': 'LONG', 'Position Size': 5000.0, 'Leverage': 5.0,
+                        'Risk Amount': 100.0, 'Status': 'OPEN'} for i, s in enumerate(SYMBOLS)])
+    calls = 1000
+    elapsed = timed(lambda: [app.calculate_position() for _ in range(calls)], 3)
+    results['risk.gui_calculate_position.calls_per_s'] = (calls / elapsed, 'higher')
+
+    # In-process, so the number is the per-symbol loop without pool start-up
+    paths = [convert_bars(directory, symbol) for symbol in SYMBOLS]
+    grid = [(1.0, stop, 'tier') for stop in DEFAULT_STOP_GRID]
+    elapsed = timed(lambda: [run_symbol(path, symbol, 'breakout', (20,), grid, {})
+                             for path, symbol in zip(paths, SYMBOLS)], 3)
+    results['risk.backtest.bars_per_s'] = (len(SYMBOLS) * bar[0] * len(grid) / elapsed, 'higher')
+
+
+def bench_startup(results):
+    import_ms, _ = startup_budget.measure(startup_budget.IMPORT_PROBE.format(heavy=[]), 5)
+    results['startup.import_s'] = (import_ms / 1000, 'lower')
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        window_ms, _ = startup_budget.measure(startup_budget.WINDOW_PROBE, 5)
+        results['startup.window_s'] = (window_ms / 1000, 'lower')
+
+
+def compare(results, baseline, threshold):
+    # Returns (name, baseline, current, change) for every metric that got worse
+    regressions = []
+    for name, entry in results.items():
+        old = baseline.get('results', {}).get(name)
+        if not old or not old['value']:
+            continue
+        change = (entry['value'] - old['value']) / old['value']
+        worse = change > threshold if entry['better'] == 'lower' else change < -threshold
+        if worse:
+            regressions.append((name, old['value'], entry['value'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sizing, journal I/O, watchlist, portfolio risk and startup")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Synthetic journal sizes, e.g. 1000,10000,100000,1000000")
+    parser.add_argument('--only', nargs='+', choices=['sizing', 'journal', 'watchlist', 'risk', 'startup'])
+    parser.add_argument('-o', '--output', help="Write results as JSON here")
+    parser.add_argument('--compare', metavar='BASELINE', help="Flag regressions against a saved results file")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown before flagging, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    groups = args.only or ['sizing', 'journal', 'watchlist', 'risk', 'startup']
+    raw = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'sizing' in groups:
+            bench_sizing(raw)
+        if 'journal' in groups:
+            bench_journal(raw, workdir, sizes)
+        if 'watchlist' in groups:
+            bench_watchlist(raw, workdir)
+        if 'risk' in groups:
+            bench_risk(raw, workdir)
+        if 'startup' in groups:
+            bench_startup(raw)
+
+    results = {name: {'value': value, 'better': better} for name, (value, better) in raw.items()}
+    report = {
+        'meta': {
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'results': results
+    }
+
+    for name, entry in results.items():
+        print(f"{name:<48} {entry['value']:>14.6g}  ({entry['better']} is better)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.6g} -> {new:.6g} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import csv
+import json
+import math
+import os
+import time
+from array import array
+
+# Columns of the spec file, per symbol
+SPEC_COLUMNS = ['Tick Size', 'Lot Size', 'Min Qty', 'Max Leverage']
+
+# How often current() looks at the file for changes, in seconds
+CHECK_INTERVAL = 1.0
+
+
+def step_decimals(step):
+    # Decimal places a price or quantity on this step needs, e.g. 0.001 -> 3
+    return max(0, -math.floor(math.log10(step) + 1e-9)) if step > 0 else 0
+
+
+def round_down(value, step, decimals):
+    # The epsilon keeps 0.3 / 0.1 from flooring to 2
+    return round(math.floor(value / step + 1e-9) * step, decimals)
+
+
+def round_up(value, step, decimals):
+    return round(math.ceil(value / step - 1e-9) * step, decimals)
+
+
+class ContractSpecs:
+    """Exchange contract specs by symbol, precomputed into flat columns.
+
+    Each column is an array('d') with one entry per symbol and `index` maps
+    a symbol to its row, so a lookup is one dict access and batch sizing can
+    view a column with np.frombuffer without copying. Instances never
+    change; a reload builds a new one.
+    """
+
+    def __init__(self, specs=None):
+        self.symbols = sorted(specs or {})
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.columns = {column: array('d') for column in SPEC_COLUMNS}
+        for symbol in self.symbols:
+            for column in SPEC_COLUMNS:
+                self.columns[column].append(float(specs[symbol][column]))
+        self.price_decimals = array('i', (step_decimals(t) for t in self.columns['Tick Size']))
+        self.qty_decimals = array('i', (step_decimals(s) for s in self.columns['Lot Size']))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def get(self, symbol):
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        return {column: self.columns[column][row] for column in SPEC_COLUMNS}
+
+    def order(self, symbol, direction, position_size, entry_price, stop_loss_percent):
+        """The orderable version of a sized position, or None without a spec or price.
+
+        The quantity is rounded down to the lot step, so the order's notional
+        never exceeds position_size and the trade stays within its risk
+        budget. The stop is rounded towards the entry for the same reason.
+        quantity is 0 when the position is smaller than the minimum order.
+        """
+        row = self.index.get(symbol)
+        if row is None or not entry_price or entry_price <= 0:
+            return None
+        tick, lot, min_qty, max_leverage = (self.columns[c][row] for c in SPEC_COLUMNS)
+        price_decimals, qty_decimals = self.price_decimals[row], self.qty_decimals[row]
+
+        price = round(round(entry_price / tick) * tick, price_decimals)
+        if price <= 0:
+            return None  # Below half a tick
+        quantity = round_down(position_size / price, lot, qty_decimals)
+        if quantity < min_qty:
+            quantity = 0.0
+        if direction == 'SHORT':
+            stop_price = round_down(price * (1 + stop_loss_percent / 100), tick, price_decimals)
+        else:
+            stop_price = round_up(price * (1 - stop_loss_percent / 100), tick, price_decimals)
+        return {
+            'quantity': quantity,
+            'price': price,
+            'stop_price': stop_price,
+            'notional': round(quantity * price, price_decimals + qty_decimals),
+            'min_qty': min_qty,
+            'max_leverage': max_leverage,
+            'price_decimals': price_decimals,
+            'qty_decimals': qty_decimals
+        }
+
+    def rows(self, symbols):
+        # Row per symbol for the array methods, -1 where there is no spec
+        import numpy as np
+
+        return np.fromiter((self.index.get(s, -1) for s in symbols), dtype=np.int64, count=len(symbols))
+
+    def column(self, name, rows):
+        # Column values for rows from rows(), NaN where there is no spec
+        import numpy as np
+
+        values = np.frombuffer(self.columns[name], dtype=np.float64) if len(self) else np.full(1, np.nan)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)], np.nan)
+
+    def decimals(self, name, rows):
+        # price_decimals or qty_decimals for rows from rows(), 0 where there is no spec
+        import numpy as np
+
+        values = np.frombuffer(getattr(self, name), dtype=np.int32) if len(self) else np.zeros(1, dtype=np.int32)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)], 0)
+
+    def quantities(self, symbols, position_size, entry_price):
+        """Vectorized order quantities for batch sizing.
+
+        Returns a dict of arrays: quantity (rounded down to the lot step, 0
+        below the minimum, NaN without a spec or price), price rounded to
+        the tick, notional, and max_leverage from the exchange. Each row is
+        rounded to its own symbol's decimals, so it matches order().
+        """
+        import numpy as np
+
+        rows = self.rows(symbols)
+        tick, lot, min_qty, max_leverage = (self.column(c, rows) for c in SPEC_COLUMNS)
+        price_scale = 10.0 ** self.decimals('price_decimals', rows)
+        qty_scale = 10.0 ** self.decimals('qty_decimals', rows)
+        entry_price = np.asarray(entry_price, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price = np.round(np.round(entry_price / tick) * tick * price_scale) / price_scale
+            quantity = np.floor(np.asarray(position_size, dtype=float) / price / lot + 1e-9) * lot
+            quantity = np.round(quantity * qty_scale) / qty_scale
+            quantity = np.where(quantity < min_qty, 0.0, quantity)
+            quantity = np.where(price > 0, quantity, np.nan)
+            notional_scale = price_scale * qty_scale
+            notional = np.round(quantity * price * notional_scale) / notional_scale
+        return {
+            'quantity': quantity,
+            'price': price,
+            'notional': notional,
+            'max_leverage': max_leverage
+        }
+
+    @classmethod
+    def load(cls, path):
+        # JSON keyed by symbol, or CSV with a Symbol column and SPEC_COLUMNS
+        if path.lower().endswith('.csv'):
+            with open(path, 'r', newline='') as f:
+                specs = {row['Symbol'].strip().upper(): row for row in csv.DictReader(f)}
+        else:
+            with open(path, 'r') as f:
+                specs = {symbol.upper(): spec for symbol, spec in json.load(f).items()}
+        return cls(specs)
+
+
+class ContractSpecFile:
+    """Keeps the specs in sync with the file they were loaded from.
+
+    current() returns the loaded specs, reloading them when the file's size
+    or modification time changed. It looks at most once per CHECK_INTERVAL,
+    so it is cheap enough to call on every calculation. A file that fails
+    to parse (say, half saved by an editor) keeps the previous specs.
+    """
+
+    def __init__(self, path='contract_specs.json'):
+        self.path = path
+        self.specs = ContractSpecs()
+        self.stat = None
+        self.checked = None
+        self.error = None
+        self.current()
+
+    def current(self):
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < CHECK_INTERVAL:
+            return self.specs
+        self.checked = now
+        try:
+            stat = os.stat(self.path)
+            stat = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stat = None
+        if stat != self.stat:
+            self.stat = stat
+            try:
+                self.specs = ContractSpecs.load(self.path) if stat else ContractSpecs()
+                self.error = None
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.error = e
+        return self.specs
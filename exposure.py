@@ -0,0 +1,99 @@
+import json
+import os
+
+DEFAULT_LIMITS = {
+    "Max Total Risk %": 10,
+    "Max Total Margin %": 50
+}
+
+
+def load_limits(path='portfolio_limits.json'):
+    # Portfolio caps as % of capital; written with defaults on first use
+    limits = dict(DEFAULT_LIMITS)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            limits.update(json.load(f))
+    else:
+        with open(path, 'w') as f:
+            json.dump(limits, f, indent=4)
+    return limits
+
+
+def trade_exposure(trade):
+    # (notional, margin, risk) committed by one journal row
+    notional = trade.get('Position Size') or 0.0
+    leverage = trade.get('Leverage') or 1.0
+    risk = trade.get('Risk Amount') or 0.0
+    return notional, notional / leverage, risk
+
+
+class ExposureBook:
+    """Running totals over the journal's OPEN trades.
+
+    Built once from the open trades, then kept current with add_trade and
+    close_trade, so nothing ever rescans the journal.
+    """
+
+    def __init__(self):
+        self.trades = {}
+        self.total_notional = 0.0
+        self.total_margin = 0.0
+        self.total_risk = 0.0
+        self.by_symbol = {}
+        self.symbol_counts = {}
+
+    def load(self, trades):
+        for trade in trades:
+            self.add_trade(trade)
+
+    def add_trade(self, trade):
+        if trade.get('Status') != 'OPEN' or trade['id'] in self.trades:
+            return
+        notional, margin, risk = trade_exposure(trade)
+        entry = (trade['Symbol'], trade['Direction'], notional, margin, risk)
+        self.trades[trade['id']] = entry
+        self.apply(entry, 1)
+
+    def close_trade(self, trade_id):
+        entry = self.trades.pop(trade_id, None)
+        if entry is not None:
+            self.apply(entry, -1)
+
+    def apply(self, entry, sign):
+        symbol, direction, notional, margin, risk = entry
+        self.total_notional += sign * notional
+        self.total_margin += sign * margin
+        self.total_risk += sign * risk
+
+        sides = self.by_symbol.setdefault(symbol, {'LONG': 0.0, 'SHORT': 0.0})
+        sides[direction] = sides.get(direction, 0.0) + sign * notional
+        self.symbol_counts[symbol] = self.symbol_counts.get(symbol, 0) + sign
+        if not self.symbol_counts[symbol]:
+            del self.symbol_counts[symbol]
+            del self.by_symbol[symbol]
+
+    def net_exposure(self, symbol):
+        sides = self.by_symbol.get(symbol, {})
+        return sides.get('LONG', 0.0) - sides.get('SHORT', 0.0)
+
+    def with_trade(self, symbol, direction, position_size, leverage, risk_amount):
+        # Totals as they would be with one more trade on top of the open ones
+        signed = position_size if direction == 'LONG' else -position_size
+        return {
+            'open_trades': len(self.trades) + 1,
+            'total_notional': self.total_notional + position_size,
+            'total_margin': self.total_margin + position_size / leverage,
+            'total_risk': self.total_risk + risk_amount,
+            'net_exposure': self.net_exposure(symbol) + signed
+        }
+
+    def check_limits(self, totals, capital, limits):
+        # Returns a message for each portfolio cap the totals break
+        breaches = []
+        risk_pct = totals['total_risk'] / capital * 100
+        margin_pct = totals['total_margin'] / capital * 100
+        if risk_pct > limits["Max Total Risk %"]:
+            breaches.append(f"Total risk {risk_pct:.1f}% > {limits['Max Total Risk %']}% cap")
+        if margin_pct > limits["Max Total Margin %"]:
+            breaches.append(f"Total margin {margin_pct:.1f}% > {limits['Max Total Margin %']}% cap")
+        return breaches
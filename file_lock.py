@@ -0,0 +1,129 @@
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+if os.name == 'nt':
+    import msvcrt
+
+    def lock_file(f):
+        # LK_LOCK gives up after ~10 s with EDEADLOCK, so keep asking until
+        # we get it; any other error (a bad handle, a read-only share) is real
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError as e:
+                if e.errno != errno.EDEADLOCK:
+                    raise
+
+    def unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    """Exclusive lock shared by every process that locks the same path.
+
+    Waiting blocks in the OS, not in a sleep loop, so waiters get the lock as
+    soon as it is released. Re-entrant and thread-safe within a process.
+    Wait and hold times are counted here, and also sent to `metrics`
+    (an instrumentation.Metrics) as lock.<name>.wait / .hold when given.
+    """
+
+    def __init__(self, path, name=None, metrics=None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.metrics = metrics
+        self.thread_lock = threading.RLock()
+        self.file = None
+        self.depth = 0
+        self.acquired_at = 0.0
+        self.counts = {'acquired': 0, 'wait_s': 0.0, 'max_wait_s': 0.0, 'hold_s': 0.0, 'max_hold_s': 0.0}
+
+    def acquire(self):
+        start = time.perf_counter()
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                if self.file is None:
+                    self.file = open(self.path, 'a+b')
+                lock_file(self.file)
+            except BaseException:
+                # Not held, so other threads must not wait on it forever
+                self.thread_lock.release()
+                raise
+            self.acquired_at = time.perf_counter()
+            self.record('wait', self.acquired_at - start)
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            unlock_file(self.file)
+            self.record('hold', time.perf_counter() - self.acquired_at)
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def record(self, kind, seconds):
+        if kind == 'wait':
+            self.counts['acquired'] += 1
+        self.counts[f'{kind}_s'] += seconds
+        self.counts[f'max_{kind}_s'] = max(self.counts[f'max_{kind}_s'], seconds)
+        if self.metrics is not None:
+            self.metrics.observe(f'lock.{self.name}.{kind}', seconds)
+
+    def close(self):
+        with self.thread_lock:
+            if self.file is not None and self.depth == 0:
+                self.file.close()
+                self.file = None
+
+
+@contextmanager
+def atomic_output(path):
+    """Yields a temp path next to `path` that replaces it once the block is done.
+
+    The temp file is flushed to disk before the rename, so after a crash
+    `path` holds either the old contents or the new ones, never a mix.
+    Temp names are unique, so concurrent writers cannot clobber each other.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    root, ext = os.path.splitext(name)
+    fd, tmp = tempfile.mkstemp(prefix=root + '.', suffix='.tmp' + ext, dir=directory)
+    os.close(fd)
+    try:
+        yield tmp
+        with open(tmp, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, data, **kwargs):
+    with atomic_output(path) as tmp:
+        with open(tmp, 'w') as f:
+            json.dump(data, f, **kwargs)
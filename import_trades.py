@@ -0,0 +1,292 @@
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from trade_journal import TradeJournal
+
+# Exchange export columns for each fill field; pnl and fee are optional
+FORMATS = {
+    'generic': {
+        'time': 'time', 'symbol': 'symbol', 'side': 'side', 'price': 'price',
+        'quantity': 'quantity', 'fee': 'fee', 'pnl': 'pnl'
+    },
+    'binance': {
+        'time': 'Date(UTC)', 'symbol': 'Symbol', 'side': 'Side', 'price': 'Price',
+        'quantity': 'Quantity', 'fee': 'Fee', 'pnl': 'Realized Profit'
+    }
+}
+
+BUY_SIDES = {'BUY', 'B', 'BID', 'LONG'}
+SELL_SIDES = {'SELL', 'S', 'ASK', 'SHORT'}
+
+# Quantities below this are treated as a flat position
+EPSILON = 1e-9
+
+
+def parse_number(value):
+    # Exports sometimes append the asset, like "0.015 BTC"
+    if value is None or not str(value).strip():
+        return 0.0
+    return float(str(value).split()[0].replace(',', ''))
+
+
+def parse_optional_number(value):
+    # None for a blank or unreadable cell, so P/L falls back to the fill prices
+    try:
+        return float(str(value).split()[0].replace(',', ''))
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_time(value):
+    value = value.strip()
+    try:
+        stamp = float(value)
+        # Epoch seconds or milliseconds
+        if stamp > 1e11:
+            stamp /= 1000
+        moment = datetime.fromtimestamp(stamp, timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        moment = datetime.fromisoformat(value.replace('Z', ''))
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def read_lines_backwards(path, block_size=1 << 16):
+    # Yields the lines of a file last to first, holding one block at a time
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b''
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + tail).split(b'\n')
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode('utf-8-sig')
+        if tail.strip():
+            yield tail.decode('utf-8-sig')
+
+
+def read_fills(path, order):
+    """Yields fills as dicts oldest first, without loading the file."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f))
+
+    if order == 'desc':
+        lines = read_lines_backwards(path)
+        rows = csv.DictReader(lines, fieldnames=header)
+        for row in rows:
+            if list(row.values()) != header:
+                yield row
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+
+
+def detect_order(path, time_column):
+    # Compare the first and last fill to see which way the export is sorted
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        first = next(reader, None)
+    last_line = next(read_lines_backwards(path), None)
+    if first is None or last_line is None:
+        return 'asc'
+    last = next(csv.DictReader(io.StringIO(last_line), fieldnames=header))
+    return 'desc' if parse_time(last[time_column]) < parse_time(first[time_column]) else 'asc'
+
+
+class RoundTripBuilder:
+    """Groups fills into round-trip trades, one open position per symbol.
+
+    A trade opens when a symbol's position leaves zero and closes when it
+    returns to zero; a fill that flips the position closes one trade and
+    opens the next. Memory holds only the open positions.
+    """
+
+    def __init__(self, source=''):
+        self.source = source
+        self.positions = {}
+
+    def add_fill(self, time_, symbol, side, price, quantity, fee=0.0, pnl=None):
+        sign = 1 if side in BUY_SIDES else -1
+        remaining = quantity
+        closed = []
+        while remaining > EPSILON:
+            position = self.positions.get(symbol)
+            if position is None:
+                self.positions[symbol] = {
+                    'time': time_, 'sign': sign, 'size': remaining, 'entry_value': price * remaining,
+                    'entry_qty': remaining, 'exit_value': 0.0, 'exit_qty': 0.0, 'fees': fee,
+                    'pnl': pnl, 'fills': 1
+                }
+                return closed
+            position['fills'] += 1
+            if fee:
+                position['fees'] += fee
+                fee = 0.0
+            if pnl is not None:
+                position['pnl'] = (position['pnl'] or 0.0) + pnl
+                pnl = None
+
+            if position['sign'] == sign:
+                position['size'] += remaining
+                position['entry_value'] += price * remaining
+                position['entry_qty'] += remaining
+                return closed
+
+            # Reduce, and close once the position is flat
+            reduce = min(remaining, position['size'])
+            position['size'] -= reduce
+            position['exit_value'] += price * reduce
+            position['exit_qty'] += reduce
+            remaining -= reduce
+            if position['size'] <= EPSILON:
+                closed.append(self.to_trade(symbol, self.positions.pop(symbol), 'CLOSED'))
+        return closed
+
+    def to_trade(self, symbol, position, status):
+        entry_price = position['entry_value'] / position['entry_qty']
+        exit_price = position['exit_value'] / position['exit_qty'] if position['exit_qty'] else None
+        pnl = position['pnl']
+        if pnl is None and exit_price is not None:
+            pnl = position['sign'] * (exit_price - entry_price) * position['exit_qty']
+        if pnl is not None:
+            pnl -= position['fees']
+        return {
+            'Date': position['time'],
+            'Symbol': symbol,
+            'Direction': 'LONG' if position['sign'] > 0 else 'SHORT',
+            'Entry Price': entry_price,
+            'Position Size': position['entry_value'],
+            'Stop Loss': None,
+            'Risk Amount': None,
+            'Leverage': None,
+            'Status': status,
+            'Exit Price': exit_price,
+            'Profit/Loss': pnl if status == 'CLOSED' else None,
+            'Notes': f"Imported from {self.source} ({position['fills']} fills)"
+        }
+
+    def open_trades(self):
+        return [self.to_trade(symbol, position, 'OPEN') for symbol, position in self.positions.items()]
+
+
+def import_file(journal, path, columns, order='auto', chunk_size=10000, include_open=False,
+                dry_run=False, progress=None):
+    """Streams one export into the journal and returns counters for the report."""
+    if order == 'auto':
+        order = detect_order(path, columns['time'])
+
+    builder = RoundTripBuilder(os.path.basename(path))
+    stats = {'fills': 0, 'trades': 0, 'duplicates': 0, 'skipped_open': 0}
+    pending = []
+    pending_keys = set()
+
+    def flush():
+        fresh = [t for t in pending if not journal.contains(t)]
+        stats['duplicates'] += len(pending) - len(fresh)
+        stats['trades'] += len(fresh)
+        if fresh and not dry_run:
+            journal.append_many(fresh)
+        pending.clear()
+        pending_keys.clear()
+
+    def queue(trade):
+        key = (trade['Date'], trade['Symbol'], trade['Direction'], trade['Entry Price'])
+        if key in pending_keys:
+            stats['duplicates'] += 1
+            return
+        pending_keys.add(key)
+        pending.append(trade)
+
+    has_fee = columns.get('fee')
+    has_pnl = columns.get('pnl')
+    for row in read_fills(path, order):
+        stats['fills'] += 1
+        side = row[columns['side']].strip().upper()
+        if side not in BUY_SIDES and side not in SELL_SIDES:
+            continue
+        fee = abs(parse_number(row[has_fee])) if has_fee and has_fee in row else 0.0
+        pnl = parse_optional_number(row[has_pnl]) if has_pnl and has_pnl in row else None
+        for trade in builder.add_fill(
+            parse_time(row[columns['time']]), row[columns['symbol']].strip().upper(), side,
+            parse_number(row[columns['price']]), abs(parse_number(row[columns['quantity']])), fee, pnl
+        ):
+            queue(trade)
+        if stats['fills'] % chunk_size == 0:
+            flush()
+            if progress:
+                progress(stats)
+
+    if include_open:
+        for trade in builder.open_trades():
+            queue(trade)
+    else:
+        stats['skipped_open'] = len(builder.positions)
+    flush()
+    return stats
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import exchange trade history CSVs into the trade journal")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='generic')
+    parser.add_argument('--map', action='append', default=[], metavar='FIELD=COLUMN',
+                        help="Override a column, e.g. --map price='Avg Price'. Fields: " + ', '.join(FORMATS['generic']))
+    parser.add_argument('--order', choices=['auto', 'asc', 'desc'], default='auto', help="Time order of the rows")
+    parser.add_argument('--journal', default='trade_journal.db')
+    parser.add_argument('--chunk-size', type=int, default=10000, help="Fills per journal write")
+    parser.add_argument('--include-open', action='store_true', help="Also import positions still open at the end")
+    parser.add_argument('--dry-run', action='store_true', help="Parse and de-duplicate without writing")
+    args = parser.parse_args()
+
+    columns = dict(FORMATS[args.format])
+    for mapping in args.map:
+        field, column = mapping.split('=', 1)
+        columns[field] = column
+
+    # A new journal only picks up the older Excel journal kept next to it,
+    # not whatever trade_journal.xlsx is in the working directory
+    journal = TradeJournal(args.journal, os.path.splitext(args.journal)[0] + '.xlsx')
+    start = time.perf_counter()
+
+    def progress(stats):
+        elapsed = time.perf_counter() - start
+        print(f"  {stats['fills']:,} fills, {stats['trades']:,} trades ({stats['fills'] / elapsed:,.0f} fills/s)",
+              file=sys.stderr)
+
+    for path in args.files:
+        file_start = time.perf_counter()
+        stats = import_file(journal, path, columns, args.order, args.chunk_size, args.include_open,
+                            args.dry_run, progress)
+        elapsed = time.perf_counter() - file_start
+        print(f"{path}: {stats['fills']:,} fills -> {stats['trades']:,} new trades, "
+              f"{stats['duplicates']:,} duplicates, {stats['skipped_open']} open positions skipped "
+              f"in {elapsed:.1f}s ({stats['fills'] / max(elapsed, 1e-9):,.0f} fills/s)")
+
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:,.1f} MB")
+    journal.close()
+
+
+if __name__ == "__main__":
+    main()
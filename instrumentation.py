@@ -0,0 +1,157 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from file_lock import atomic_write_json
+
+# Bucket upper bounds in seconds, 10% apart from 1 microsecond to ~2 minutes
+BUCKETS = [1e-6 * 1.1 ** i for i in range(196)]
+QUANTILES = [0.5, 0.9, 0.99]
+
+ENV_FILE = 'TRADING_CALC_METRICS'
+ENV_PORT = 'TRADING_CALC_METRICS_PORT'
+
+
+class Histogram:
+    # Fixed log-spaced buckets: constant memory, quantiles within 10%
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(BUCKETS[index] if index < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+
+class Metrics:
+    """Named timing histograms, safe to record into from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def wrap(self, function, name):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, obj, prefix, names):
+        # Replace methods on this one instance; the class is left untouched,
+        # so nothing is wrapped unless metrics were turned on
+        for name in names:
+            setattr(obj, name, self.wrap(getattr(obj, name), f'{prefix}.{name}'))
+
+    def snapshot(self):
+        with self.lock:
+            items = list(self.histograms.items())
+        return {
+            name: {
+                'count': h.count,
+                'sum_s': h.total,
+                'max_s': h.max,
+                **{f'p{int(q * 100)}_s': h.quantile(q) for q in QUANTILES}
+            }
+            for name, h in sorted(items)
+        }
+
+    def write_json(self, path):
+        atomic_write_json(path, self.snapshot(), indent=2)
+
+    def prometheus_text(self):
+        lines = ['# TYPE trading_calc_duration_seconds summary']
+        for name, stats in self.snapshot().items():
+            label = f'operation="{name}"'
+            for q in QUANTILES:
+                lines.append(f'trading_calc_duration_seconds{{{label},quantile="{q}"}} {stats[f"p{int(q * 100)}_s"]:.9f}')
+            lines.append(f'trading_calc_duration_seconds_sum{{{label}}} {stats["sum_s"]:.9f}')
+            lines.append(f'trading_calc_duration_seconds_count{{{label}}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        # Prometheus text format on http://host:port/metrics, from a daemon thread
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+class LagProbe:
+    """Measures how late Tk runs a timer, which is how long mainloop was blocked."""
+
+    def __init__(self, root, metrics, interval_ms=50):
+        self.root = root
+        self.metrics = metrics
+        self.interval_ms = interval_ms
+        self.schedule()
+
+    def schedule(self):
+        self.due = time.perf_counter() + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self.tick)
+
+    def tick(self):
+        self.metrics.observe('tk.loop_lag', max(0.0, time.perf_counter() - self.due))
+        self.schedule()
+
+
+def settings_from_env(metrics_file=None, metrics_port=None):
+    # CLI values win; otherwise TRADING_CALC_METRICS=<file or 1> and TRADING_CALC_METRICS_PORT
+    env_file = os.environ.get(ENV_FILE)
+    if metrics_file is None and env_file:
+        metrics_file = 'trading_metrics.json' if env_file == '1' else env_file
+    if metrics_port is None and os.environ.get(ENV_PORT):
+        metrics_port = int(os.environ[ENV_PORT])
+    return metrics_file, metrics_port
@@ -0,0 +1,165 @@
+import json
+import os
+
+from file_lock import atomic_write_json
+
+
+def is_closed(trade):
+    return trade.get('Status') != 'OPEN' and trade.get('Profit/Loss') is not None
+
+
+def r_multiple(trade):
+    risk = trade.get('Risk Amount')
+    if not risk or risk <= 0:
+        return None
+    return trade['Profit/Loss'] / risk
+
+
+def new_bucket():
+    return {'trades': 0, 'wins': 0, 'losses': 0, 'pnl': 0.0, 'gross_profit': 0.0, 'gross_loss': 0.0,
+            'r_trades': 0, 'total_r': 0.0}
+
+
+def add_to_bucket(bucket, pnl, r):
+    bucket['trades'] += 1
+    bucket['pnl'] += pnl
+    if pnl > 0:
+        bucket['wins'] += 1
+        bucket['gross_profit'] += pnl
+    elif pnl < 0:
+        bucket['losses'] += 1
+        bucket['gross_loss'] -= pnl
+    if r is not None:
+        bucket['r_trades'] += 1
+        bucket['total_r'] += r
+
+
+def summarize(bucket):
+    trades = bucket['trades']
+    return {
+        'trades': trades,
+        'win_rate': bucket['wins'] / trades if trades else None,
+        'average_r': bucket['total_r'] / bucket['r_trades'] if bucket['r_trades'] else None,
+        'expectancy': bucket['pnl'] / trades if trades else None,
+        'profit_factor': (bucket['gross_profit'] / bucket['gross_loss'] if bucket['gross_loss']
+                          else (float('inf') if bucket['gross_profit'] else None)),
+        'total_pnl': bucket['pnl']
+    }
+
+
+class JournalStats:
+    """Running performance statistics over closed journal trades.
+
+    Every update is O(1). Closed trades are folded in the order they were
+    closed, which is the order of their journal update seqs, however the
+    trades and updates were batched into catch_up calls; recompute() runs
+    the same fold, so a full recomputation gives identical state(). Only a
+    closed trade with no update (journals from before every close had one)
+    is folded when it is added. update_seq is the last update counted.
+    """
+
+    def __init__(self):
+        self.last_id = 0
+        self.update_seq = 0
+        self.logged = 0
+        self.overall = new_bucket()
+        self.per_symbol = {}
+        self.equity = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+
+    def add_trade(self, trade, fold=True):
+        # Call once for every trade appended to the journal; fold=False when
+        # its close is counted by add_update instead
+        self.last_id = max(self.last_id, trade['id'])
+        self.logged += 1
+        if fold and is_closed(trade):
+            self.add_closed(trade)
+
+    def add_closed(self, trade):
+        # Call when a trade is closed, or via add_trade if it was logged closed
+        pnl = trade['Profit/Loss']
+        r = r_multiple(trade)
+        add_to_bucket(self.overall, pnl, r)
+        add_to_bucket(self.per_symbol.setdefault(trade['Symbol'], new_bucket()), pnl, r)
+
+        self.equity += pnl
+        if self.equity > self.peak:
+            self.peak = self.equity
+        if self.peak - self.equity > self.max_drawdown:
+            self.max_drawdown = self.peak - self.equity
+
+    def add_update(self, seq, trade):
+        # Call when a trade already passed to add_trade is closed
+        self.update_seq = max(self.update_seq, seq)
+        if is_closed(trade):
+            self.add_closed(trade)
+
+    def catch_up(self, new_trades, updates):
+        # New trades only count as logged when they have an update, which
+        # then folds their close in seq order. An update for a trade not
+        # seen yet is skipped, and add_trade folds it when it arrives
+        updates = [(seq, trade) for seq, trade in updates if seq > self.update_seq]
+        updated = {trade['id'] for _, trade in updates}
+        for trade in new_trades:
+            if trade['id'] > self.last_id:
+                self.add_trade(trade, fold=trade['id'] not in updated)
+        for seq, trade in updates:
+            if trade['id'] <= self.last_id:
+                self.add_update(seq, trade)
+            else:
+                self.update_seq = seq
+
+    @classmethod
+    def recompute(cls, trades, updates=()):
+        # trades in id order and the journal's updates_since(0)
+        stats = cls()
+        stats.catch_up(trades, updates)
+        return stats
+
+    def summary(self):
+        result = summarize(self.overall)
+        result['max_drawdown'] = self.max_drawdown
+        result['logged'] = self.logged
+        return result
+
+    def symbol_summary(self, symbol):
+        return summarize(self.per_symbol.get(symbol, new_bucket()))
+
+    def state(self):
+        return {
+            'last_id': self.last_id,
+            'update_seq': self.update_seq,
+            'logged': self.logged,
+            'overall': self.overall,
+            'per_symbol': self.per_symbol,
+            'equity': self.equity,
+            'peak': self.peak,
+            'max_drawdown': self.max_drawdown
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, JournalStats) and self.state() == other.state()
+
+    def save(self, path):
+        # Several calculators may save at once; each write is all or nothing
+        atomic_write_json(path, self.state())
+
+    @classmethod
+    def load(cls, path, cache):
+        # Saved state plus any trades the journal cache has beyond it
+        stats = cls()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    state = json.load(f)
+                for key, value in state.items():
+                    setattr(stats, key, value)
+            except (ValueError, OSError):
+                stats = cls()
+        if stats.last_id > cache.meta['last_id']:
+            # The journal was replaced since the state was saved
+            stats = cls()
+        stats.catch_up(cache.trades(cache.column('id') > stats.last_id),
+                       cache.journal.updates_since(stats.update_seq))
+        return stats
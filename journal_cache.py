@@ -0,0 +1,379 @@
+import copy
+import json
+import os
+
+import numpy as np
+
+from file_lock import FileLock, atomic_write_json
+
+# Column name -> (file name, dtype). Text columns with few distinct values are
+# stored as int32 codes into a per-column list kept in meta.json; Notes is
+# never cached and stays in the journal.
+CACHE_COLUMNS = {
+    'id': ('id', np.int64),
+    'Date': ('date', 'datetime64[s]'),
+    'Symbol': ('symbol', np.int32),
+    'Direction': ('direction', np.int32),
+    'Entry Price': ('entry_price', np.float64),
+    'Position Size': ('position_size', np.float64),
+    'Stop Loss': ('stop_loss', np.float64),
+    'Risk Amount': ('risk_amount', np.float64),
+    'Leverage': ('leverage', np.float64),
+    'Status': ('status', np.int32),
+    'Exit Price': ('exit_price', np.float64),
+    'Profit/Loss': ('profit_loss', np.float64)
+}
+CATEGORY_COLUMNS = ['Symbol', 'Direction', 'Status']
+
+# The columns a close changes; rewritten in place for just that row
+UPDATE_COLUMNS = ['Status', 'Exit Price', 'Profit/Loss']
+
+
+def date_bound(value):
+    # A From or To filter date, e.g. '2024-03' or '2024-03-15 12:00', as the
+    # cache compares it; journal_export turns the same bound into SQL
+    return np.datetime64(value, 's')
+
+
+def parse_dates(values):
+    try:
+        return np.array([v if v else 'NaT' for v in values], dtype='datetime64[s]')
+    except ValueError:
+        parsed = []
+        for v in values:
+            try:
+                parsed.append(np.datetime64(v, 's'))
+            except (ValueError, TypeError):
+                parsed.append(np.datetime64('NaT'))
+        return np.array(parsed, dtype='datetime64[s]')
+
+
+class JournalCache:
+    """Memory-mapped columnar copy of the journal for fast loads and queries.
+
+    Each column is a flat binary file in `path`, mapped read-only with
+    np.memmap, so opening costs nothing and readers get views, not copies.
+    meta.json holds the row count, the highest cached id, the last journal
+    update applied and the journal file's size and mtime. If the journal
+    changed behind our back, new rows are appended by id and closes are
+    replayed from its update log; if the row counts still disagree it is
+    rebuilt. Indexes by symbol, status and date are built on first use and
+    dropped whenever the rows change.
+
+    Calculators on several screens can share one cache: every change to the
+    files happens under a lock file in `path`, and refresh() picks up what
+    the others wrote.
+    """
+
+    def __init__(self, journal, path=None):
+        self.journal = journal
+        self.path = path or os.path.splitext(journal.db_file)[0] + '.cache'
+        self.meta = None
+        self.columns = {}
+        self.codes = {}
+        self.indexes = {}
+        self.lock = FileLock(os.path.join(self.path, 'lock'), 'cache')
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self.lock:
+            self.meta = self.read_meta()
+            if self.meta is None or self.meta.get('db_stat') != self.db_stat():
+                self.sync()
+            else:
+                self.map_columns()
+        return self
+
+    def refresh(self):
+        """Catches up with the journal and returns what changed since the last call.
+
+        Returns (new trades, [(seq, trade) for closes]), whichever process
+        made them, or None when nothing changed.
+        """
+        last_id, update_seq = self.meta['last_id'], self.meta.get('update_seq', 0)
+        with self.lock:
+            meta = self.read_meta()
+            if meta is not None:
+                self.meta = meta
+            if self.meta is None or self.meta.get('db_stat') != self.db_stat():
+                self.sync()
+            elif len(self.columns['id']) != self.meta['rows']:
+                self.map_columns()
+        new_trades = self.trades(self.columns['id'] > last_id)
+        updates = self.journal.updates_since(update_seq)
+        if not new_trades and not updates:
+            return None
+        self.indexes = {}
+        return new_trades, updates
+
+    def read_meta(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            self.codes = {c: {v: i for i, v in enumerate(meta['categories'][c])} for c in CATEGORY_COLUMNS}
+            return meta
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def write_meta(self, db_stat=None):
+        # db_stat marks the journal state this cache is known to match; only
+        # sync() knows that, since other processes may be writing meanwhile
+        if db_stat is not None:
+            self.meta['db_stat'] = db_stat
+        atomic_write_json(os.path.join(self.path, 'meta.json'), self.meta)
+
+    def db_stat(self):
+        # In WAL mode new commits land in the -wal file first
+        stats = []
+        for path in (self.journal.db_file, self.journal.db_file + '-wal'):
+            try:
+                stat = os.stat(path)
+                stats += [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                stats += [None, None]
+        return stats if stats[0] is not None else None
+
+    def reset(self):
+        # Rows are read after this, so they already include every logged close
+        self.meta = {'rows': 0, 'last_id': 0, 'update_seq': self.journal.max_update_seq(),
+                     'categories': {c: [] for c in CATEGORY_COLUMNS}}
+        self.codes = {c: {} for c in CATEGORY_COLUMNS}
+        for name, _ in CACHE_COLUMNS.values():
+            # Unlink first: another process may still map the old file, and
+            # truncating it under them would crash them
+            try:
+                os.remove(self.column_file(name))
+            except OSError:
+                pass
+            open(self.column_file(name), 'wb').close()
+
+    def sync(self):
+        # Catch up with rows added since the cache was written, or rebuild it.
+        # The journal is stat'ed first: a commit made while we read changes
+        # it again, so the next open or refresh picks that commit up
+        db_stat = self.db_stat()
+        if self.meta is None or self.meta['last_id'] > self.journal.max_id():
+            self.reset()
+        self.map_columns()
+        self.load_rows('id > ?', (self.meta['last_id'],))
+        if self.meta['rows'] != self.journal.count('id <= ?', (self.meta['last_id'],)):
+            # Rows changed below the last cached id, so start over
+            self.reset()
+            self.map_columns()
+            self.load_rows()
+        updates = self.journal.updates_since(self.meta.get('update_seq', 0))
+        if updates:
+            self.update_rows([trade for _, trade in updates], updates[-1][0], write_meta=False)
+        self.write_meta(db_stat)
+
+    def load_rows(self, condition='', params=()):
+        batch = []
+        for row in self.journal.iter_rows(condition, params):
+            batch.append(row)
+            if len(batch) >= 100000:
+                self.append_rows(batch, write_meta=False)
+                batch = []
+        self.append_rows(batch, write_meta=False)
+
+    def column_file(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def map_columns(self):
+        rows = self.meta['rows']
+        self.columns = {}
+        self.indexes = {}
+        for column, (name, dtype) in CACHE_COLUMNS.items():
+            if rows:
+                self.columns[column] = np.memmap(self.column_file(name), dtype=dtype, mode='r', shape=(rows,))
+            else:
+                self.columns[column] = np.empty(0, dtype=dtype)
+
+    def encode(self, column, value):
+        if value is None:
+            return -1
+        codes = self.codes[column]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.meta['categories'][column].append(value)
+        return codes[value]
+
+    def append(self, trades, write_meta=True):
+        # Trades must carry their journal 'id' and arrive in id order. With
+        # several processes writing the journal use refresh() instead
+        if not trades:
+            return
+        with self.lock:
+            self.append_rows(trades, write_meta)
+
+    def append_rows(self, trades, write_meta):
+        if not trades:
+            return
+        rows = self.meta['rows']
+        for column, (name, dtype) in CACHE_COLUMNS.items():
+            values = [t.get(column) for t in trades]
+            if column == 'Date':
+                array = parse_dates(values)
+            elif column in CATEGORY_COLUMNS:
+                array = np.array([self.encode(column, v) for v in values], dtype=dtype)
+            else:
+                array = np.array([np.nan if v is None else v for v in values], dtype=dtype)
+
+            # Write after the last committed row, dropping anything a crash left behind
+            path = self.column_file(name)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.seek(rows * array.itemsize)
+                f.write(array.tobytes())
+                f.truncate()
+
+        self.meta['rows'] = rows + len(trades)
+        self.meta['last_id'] = max(self.meta['last_id'], trades[-1]['id'])
+        self.map_columns()
+        if write_meta:
+            self.write_meta()
+
+    def update(self, trades, seq, write_meta=True):
+        with self.lock:
+            self.update_rows(trades, seq, write_meta)
+
+    def update_rows(self, trades, seq, write_meta):
+        # Rewrites the changed fields of rows already cached; trades not
+        # cached yet get their current values when they are appended
+        rows = [(self.row_index(t['id']), t) for t in trades]
+        rows = [(index, t) for index, t in rows if index is not None]
+        for column in UPDATE_COLUMNS:
+            name, dtype = CACHE_COLUMNS[column]
+            with open(self.column_file(name), 'r+b') as f:
+                for index, trade in rows:
+                    value = trade.get(column)
+                    if column in CATEGORY_COLUMNS:
+                        value = self.encode(column, value)
+                    elif value is None:
+                        value = np.nan
+                    data = np.array([value], dtype=dtype)
+                    f.seek(index * data.itemsize)
+                    f.write(data.tobytes())
+
+        self.meta['update_seq'] = max(self.meta.get('update_seq', 0), seq)
+        self.indexes = {}
+        if write_meta:
+            self.write_meta()
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, name):
+        return self.columns[name]
+
+    def category_mask(self, column, value):
+        code = self.codes[column].get(value)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.columns[column] == code
+
+    def open_mask(self):
+        return self.category_mask('Status', 'OPEN')
+
+    def closed_mask(self):
+        return (self.columns['Status'] != self.codes['Status'].get('OPEN', -2)) & ~np.isnan(self.columns['Profit/Loss'])
+
+    def row_index(self, trade_id):
+        # ids are stored ascending, so a lookup is a binary search
+        ids = self.columns['id']
+        index = int(np.searchsorted(ids, trade_id))
+        if index < len(ids) and ids[index] == trade_id:
+            return index
+        return None
+
+    def category_rows(self, column, value):
+        # Row numbers holding value, ascending, from a sorted copy of the codes
+        if column not in self.indexes:
+            codes = self.columns[column]
+            order = np.argsort(codes, kind='stable')
+            self.indexes[column] = (order, codes[order])
+        order, sorted_codes = self.indexes[column]
+        code = self.codes[column].get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return order[np.searchsorted(sorted_codes, code, 'left'):np.searchsorted(sorted_codes, code, 'right')]
+
+    def date_rows(self, start=None, end=None):
+        # Row numbers with start <= Date < end, in date order; trades without
+        # a readable date sort last and never match, as in SQL
+        if 'Date' not in self.indexes:
+            dates = self.columns['Date']
+            order = np.argsort(dates, kind='stable')
+            self.indexes['Date'] = (order, dates[order], len(dates) - int(np.count_nonzero(np.isnat(dates))))
+        order, sorted_dates, dated = self.indexes['Date']
+        low = 0 if start is None else np.searchsorted(sorted_dates[:dated], date_bound(start), 'left')
+        high = dated if end is None else np.searchsorted(sorted_dates[:dated], date_bound(end), 'left')
+        return order[low:high]
+
+    def sorted_rows(self, column):
+        # Row numbers in column order (category columns by name, blanks last),
+        # built on first use like the other indexes
+        key = ('sorted', column)
+        if key not in self.indexes:
+            if column == 'id':
+                order = np.arange(len(self))
+            elif column == 'Date':
+                order = self.date_rows()
+            else:
+                values = self.columns[column]
+                if column in CATEGORY_COLUMNS:
+                    names = self.meta['categories'][column]
+                    rank = np.empty(len(names) + 1, dtype=np.int64)
+                    rank[sorted(range(len(names)), key=names.__getitem__)] = np.arange(len(names))
+                    rank[-1] = len(names)  # code -1, no value
+                    values = rank[values]
+                order = np.argsort(values, kind='stable')
+            self.indexes[key] = order
+        return self.indexes[key]
+
+    def select(self, symbol=None, status=None, start=None, end=None):
+        # Row numbers matching every filter given, in id order
+        rows = None
+        for column, value in (('Symbol', symbol), ('Status', status)):
+            if value is not None:
+                found = self.category_rows(column, value)
+                rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        if start is not None or end is not None:
+            found = np.sort(self.date_rows(start, end))
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        return np.arange(len(self)) if rows is None else rows
+
+    def trades(self, mask=None):
+        # Rows as journal-style dicts (without Notes), in id order; mask may
+        # also be an array of row numbers
+        selected = {c: (v[mask] if mask is not None else v) for c, v in self.columns.items()}
+        decoded = {}
+        for column, values in selected.items():
+            if column in CATEGORY_COLUMNS:
+                names = self.meta['categories'][column]
+                decoded[column] = [names[i] if 0 <= i < len(names) else None for i in values.tolist()]
+            elif column == 'Date':
+                decoded[column] = [None if np.isnat(d) else str(d).replace('T', ' ') for d in values]
+            elif column == 'id':
+                decoded[column] = values.tolist()
+            else:
+                decoded[column] = [None if v != v else v for v in values.tolist()]
+        return [dict(zip(decoded, row)) for row in zip(*decoded.values())]
+
+    def snapshot(self):
+        """A read-only copy of the rows as they are now, for another thread.
+
+        It shares the mapped columns, which are only ever appended to or
+        rewritten in place, but has its own row count, categories and
+        indexes, so a refresh() on the writer thread never changes it in the
+        middle of a read. Only the query methods may be called on it.
+        """
+        snapshot = copy.copy(self)
+        snapshot.meta = {**self.meta, 'categories': {c: list(v) for c, v in self.meta['categories'].items()}}
+        snapshot.codes = {c: dict(v) for c, v in self.codes.items()}
+        snapshot.columns = dict(self.columns)
+        snapshot.indexes = {}
+        return snapshot
+
+    def r_multiples(self):
+        risk = self.columns['Risk Amount']
+        mask = self.closed_mask() & (risk > 0)
+        return self.columns['Profit/Loss'][mask] / risk[mask]
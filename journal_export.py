@@ -0,0 +1,104 @@
+import argparse
+import os
+
+from file_lock import atomic_output
+from journal_cache import date_bound
+from trade_journal import TradeJournal, JOURNAL_COLUMNS
+
+# Rows read from the journal per query; memory stays at about one chunk
+CHUNK_SIZE = 5000
+
+# Month part of the file name for trades saved without a date
+UNDATED = 'undated'
+
+
+def filter_condition(symbol=None, status=None, start=None, end=None):
+    # SQL for start <= Date < end and the other filters, with its parameters.
+    # Dates are bounded with journal_cache.date_bound and compared as
+    # datetimes, like the viewer does, so '2024-03' or '2024-03-15 12:00'
+    # both work and an export has the rows the viewer shows
+    conditions, params = [], []
+    for sql, value in (('Symbol = ?', symbol), ('Status = ?', status),
+                       ('datetime(Date) >= ?', start), ('datetime(Date) < ?', end)):
+        if value is not None:
+            if sql.startswith('datetime'):
+                value = str(date_bound(value)).replace('T', ' ')
+            conditions.append(sql)
+            params.append(value)
+    return ' AND '.join(conditions), tuple(params)
+
+
+def month_path(path, month):
+    root, ext = os.path.splitext(path)
+    return f'{root}_{month}{ext}'
+
+
+def write_workbook(journal, path, condition, params, chunk_size):
+    # Write-only workbooks stream rows to disk as they are appended, so the
+    # workbook never holds more than the row being written
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Journal')
+    sheet.append(JOURNAL_COLUMNS)
+    rows = 0
+    for trade in journal.iter_rows(condition, params, page_size=chunk_size):
+        sheet.append([trade[c] for c in JOURNAL_COLUMNS])
+        rows += 1
+    # Written aside and renamed, so a crash never leaves a broken workbook
+    with atomic_output(path) as tmp:
+        workbook.save(tmp)
+    return rows
+
+
+def export_journal(journal, path, symbol=None, status=None, start=None, end=None, by_month=False,
+                   chunk_size=CHUNK_SIZE):
+    """Streams the matching trades into an xlsx file and returns {path: rows}.
+
+    With by_month each month with trades gets its own file, named
+    <path>_YYYY-MM.xlsx, and trades without a date go to <path>_undated.xlsx.
+    """
+    condition, params = filter_condition(symbol, status, start, end)
+    if not by_month:
+        return {path: write_workbook(journal, path, condition, params, chunk_size)}
+
+    written = {}
+    for month in journal.months(condition, params):
+        if month is None:
+            extra, extra_params = 'Date IS NULL', ()
+        else:
+            extra, extra_params = 'substr(Date, 1, 7) = ?', (month,)
+        month_file = month_path(path, month or UNDATED)
+        written[month_file] = write_workbook(journal, month_file, ' AND '.join(filter(None, [condition, extra])),
+                                             params + extra_params, chunk_size)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trade journal to Excel")
+    parser.add_argument('-o', '--output', default='trade_journal_export.xlsx')
+    parser.add_argument('--journal', default='trade_journal.db')
+    parser.add_argument('--symbol')
+    parser.add_argument('--status', choices=['OPEN', 'CLOSED'])
+    parser.add_argument('--start', help="First date to include, e.g. 2024-01-01")
+    parser.add_argument('--end', help="Export trades before this date")
+    parser.add_argument('--by-month', action='store_true', help="One file per month")
+    args = parser.parse_args()
+    # Opening a missing journal would create an empty one
+    if not os.path.exists(args.journal):
+        parser.error(f"No journal at {args.journal}")
+
+    journal = TradeJournal(args.journal)
+    try:
+        written = export_journal(journal, args.output, args.symbol and args.symbol.upper(), args.status,
+                                 args.start, args.end, args.by_month)
+    finally:
+        journal.close()
+    for path, rows in written.items():
+        print(f"{path}: {rows:,} trades")
+    if not written:
+        print("No trades matched")
+
+
+if __name__ == "__main__":
+    main()
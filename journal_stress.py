@@ -0,0 +1,201 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Every worker tries to close this trade; exactly one may succeed
+SHARED_NOTE = 'shared'
+
+
+def make_trade(rng, note):
+    return {
+        'Date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'Symbol': rng.choice(['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'SUIUSDT']),
+        'Direction': rng.choice(['LONG', 'SHORT']),
+        'Entry Price': rng.uniform(1, 1000),
+        'Position Size': rng.uniform(100, 10000),
+        'Stop Loss': rng.uniform(0.5, 4),
+        'Risk Amount': rng.uniform(10, 100),
+        'Leverage': rng.choice([5, 8, 10]),
+        'Status': 'OPEN',
+        'Notes': note
+    }
+
+
+def worker(db_file, worker_id, trades, close_every, shared_id, barrier, results):
+    # One calculator: the same writer thread, cache and stats wiring as the window
+    from trade_journal import TradeJournal, JournalWriter
+    from journal_cache import JournalCache
+    from journal_analytics import JournalStats
+
+    rng = random.Random(worker_id)
+    journal = TradeJournal(db_file, excel_file=db_file + '.xlsx')
+    cache = JournalCache(journal)
+    state = {}
+
+    def on_ready():
+        cache.open()
+        state['stats'] = JournalStats.load(os.path.join(os.path.dirname(db_file), f'stats{worker_id}.json'), cache)
+
+    writer = JournalWriter(journal, max_batch=rng.choice([1, 5, 50]), on_ready=on_ready, on_change=cache.refresh)
+    saved = 0
+    closed = []
+    errors = []
+
+    def drain():
+        nonlocal saved
+        while not writer.results.empty():
+            event, payload = writer.results.get()
+            if event == 'saved':
+                saved += len(payload)
+                for trade in payload:
+                    if trade['id'] % close_every == 0:
+                        writer.submit_close(trade['id'], trade['Entry Price'] * rng.uniform(0.9, 1.1))
+            elif event == 'closed':
+                closed.append(payload[1]['id'])
+            elif event == 'synced':
+                state['stats'].catch_up(*payload)
+            elif event == 'error':
+                errors.append(str(payload[1]))
+
+    for index in range(trades):
+        writer.submit(make_trade(rng, f'w{worker_id}-{index}'))
+        if index == trades // 2:
+            writer.submit_close(shared_id, 1.0)
+        if rng.random() < 0.05:
+            writer.request_sync()
+        drain()
+    while saved < trades:
+        time.sleep(0.01)
+        drain()
+    writer.close()
+    drain()
+
+    # Everyone has written; one last refresh must leave every calculator with the same numbers
+    barrier.wait()
+    changes = cache.refresh()
+    if changes:
+        state['stats'].catch_up(*changes)
+    results.put({
+        'worker': worker_id,
+        'closed': closed,
+        'errors': errors,
+        'stats': state['stats'].state(),
+        'journal_lock': journal.write_lock.counts,
+        'cache_lock': cache.lock.counts
+    })
+
+
+def stats_differences(state, expected, prefix=''):
+    # 'name: got != expected' for every field of two JournalStats.state() dicts that differs
+    differences = []
+    for key in sorted(set(state) | set(expected)):
+        got, want = state.get(key), expected.get(key)
+        if isinstance(got, dict) and isinstance(want, dict):
+            differences += stats_differences(got, want, f"{prefix}{key}.")
+        elif got != want:
+            differences.append(f"{prefix}{key}: {got!r} != {want!r}")
+    return differences
+
+
+def check(db_file, workers, trades, reports, shared_id):
+    from trade_journal import TradeJournal
+    from journal_cache import JournalCache
+    from journal_analytics import JournalStats
+
+    failures = []
+    journal = TradeJournal(db_file, excel_file=db_file + '.xlsx')
+    rows = list(journal.iter_rows())
+    notes = {}
+    for row in rows:
+        notes[row['Notes']] = notes.get(row['Notes'], 0) + 1
+    expected = {f'w{w}-{i}' for w in range(workers) for i in range(trades)}
+    missing = expected - set(notes)
+    duplicated = [note for note, count in notes.items() if count > 1]
+    if len(rows) != workers * trades + 1 or missing or duplicated:
+        failures.append(f"{len(rows):,} trades for {workers * trades + 1:,} written, "
+                        f"{len(missing)} missing, {len(duplicated)} duplicated")
+
+    # Losing the race for the shared trade is the only error allowed
+    errors = [error for report in reports for error in report['errors'] if 'already' not in error.lower()]
+    if errors:
+        failures.append(f"{len(errors)} write errors, first: {errors[0]}")
+    shared_closes = sum(report['closed'].count(shared_id) for report in reports)
+    if shared_closes != 1:
+        failures.append(f"shared trade closed {shared_closes} times")
+    closes = sum(len(report['closed']) for report in reports)
+    if closes != len(journal.updates_since(0)):
+        failures.append(f"{closes} closes reported, {len(journal.updates_since(0))} logged")
+
+    # The cache every worker kept up to date must match one built from scratch
+    shared = JournalCache(journal).open()
+    with tempfile.TemporaryDirectory() as path:
+        fresh = JournalCache(journal, path).open()
+        if shared.trades() != fresh.trades():
+            failures.append("shared cache differs from a fresh rebuild")
+
+    # Closes are folded in close order on both sides, so every field must match exactly:
+    # counts, P/L sums, gross profit and loss (the profit factor), equity, peak and drawdown
+    expected_stats = JournalStats.recompute(rows, journal.updates_since(0)).state()
+    for report in reports:
+        differences = stats_differences(report['stats'], expected_stats)
+        if differences:
+            failures.append(f"worker {report['worker']} stats differ from a recompute: " + "; ".join(differences))
+    journal.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write one journal from several processes and check nothing is lost")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="Calculator processes")
+    parser.add_argument('-n', '--trades', type=int, default=500, help="Trades saved by each process")
+    parser.add_argument('--close-every', type=int, default=7, help="Close trades whose id is a multiple of this")
+    args = parser.parse_args()
+
+    from trade_journal import TradeJournal
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, 'journal.db')
+        journal = TradeJournal(db_file, excel_file=db_file + '.xlsx')
+        shared_id = journal.append(make_trade(random.Random(0), SHARED_NOTE))
+        journal.close()
+
+        barrier = multiprocessing.Barrier(args.workers)
+        results = multiprocessing.Queue()
+        start = time.perf_counter()
+        processes = [
+            multiprocessing.Process(target=worker, args=(db_file, w, args.trades, args.close_every, shared_id,
+                                                         barrier, results))
+            for w in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        print(f"{args.workers} processes saved {args.workers * args.trades:,} trades in {elapsed:.2f}s")
+        for name in ('journal_lock', 'cache_lock'):
+            acquired = sum(r[name]['acquired'] for r in reports)
+            wait = sum(r[name]['wait_s'] for r in reports)
+            hold = sum(r[name]['hold_s'] for r in reports)
+            print(f"{name}: {acquired:,} acquisitions, wait {wait * 1000:.0f} ms total "
+                  f"(max {max(r[name]['max_wait_s'] for r in reports) * 1000:.1f} ms), "
+                  f"hold {hold * 1000:.0f} ms total (max {max(r[name]['max_hold_s'] for r in reports) * 1000:.1f} ms)")
+
+        failures = [f"worker exited with {p.exitcode}" for p in processes if p.exitcode]
+        failures += check(db_file, args.workers, args.trades, reports, shared_id)
+
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("OK: every trade written once, caches and stats agree")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
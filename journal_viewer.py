@@ -0,0 +1,287 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+from journal_cache import CATEGORY_COLUMNS, date_bound
+
+# Rows on screen, and rows decoded ahead of and behind them
+PAGE_ROWS = 25
+PREFETCH_ROWS = 100
+
+# Column -> (heading, width, format); formats take a non-None value
+VIEW_COLUMNS = {
+    'id': ('ID', 60, str),
+    'Date': ('Date', 130, str),
+    'Symbol': ('Symbol', 90, str),
+    'Direction': ('Direction', 70, str),
+    'Entry Price': ('Entry Price', 90, lambda v: f"{v:g}"),
+    'Position Size': ('Position Size', 100, lambda v: f"${v:,.2f}"),
+    'Stop Loss': ('Stop Loss', 70, lambda v: f"{v:g}%"),
+    'Leverage': ('Leverage', 65, lambda v: f"{v:g}x"),
+    'Status': ('Status', 65, str),
+    'Exit Price': ('Exit Price', 90, lambda v: f"{v:g}"),
+    'Profit/Loss': ('P/L', 90, lambda v: f"${v:,.2f}")
+}
+TEXT_COLUMNS = ['Date', 'Symbol', 'Direction', 'Status']
+
+ALL = "All"
+
+
+class JournalView:
+    """The filtered, sorted rows of a JournalCache snapshot, decoded a page at a time.
+
+    `rows` holds only row numbers: filters come from the cache's symbol,
+    status and date indexes and sorting from its per-column sort order, so
+    neither rescans the trades. Trades are decoded only for the window
+    asked for plus PREFETCH_ROWS either side, and that buffer is the only
+    decoded data kept.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.filters = {'symbol': None, 'status': None, 'start': None, 'end': None}
+        self.sort_column = 'id'
+        self.descending = True
+        self.apply()
+
+    def set_snapshot(self, snapshot):
+        self.snapshot = snapshot
+        self.apply()
+
+    def filter(self, symbol=None, status=None, start=None, end=None):
+        # start and end are dates as text, e.g. 2024-03 or 2024-03-15; end is exclusive
+        for value in (start, end):
+            if value is not None:
+                date_bound(value)  # ValueError for a bad date, before anything changes
+        self.filters = {'symbol': symbol, 'status': status, 'start': start, 'end': end}
+        self.apply()
+
+    def sort(self, column, descending=False):
+        self.sort_column = column
+        self.descending = descending
+        self.apply()
+
+    def apply(self):
+        selected = self.snapshot.select(**self.filters)
+        if self.sort_column == 'id':
+            rows = selected
+        else:
+            order = self.snapshot.sorted_rows(self.sort_column)
+            if len(selected) == len(self.snapshot):
+                rows = order
+            else:
+                mask = np.zeros(len(self.snapshot), dtype=bool)
+                mask[selected] = True
+                rows = order[mask[order]]
+        if self.descending:
+            # Blanks sort last either way round
+            filled = len(rows) - self.blanks(rows)
+            rows = np.concatenate([rows[:filled][::-1], rows[filled:]])
+        self.rows = rows
+        self.buffer_start = 0
+        self.buffer = []
+
+    def blanks(self, rows):
+        # How many of rows have no value in the sort column
+        values = self.snapshot.column(self.sort_column)[rows]
+        if self.sort_column in CATEGORY_COLUMNS:
+            return int(np.count_nonzero(values < 0))
+        if self.sort_column == 'Date':
+            return int(np.count_nonzero(np.isnat(values)))
+        return int(np.count_nonzero(np.isnan(values))) if values.dtype.kind == 'f' else 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def page(self, start, count=PAGE_ROWS):
+        # Trades for rows[start:start + count], refilling the buffer when they are not all in it
+        start = max(0, min(start, len(self.rows) - count))
+        end = min(start + count, len(self.rows))
+        if start < self.buffer_start or end > self.buffer_start + len(self.buffer):
+            self.buffer_start = max(0, start - PREFETCH_ROWS)
+            self.buffer = self.snapshot.trades(self.rows[self.buffer_start:end + PREFETCH_ROWS])
+        return start, self.buffer[start - self.buffer_start:end - self.buffer_start]
+
+    def symbols(self):
+        return sorted(self.snapshot.meta['categories']['Symbol'])
+
+
+class JournalViewer:
+    """The journal in a window, for any number of trades.
+
+    The Treeview only ever holds the PAGE_ROWS trades on screen. The
+    scrollbar, mouse wheel and keys move a window over a JournalView and
+    the page is redrawn from its buffer. Notes are not cached, so they are
+    left to the Excel export, which on_export runs with the current filters.
+    """
+
+    def __init__(self, root, snapshot, on_export=None, on_close=None):
+        self.view = JournalView(snapshot)
+        self.on_export = on_export
+        self.on_close = on_close
+        self.top = 0
+        self.selected_id = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Trade Journal")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        filters = ttk.Frame(self.window)
+        ttk.Label(filters, text="Symbol:").pack(side=tk.LEFT, padx=(0, 2))
+        self.symbol_var = tk.StringVar(value=ALL)
+        self.symbol_combo = ttk.Combobox(filters, textvariable=self.symbol_var, width=12, state='readonly')
+        self.symbol_combo.pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Label(filters, text="Status:").pack(side=tk.LEFT, padx=(0, 2))
+        self.status_var = tk.StringVar(value=ALL)
+        ttk.Combobox(filters, textvariable=self.status_var, values=[ALL, 'OPEN', 'CLOSED'], width=8,
+                     state='readonly').pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Label(filters, text="From:").pack(side=tk.LEFT, padx=(0, 2))
+        self.start_entry = ttk.Entry(filters, width=11)
+        self.start_entry.pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Label(filters, text="To:").pack(side=tk.LEFT, padx=(0, 2))
+        self.end_entry = ttk.Entry(filters, width=11)
+        self.end_entry.pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Button(filters, text="Export", command=self.export).pack(side=tk.RIGHT)
+        for widget in (self.start_entry, self.end_entry):
+            widget.bind('<Return>', self.apply_filters)
+        self.symbol_var.trace_add('write', lambda *args: self.apply_filters())
+        self.status_var.trace_add('write', lambda *args: self.apply_filters())
+
+        columns = list(VIEW_COLUMNS)
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings', height=PAGE_ROWS,
+                                 selectmode='browse')
+        for column, (heading, width, _) in VIEW_COLUMNS.items():
+            self.tree.heading(column, text=heading, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, anchor='w' if column in TEXT_COLUMNS else 'e')
+        self.scrollbar = ttk.Scrollbar(self.window, orient='vertical', command=self.scroll)
+        self.tree.bind('<<TreeviewSelect>>', self.remember_selection)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_by(3))
+        for key, step in (('<Up>', -1), ('<Down>', 1), ('<Prior>', -PAGE_ROWS), ('<Next>', PAGE_ROWS)):
+            self.tree.bind(key, lambda e, step=step: self.move_selection(step))
+        self.tree.bind('<Home>', lambda e: self.move_selection(-len(self.view)))
+        self.tree.bind('<End>', lambda e: self.move_selection(len(self.view)))
+
+        self.status = ttk.Label(self.window, text="")
+
+        filters.grid(row=0, column=0, columnspan=2, sticky="ew", padx=10, pady=(10, 5))
+        self.tree.grid(row=1, column=0, sticky="nsew", padx=(10, 0))
+        self.scrollbar.grid(row=1, column=1, sticky="ns", padx=(0, 10))
+        self.status.grid(row=2, column=0, columnspan=2, sticky="w", padx=10, pady=(5, 10))
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.resizable(True, False)
+
+        self.update_headings()
+        self.refresh()
+
+    def lift(self):
+        self.window.lift()
+
+    def close(self):
+        self.window.destroy()
+        if self.on_close:
+            self.on_close()
+
+    def set_snapshot(self, snapshot):
+        # New or closed trades; the filters, sort and scroll position stay
+        self.view.set_snapshot(snapshot)
+        self.refresh()
+
+    def refresh(self):
+        self.symbol_combo['values'] = [ALL] + self.view.symbols()
+        self.render()
+
+    def apply_filters(self, event=None):
+        symbol, status = self.symbol_var.get(), self.status_var.get()
+        try:
+            self.view.filter(None if symbol == ALL else symbol, None if status == ALL else status,
+                             self.start_entry.get().strip() or None, self.end_entry.get().strip() or None)
+        except ValueError:
+            self.status.config(text="Dates look like 2024-03-15", style='Warning.TLabel')
+            return
+        self.top = 0
+        self.render()
+
+    def sort_by(self, column):
+        # Same column again flips the order; a new one starts ascending
+        descending = not self.view.descending if column == self.view.sort_column else False
+        self.view.sort(column, descending)
+        self.top = 0
+        self.update_headings()
+        self.render()
+
+    def update_headings(self):
+        for column, (heading, _, _) in VIEW_COLUMNS.items():
+            if column == self.view.sort_column:
+                heading += " ▼" if self.view.descending else " ▲"
+            self.tree.heading(column, text=heading)
+
+    def render(self):
+        self.top, trades = self.view.page(self.top)
+        self.tree.delete(*self.tree.get_children())
+        for trade in trades:
+            self.tree.insert('', 'end', iid=str(trade['id']), values=[
+                '' if trade[c] is None else fmt(trade[c]) for c, (_, _, fmt) in VIEW_COLUMNS.items()
+            ])
+        if self.selected_id is not None and self.tree.exists(self.selected_id):
+            self.tree.selection_set(self.selected_id)
+            self.tree.focus(self.selected_id)
+
+        total = len(self.view)
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + len(trades)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        text = f"{total:,} of {len(self.view.snapshot):,} trades"
+        if total > len(trades):
+            text += f", showing {self.top + 1:,}-{self.top + len(trades):,}"
+        self.status.config(text=text, style='TLabel')
+
+    def scroll(self, action, amount, unit=None):
+        # Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.view)))
+        else:
+            self.scroll_by(int(amount) * (PAGE_ROWS if unit == 'pages' else 1))
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.top + rows)
+        return 'break'
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.view) - PAGE_ROWS))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def remember_selection(self, event=None):
+        # Redrawing the page empties the selection, so only a real pick counts
+        selection = self.tree.selection()
+        if selection:
+            self.selected_id = selection[0]
+
+    def move_selection(self, step):
+        items = self.tree.get_children()
+        if not items:
+            return 'break'
+        focus = self.tree.focus()
+        if focus in items:
+            target = max(0, min(self.top + items.index(focus) + step, len(self.view) - 1))
+        else:
+            target = self.top  # Nothing picked on this page yet
+        if target < self.top:
+            self.scroll_to(target)
+        elif target >= self.top + PAGE_ROWS:
+            self.scroll_to(target - PAGE_ROWS + 1)
+        item = self.tree.get_children()[target - self.top]
+        self.selected_id = item
+        self.tree.selection_set(item)
+        self.tree.focus(item)
+        self.tree.see(item)
+        return 'break'
+
+    def export(self):
+        if self.on_export:
+            self.on_export(**self.view.filters)
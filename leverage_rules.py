@@ -0,0 +1,224 @@
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+
+# Input limits every table carries: (low, high), both inclusive; null in the
+# file for no upper bound
+LIMIT_NAMES = ['Risk', 'Capital', 'Stop Loss', 'Leverage']
+
+# Used when there is no rule file, and for anything the file leaves out
+DEFAULT_RULES = {
+    'Default': {
+        # [stop loss % up to and including, max leverage], narrowest stop first
+        'Tiers': [[1, 10], [2.5, 8], [3, 6], [4, 5]],
+        'Limits': {'Risk': [0.01, 5], 'Capital': [0.01, None], 'Stop Loss': [0.01, 4], 'Leverage': [1, 10]}
+    },
+    'Accounts': {},
+    'Symbols': {}
+}
+
+# How often current() looks at the file for changes, in seconds
+CHECK_INTERVAL = 1.0
+
+
+class LeverageTable:
+    """One compiled tier schedule and its input limits.
+
+    The tier bounds are a sorted array('d'), so a lookup is a bisect and
+    the array form is one np.searchsorted over a zero-copy view. A stop loss
+    past the widest tier (or not above 0) has no leverage: None, or NaN in
+    the array form.
+    """
+
+    def __init__(self, tiers, limits):
+        tiers = sorted((float(stop), float(leverage)) for stop, leverage in tiers)
+        if not tiers:
+            raise ValueError("A tier schedule needs at least one tier")
+        for (stop, leverage), (next_stop, next_leverage) in zip(tiers, tiers[1:]):
+            if stop == next_stop:
+                raise ValueError(f"Two tiers end at a {stop:g}% stop loss")
+            if next_leverage > leverage:
+                raise ValueError(f"Leverage goes up from {leverage:g}x to {next_leverage:g}x for a wider stop loss")
+        if tiers[0][0] <= 0 or tiers[-1][1] <= 0:
+            raise ValueError("Tier stop losses and leverages must be positive")
+        self.tiers = tiers
+        self.bounds = array('d', (stop for stop, _ in tiers))
+        self.leverages = array('d', (leverage for _, leverage in tiers))
+        self.limits = {}
+        for name in LIMIT_NAMES:
+            low, high = limits[name]
+            self.limits[name] = (float(low), float('inf') if high is None else float(high))
+
+    @property
+    def max_stop_loss(self):
+        return self.bounds[-1]
+
+    def max_leverage(self, stop_loss):
+        if stop_loss is None or not stop_loss > 0:
+            return None
+        tier = bisect_left(self.bounds, stop_loss)
+        return self.leverages[tier] if tier < len(self.bounds) else None
+
+    def max_leverage_array(self, stop_loss):
+        import numpy as np
+
+        stop_loss = np.asarray(stop_loss, dtype=float)
+        leverages = np.append(np.frombuffer(self.leverages, dtype=np.float64), np.nan)
+        with np.errstate(invalid='ignore'):
+            capped = leverages[np.searchsorted(np.frombuffer(self.bounds, dtype=np.float64), stop_loss, side='left')]
+            return np.where(stop_loss > 0, capped, np.nan)
+
+    def in_limits(self, name, value):
+        low, high = self.limits[name]
+        return low <= value <= high
+
+
+class LeverageRules:
+    """Leverage tiers and input limits, per account and per symbol.
+
+    The file has a 'Default' schedule ('Tiers' and 'Limits'), and optional
+    'Accounts' and 'Symbols' overrides keyed by name; an account can carry
+    its own 'Symbols' too. An override replaces 'Tiers' whole and 'Limits'
+    one limit at a time, applied default, account, symbol, account symbol.
+    Every combination is compiled into a LeverageTable up front, so a bad
+    file fails on load and a lookup is two dict accesses. Instances never
+    change; a reload builds a new one.
+    """
+
+    def __init__(self, rules=None):
+        rules = rules or DEFAULT_RULES
+        default = merge_schedule(DEFAULT_RULES['Default'], rules.get('Default') or {})
+        accounts = rules.get('Accounts') or {}
+        symbols = {symbol.upper(): schedule for symbol, schedule in (rules.get('Symbols') or {}).items()}
+        self.accounts = set(accounts)
+        self.symbols = set(symbols)
+        for account in accounts.values():
+            self.symbols.update(symbol.upper() for symbol in account.get('Symbols') or {})
+
+        self.tables = {}
+        for account in [None, *sorted(self.accounts)]:
+            account_rules = accounts.get(account) or {}
+            base = merge_schedule(default, account_rules)
+            account_symbols = {s.upper(): schedule for s, schedule in (account_rules.get('Symbols') or {}).items()}
+            self.tables[account, None] = LeverageTable(base['Tiers'], base['Limits'])
+            for symbol in sorted(self.symbols):
+                schedule = merge_schedule(merge_schedule(base, symbols.get(symbol) or {}),
+                                          account_symbols.get(symbol) or {})
+                self.tables[account, symbol] = LeverageTable(schedule['Tiers'], schedule['Limits'])
+
+    def table(self, symbol=None, account=None):
+        # Unknown accounts and symbols without an override get the default
+        if account not in self.accounts:
+            account = None
+        if symbol not in self.symbols:
+            symbol = None
+        return self.tables[account, symbol]
+
+    def max_leverage(self, stop_loss, symbol=None, account=None):
+        return self.table(symbol, account).max_leverage(stop_loss)
+
+    def by_table(self, symbols, account, shape, function):
+        # Fills an array of `shape` with function(table, mask), one call per
+        # table the symbols use
+        import numpy as np
+
+        base = self.table(None, account)
+        result = function(base, None)
+        if symbols is None or not self.symbols:
+            return result
+        result = np.array(np.broadcast_to(result, shape), dtype=float)
+        symbols = np.broadcast_to(np.asarray(symbols, dtype=object), shape)
+        for symbol in self.symbols.intersection(symbols.ravel().tolist()):
+            table = self.table(symbol, account)
+            if table is not base:
+                mask = symbols == symbol
+                result[mask] = function(table, mask)
+        return result
+
+    def max_leverage_array(self, stop_loss, symbols=None, account=None):
+        """Vectorized max leverage, NaN where the stop loss has no tier.
+
+        symbols, if given, is one per stop loss, for the symbol overrides.
+        """
+        import numpy as np
+
+        stop_loss = np.asarray(stop_loss, dtype=float)
+        return self.by_table(symbols, account, stop_loss.shape,
+                             lambda table, mask: table.max_leverage_array(stop_loss if mask is None else stop_loss[mask]))
+
+    def in_limits_array(self, name, values, symbols=None, account=None):
+        # Boolean array: each value within its table's `name` limit
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+
+        def check(table, mask):
+            low, high = table.limits[name]
+            checked = values if mask is None else values[mask]
+            return (checked >= low) & (checked <= high)
+
+        return self.by_table(symbols, account, values.shape, check).astype(bool)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+
+def merge_schedule(base, override):
+    # Tiers are replaced whole, limits one at a time
+    return {
+        'Tiers': override.get('Tiers') or base['Tiers'],
+        'Limits': {**base['Limits'], **(override.get('Limits') or {})}
+    }
+
+
+class LeverageRuleFile:
+    """Keeps the rules in sync with the file they were loaded from.
+
+    current() returns the compiled rules, reloading them when the file's
+    size or modification time changed. It looks at most once per
+    CHECK_INTERVAL, so it is cheap enough to call on every calculation. A
+    file that fails to load keeps the previous rules; a missing file means
+    DEFAULT_RULES.
+    """
+
+    def __init__(self, path='leverage_rules.json'):
+        self.path = path
+        self.rules = LeverageRules()
+        self.stat = None
+        self.checked = None
+        self.error = None
+        self.current()
+
+    def current(self):
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < CHECK_INTERVAL:
+            return self.rules
+        self.checked = now
+        try:
+            stat = os.stat(self.path)
+            stat = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stat = None
+        if stat != self.stat:
+            self.stat = stat
+            try:
+                self.rules = LeverageRules.load(self.path) if stat else LeverageRules()
+                self.error = None
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.error = e
+        return self.rules
+
+
+# One LeverageRuleFile per path, so everything in a process reads the same compiled tables
+shared_files = {}
+
+
+def shared_rules(path='leverage_rules.json'):
+    rule_file = shared_files.get(path)
+    if rule_file is None:
+        rule_file = shared_files[path] = LeverageRuleFile(path)
+    return rule_file
@@ -0,0 +1,395 @@
+import argparse
+import csv
+import io
+import os
+import threading
+from bisect import bisect_right
+from statistics import NormalDist
+
+import numpy as np
+
+DEFAULT_WINDOW = 500
+DEFAULT_CONFIDENCE = 0.99
+# Aligned bars a time waits for a lagging file before that file counts as stale
+DEFAULT_GRACE = 3
+
+# How often the background thread looks for new bars, in seconds
+REFRESH_INTERVAL = 5.0
+
+# Column names accepted for the bar time and close price, lower case
+TIME_COLUMNS = ['time', 'timestamp', 'date', 'datetime', 'open_time']
+CLOSE_COLUMN = 'close'
+
+
+class BarFile:
+    """Follows one symbol's OHLCV CSV, returning only bars added since the last read.
+
+    Only whole lines are consumed, so a bar being written when we look is
+    picked up on the next read. A file that shrank was rewritten and is read
+    again from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def read(self):
+        # [(time, close)] for the new bars, oldest first
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self.offset:
+            self.offset, self.header = 0, None
+        if size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return []
+        self.offset += end
+        lines = data[:end].decode('utf-8').splitlines()
+        if self.header is None:
+            header = [name.strip().lower() for name in next(csv.reader(lines[:1]))]
+            time_column = next((c for c in TIME_COLUMNS if c in header), None)
+            if time_column is None or CLOSE_COLUMN not in header:
+                raise ValueError(f"{self.path} needs a time and a close column")
+            self.header = (header.index(time_column), header.index(CLOSE_COLUMN))
+            lines = lines[1:]
+        time_index, close_index = self.header
+        bars = []
+        for row in csv.reader(io.StringIO('\n'.join(lines))):
+            try:
+                bars.append((row[time_index].strip(), float(row[close_index])))
+            except (IndexError, ValueError):
+                continue  # Blank or broken line
+        return bars
+
+
+class ReturnWindow:
+    """The last `window` bar returns of n symbols, with running sums.
+
+    Rows live in a ring buffer. Adding a row updates the sum and the sum of
+    outer products in O(n^2), and removes the row it pushes out, so the
+    covariance never needs a pass over the window. The sums are rebuilt from
+    the buffer once per window to stop rounding errors building up.
+    """
+
+    def __init__(self, n, window=DEFAULT_WINDOW):
+        self.window = window
+        self.rows = np.zeros((window, n))
+        self.count = 0
+        self.next = 0
+        self.pushed = 0
+        self.total = np.zeros(n)
+        self.products = np.zeros((n, n))
+
+    def push(self, row):
+        if self.count == self.window:
+            old = self.rows[self.next]
+            self.total -= old
+            self.products -= np.outer(old, old)
+        else:
+            self.count += 1
+        self.rows[self.next] = row
+        self.total += row
+        self.products += np.outer(row, row)
+        self.next = (self.next + 1) % self.window
+        self.pushed += 1
+        if self.pushed % self.window == 0:
+            current = self.current()
+            self.total = current.sum(axis=0)
+            self.products = current.T @ current
+
+    def current(self):
+        # The rows in the window, in no particular order
+        return self.rows[:self.count]
+
+    def covariance(self):
+        if self.count < 2:
+            return None
+        mean = self.total / self.count
+        return (self.products - self.count * np.outer(mean, mean)) / (self.count - 1)
+
+
+class PortfolioRisk:
+    """Correlation-aware VaR and CVaR of open positions from local OHLCV files.
+
+    Reads <directory>/<SYMBOL>.csv for each symbol that has one, lines the
+    closes up by bar time and keeps the last `window` one-bar returns in a
+    ReturnWindow. refresh() only reads bars appended since the last call.
+    A bar time counts once every symbol with open exposure, and the one
+    being sized, has it (every symbol while there are none). It then waits
+    up to `grace` aligned bars for any other file that is behind it; a file
+    further behind is stale, carries its last close forward and is reported
+    as uncovered, so it never holds the window up. Unused bars are kept for
+    at most window + 1 times.
+    Positions are signed notionals (long positive), so P&L over one bar is
+    positions . returns, and VaR is a loss over one bar at `confidence`.
+    Thread-safe: a background thread can refresh while the window asks.
+    """
+
+    def __init__(self, directory, symbols, window=DEFAULT_WINDOW, confidence=DEFAULT_CONFIDENCE, exposed=(),
+                 grace=DEFAULT_GRACE):
+        self.directory = directory
+        self.wanted = sorted(set(symbols))
+        # Symbols with open exposure and the one being sized; report() keeps this up to date
+        self.exposed = set(exposed)
+        self.window = window
+        self.grace = grace
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(confidence)
+        self.tail = NormalDist().pdf(self.z) / (1 - confidence)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.load()
+
+    def load(self):
+        self.symbols = [s for s in self.wanted if os.path.exists(os.path.join(self.directory, s + '.csv'))]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.files = [BarFile(os.path.join(self.directory, s + '.csv')) for s in self.symbols]
+        self.returns = ReturnWindow(len(self.symbols), self.window)
+        self.pending = [{} for _ in self.symbols]
+        # bar_key of each file's newest bar, and of the last `grace` counted times
+        self.newest = [None for _ in self.symbols]
+        self.recent = []
+        self.last_time = None
+        self.last_close = None
+        self.cov = None
+        self.refresh()
+
+    def aligned(self):
+        # Rows that must all have a time before it counts
+        rows = [self.index[s] for s in sorted(self.exposed) if s in self.index]
+        return rows or list(range(len(self.symbols)))
+
+    def ready(self, times, rows):
+        # The times that need not wait any longer for a file outside rows:
+        # one behind them holds them back until it is `grace` aligned bars behind
+        keys = [bar_key(t) for t in times]
+        ready = len(times)
+        for i, newest in enumerate(self.newest):
+            if i in rows or newest is None:
+                continue
+            behind = sum(key > newest for key in self.recent) + len(keys) - bisect_right(keys, newest)
+            if behind <= self.grace:
+                ready = min(ready, bisect_right(keys, newest))
+        return times[:ready]
+
+    def refresh(self):
+        """Reads new bars and returns how many aligned returns were added."""
+        with self.lock:
+            for i, (pending, bar_file) in enumerate(zip(self.pending, self.files)):
+                for bar_time, close in bar_file.read():
+                    pending[bar_time] = close
+                    key = bar_key(bar_time)
+                    if self.newest[i] is None or key > self.newest[i]:
+                        self.newest[i] = key
+            if not self.symbols:
+                return 0
+            # Times an aligned symbol skipped are dropped
+            rows = self.aligned()
+            complete = set(self.pending[rows[0]]).intersection(*(self.pending[i] for i in rows[1:]))
+            last = None if self.last_time is None else bar_key(self.last_time)
+            times = sorted((t for t in complete if last is None or bar_key(t) > last), key=bar_key)
+            times = self.ready(times, set(rows))
+            skipped = len(times) > self.window
+            if skipped:
+                # Only the newest bars fit in the window anyway
+                times = times[-(self.window + 1):]
+            closes = self.closes(times)
+            if skipped:
+                self.last_close = None  # Its return would span the skipped bars
+            added = 0
+            for bar_time, row in zip(times, closes):
+                if self.last_close is not None:
+                    with np.errstate(invalid='ignore'):
+                        returns = row / self.last_close - 1
+                    # No return yet for a symbol without a close
+                    self.returns.push(np.where(np.isfinite(returns), returns, 0.0))
+                    added += 1
+                self.last_time, self.last_close = bar_time, row
+            self.recent = (self.recent + [bar_key(t) for t in times])[-self.grace:] if self.grace else []
+            self.prune()
+            if added:
+                self.cov = self.returns.covariance()
+            return added
+
+    def closes(self, times):
+        # Close of every symbol at each of times, the latest one at or before
+        # it for a symbol that skipped that bar or went stale, NaN before its first bar
+        keys = None
+        closes = np.empty((len(times), len(self.symbols)))
+        for i, pending in enumerate(self.pending):
+            column = [pending.get(t) for t in times]
+            if None not in column:
+                closes[:, i] = column
+                continue
+            keys = keys or [bar_key(t) for t in times]
+            bars = sorted((bar_key(t), close) for t, close in pending.items())
+            close = np.nan if self.last_close is None else self.last_close[i]
+            j = 0
+            for row, key in enumerate(keys):
+                while j < len(bars) and bars[j][0] <= key:
+                    close = bars[j][1]
+                    j += 1
+                closes[row, i] = close
+        return closes
+
+    def prune(self):
+        # Bars up to the last counted time are used or skipped for good, and
+        # only the newest window + 1 times can still make it into the window
+        last = None if self.last_time is None else bar_key(self.last_time)
+        for pending in self.pending:
+            if last is not None:
+                for bar_time in [t for t in pending if bar_key(t) <= last]:
+                    del pending[bar_time]
+            if len(pending) > self.window + 1:
+                for bar_time in sorted(pending, key=bar_key)[:len(pending) - self.window - 1]:
+                    del pending[bar_time]
+
+    def covered(self, i):
+        # A close by now, and a file that reaches the last counted time
+        return (np.isfinite(self.last_close[i]) and self.newest[i] is not None
+                and self.newest[i] >= bar_key(self.last_time))
+
+    def vector(self, positions):
+        # Positions as an array over self.symbols, and the symbols with no current history
+        weights = np.zeros(len(self.symbols))
+        uncovered = []
+        for symbol, notional in positions.items():
+            if not notional:
+                continue
+            i = self.index.get(symbol)
+            if i is None or not self.covered(i):
+                uncovered.append(symbol)
+            else:
+                weights[i] += notional
+        return weights, uncovered
+
+    def measure(self, weights):
+        # (parametric VaR, parametric CVaR, historical VaR, historical CVaR) of one weight vector
+        sigma = float(np.sqrt(max(weights @ self.cov @ weights, 0.0)))
+        pnl = self.returns.current() @ weights
+        cutoff = float(np.quantile(pnl, 1 - self.confidence))
+        return sigma * self.z, sigma * self.tail, max(0.0, -cutoff), max(0.0, -float(pnl[pnl <= cutoff].mean()))
+
+    def report(self, positions, symbol=None, notional=0.0):
+        """VaR/CVaR of the positions, and with the trade being sized added.
+
+        positions maps symbol -> signed notional; notional is the new
+        trade's, signed the same way. Returns None until there are at least
+        two bars of history. 'undiversified' adds up each position's own
+        parametric VaR, as if everything moved together; 'incremental' is
+        how much each measure grows with the trade, 'component' the trade's
+        share of the parametric VaR of the combined book.
+        """
+        with self.lock:
+            # The next refresh lines bars up on these
+            self.exposed = {s for s, n in positions.items() if n}
+            if symbol is not None:
+                self.exposed.add(symbol)
+            if self.cov is None:
+                return None
+            weights, uncovered = self.vector(positions)
+            result = {
+                'bars': self.returns.count,
+                'confidence': self.confidence,
+                'uncovered': uncovered,
+                'portfolio': self.measure(weights),
+                'undiversified': float(np.sqrt(np.diag(self.cov)) @ np.abs(weights)) * self.z
+            }
+            if symbol is not None:
+                trade, trade_uncovered = self.vector({symbol: notional})
+                combined = weights + trade
+                result['with_trade'] = self.measure(combined)
+                result['incremental'] = tuple(a - b for a, b in zip(result['with_trade'], result['portfolio']))
+                variance = combined @ self.cov @ combined
+                result['component'] = (float(self.z * (trade @ self.cov @ combined) / np.sqrt(variance))
+                                       if variance > 0 else 0.0)
+                result['uncovered'] = sorted(set(uncovered + trade_uncovered))
+            return result
+
+    def start(self, interval=REFRESH_INTERVAL):
+        # Keep up with new bars on a daemon thread
+        def run():
+            while not self.stopped.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    pass  # A half-written or broken file; tried again next time
+
+        threading.Thread(target=run, name='portfolio-risk', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+
+def bar_key(bar_time):
+    # Numeric times (epoch) compare as numbers, anything else as text (ISO dates)
+    try:
+        return (0, float(bar_time), '')
+    except ValueError:
+        return (1, 0.0, bar_time)
+
+
+def open_positions(trades):
+    # Signed notional per symbol over open journal trades
+    positions = {}
+    for trade in trades:
+        size = trade.get('Position Size') or 0.0
+        sign = -1 if trade.get('Direction') == 'SHORT' else 1
+        positions[trade['Symbol']] = positions.get(trade['Symbol'], 0.0) + sign * size
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VaR and CVaR of open journal trades from local OHLCV history")
+    parser.add_argument('--ohlcv', default='ohlcv', help="Directory of <SYMBOL>.csv files with time and close columns")
+    parser.add_argument('--journal', default='trade_journal.db')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="Bars of history in the covariance")
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument('--trade', nargs=3, metavar=('SYMBOL', 'DIRECTION', 'NOTIONAL'),
+                        help="Also show what one more trade would add, e.g. ETHUSDT LONG 2500")
+    args = parser.parse_args()
+    # Opening a missing journal would create an empty one
+    if not os.path.exists(args.journal):
+        parser.error(f"No journal at {args.journal}")
+
+    from trade_journal import TradeJournal
+
+    journal = TradeJournal(args.journal)
+    try:
+        positions = open_positions(journal.open_trades())
+    finally:
+        journal.close()
+    symbols = set(positions)
+    trade = None
+    if args.trade:
+        symbol, direction, notional = args.trade[0].upper(), args.trade[1].upper(), float(args.trade[2])
+        trade = (symbol, -notional if direction == 'SHORT' else notional)
+        symbols.add(symbol)
+
+    risk = PortfolioRisk(args.ohlcv, symbols, args.window, args.confidence, symbols)
+    report = risk.report(positions, *(trade or (None,)))
+    if report is None:
+        print(f"Not enough history in {args.ohlcv} for {', '.join(sorted(symbols)) or 'any open trade'}")
+        return
+    level = f"{args.confidence:.0%}"
+    print(f"{len(positions)} open symbols, {report['bars']} bars of history, one-bar {level} VaR")
+    print(f"Parametric VaR ${report['portfolio'][0]:,.2f}, CVaR ${report['portfolio'][1]:,.2f} "
+          f"(undiversified ${report['undiversified']:,.2f})")
+    print(f"Historical VaR ${report['portfolio'][2]:,.2f}, CVaR ${report['portfolio'][3]:,.2f}")
+    if trade:
+        print(f"With {args.trade[0].upper()}: parametric VaR +${report['incremental'][0]:,.2f}, "
+              f"historical VaR +${report['incremental'][2]:,.2f}, component ${report['component']:,.2f}")
+    if report['uncovered']:
+        print("No history for: " + ', '.join(report['uncovered']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+
+from leverage_rules import LeverageRules, shared_rules
+
+INPUT_COLUMNS = ['capital', 'risk_percent', 'stop_loss_percent', 'leverage']
+
+
+def calculate_position_size(capital, risk_percent, stop_loss_percent, leverage):
+    # Core calculations, percentages given as e.g. 3 for 3%
+    risk_amount = risk_percent / 100 * capital
+    position_size = risk_amount / (leverage * stop_loss_percent / 100)
+    margin_required = position_size / leverage
+    return position_size, risk_amount, margin_required
+
+
+def size_positions(capital, risk_percent=None, stop_loss_percent=None, leverage=None, rules=None, symbols=None,
+                   account=None):
+    """Size many trades at once.
+
+    Takes arrays (scalars broadcast) or a DataFrame with the INPUT_COLUMNS
+    (and optionally a symbol column). Limits and leverage caps come from
+    rules (a LeverageRules, by default the shared leverage_rules.json),
+    with the overrides for each row's symbol and the account. Rows that
+    break a limit are flagged in the mask columns and get NaN results
+    instead of raising. Returns a dict of arrays, or a DataFrame when given
+    one.
+    """
+    import numpy as np
+
+    frame = None
+    if hasattr(capital, 'columns'):
+        frame = capital
+        capital, risk_percent, stop_loss_percent, leverage = (frame[c].to_numpy(dtype=float) for c in INPUT_COLUMNS)
+        if symbols is None and 'symbol' in frame.columns:
+            symbols = frame['symbol'].astype(str).str.upper().to_numpy(dtype=object)
+    if rules is None:
+        rules = shared_rules().current()
+
+    capital, risk_percent, stop_loss_percent, leverage = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (capital, risk_percent, stop_loss_percent, leverage))
+    )
+
+    if symbols is not None:
+        symbols = np.broadcast_to(np.asarray(symbols, dtype=object), capital.shape)
+    leverage_cap = rules.max_leverage_array(stop_loss_percent, symbols, account)
+    with np.errstate(invalid='ignore'):
+        masks = {
+            'risk_ok': rules.in_limits_array('Risk', risk_percent, symbols, account),
+            'capital_ok': rules.in_limits_array('Capital', capital, symbols, account),
+            'stop_loss_ok': rules.in_limits_array('Stop Loss', stop_loss_percent, symbols, account),
+            'leverage_ok': rules.in_limits_array('Leverage', leverage, symbols, account) & (leverage <= leverage_cap),
+        }
+    valid = masks['risk_ok'] & masks['capital_ok'] & masks['stop_loss_ok'] & masks['leverage_ok']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position_size, risk_amount, margin_required = calculate_position_size(
+            capital, risk_percent, stop_loss_percent, leverage
+        )
+
+    result = {
+        'position_size': np.where(valid, position_size, np.nan),
+        'risk_amount': np.where(valid, risk_amount, np.nan),
+        'margin_required': np.where(valid, margin_required, np.nan),
+        'max_leverage': leverage_cap,
+        'valid': valid,
+        **masks
+    }
+
+    if frame is not None:
+        return frame.assign(**result)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Size every row of a CSV book without the GUI")
+    parser.add_argument('book', help="CSV with columns: " + ', '.join(INPUT_COLUMNS))
+    parser.add_argument('-o', '--output', help="Where to write the sized book (default: print)")
+    parser.add_argument('--rules', default='leverage_rules.json', help="Leverage tiers and input limits")
+    parser.add_argument('--account', help="Use this account's tiers and limits from the rule file")
+    parser.add_argument('--specs', help="Contract spec file (JSON or CSV); rows with symbol and entry_price "
+                                        "columns also get an orderable quantity")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    rules = LeverageRules.load(args.rules) if os.path.exists(args.rules) else LeverageRules()
+    sized = size_positions(pd.read_csv(args.book), rules=rules, account=args.account)
+    if args.specs and {'symbol', 'entry_price'} <= set(sized.columns):
+        from contract_specs import ContractSpecs
+
+        orders = ContractSpecs.load(args.specs).quantities(
+            sized['symbol'].astype(str).str.upper().tolist(), sized['position_size'].to_numpy(),
+            sized['entry_price'].to_numpy(dtype=float)
+        )
+        sized = sized.assign(
+            quantity=orders['quantity'], order_price=orders['price'], order_notional=orders['notional'],
+            exchange_max_leverage=orders['max_leverage'],
+            exchange_leverage_ok=~(sized['leverage'].to_numpy() > orders['max_leverage'])
+        )
+    if args.output:
+        sized.to_csv(args.output, index=False)
+    else:
+        print(sized.to_string(index=False))
+    invalid = int((~sized['valid']).sum())
+    if invalid:
+        print(f"{invalid} of {len(sized)} rows broke a limit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import asyncio
+import csv
+import json
+import threading
+from collections import namedtuple
+
+Tick = namedtuple('Tick', ['symbol', 'price', 'time'])
+
+
+class ReplayFeed:
+    """Streams recorded ticks from a CSV file with time,symbol,price columns.
+
+    Time is in epoch seconds. speed=1 replays in real time, speed=10 ten times
+    faster, and speed=0 as fast as the file can be read.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.path = path
+        self.speed = speed
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        start = None
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(f):
+                tick = Tick(row['symbol'].upper(), float(row['price']), float(row['time']))
+                if self.speed:
+                    if start is None:
+                        start = (tick.time, loop.time())
+                    # Sleep only when we are ahead of the recording, so bursts
+                    # of ticks with the same timestamp don't each pay for a sleep
+                    delay = start[1] + (tick.time - start[0]) / self.speed - loop.time()
+                    if delay > 0.001:
+                        await asyncio.sleep(delay)
+                yield tick
+                if not self.speed:
+                    await asyncio.sleep(0)
+
+
+class StreamFeed:
+    """Reads JSON lines like {"symbol": "BTCUSDT", "price": 65000.5, "time": ...} from a TCP socket."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    async def __aiter__(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                yield Tick(message['symbol'].upper(), float(message['price']), message.get('time'))
+        finally:
+            writer.close()
+
+
+class MarkToMarket:
+    """Unrealized P&L and distance to stop for open trades.
+
+    A tick only touches the trades of its own symbol, and the portfolio total
+    is adjusted by each trade's change instead of being summed again.
+    """
+
+    def __init__(self):
+        self.by_symbol = {}
+        self.marks = {}
+        self.total_pnl = 0.0
+
+    def add_trade(self, trade):
+        entry = trade.get('Entry Price')
+        if trade.get('Status') != 'OPEN' or not entry:
+            return
+        sign = 1 if trade['Direction'] == 'LONG' else -1
+        stop_price = entry * (1 - sign * (trade.get('Stop Loss') or 0) / 100)
+        self.by_symbol.setdefault(trade['Symbol'], {})[trade['id']] = (sign, entry, trade['Position Size'], stop_price)
+
+    def remove_trade(self, trade_id):
+        for trades in self.by_symbol.values():
+            if trades.pop(trade_id, None) is not None:
+                break
+        mark = self.marks.pop(trade_id, None)
+        if mark is not None:
+            self.total_pnl -= mark['pnl']
+        if not self.marks:
+            self.total_pnl = 0.0  # Drops the rounding left over from the adjustments
+
+    def on_tick(self, tick):
+        updates = {}
+        for trade_id, (sign, entry, size, stop_price) in self.by_symbol.get(tick.symbol, {}).items():
+            pnl = sign * size * (tick.price / entry - 1)
+            previous = self.marks.get(trade_id)
+            self.total_pnl += pnl - (previous['pnl'] if previous else 0.0)
+            mark = {
+                'symbol': tick.symbol,
+                'price': tick.price,
+                'pnl': pnl,
+                'stop_distance': sign * (tick.price - stop_price) / tick.price * 100
+            }
+            self.marks[trade_id] = mark
+            updates[trade_id] = mark
+        return updates
+
+
+class TkBridge:
+    """Hands updates from the feed thread to Tk at most once per interval.
+
+    publish() only overwrites the latest value per key, so any number of
+    ticks between two frames costs one callback with one value per key.
+    """
+
+    def __init__(self, root, callback, interval_ms=200):
+        self.root = root
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.root.after(self.interval_ms, self.drain)
+
+    def publish(self, key, value):
+        with self.lock:
+            self.pending[key] = value
+
+    def drain(self):
+        with self.lock:
+            updates, self.pending = self.pending, {}
+        if updates:
+            self.callback(updates)
+        self.root.after(self.interval_ms, self.drain)
+
+
+class FeedRunner:
+    """Runs a feed on its own asyncio loop thread and marks open trades with it."""
+
+    def __init__(self, feed, bridge, symbols=None):
+        self.feed = feed
+        self.bridge = bridge
+        self.symbols = set(symbols) if symbols else None
+        self.mtm = MarkToMarket()
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.thread = threading.Thread(target=self.run, name='price-feed', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.consume())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.bridge.publish('error', e)
+        finally:
+            self.loop.close()
+
+    async def consume(self):
+        async for tick in self.feed:
+            if self.symbols is not None and tick.symbol not in self.symbols:
+                continue
+            updates = self.mtm.on_tick(tick)
+            if updates:
+                for trade_id, mark in updates.items():
+                    self.bridge.publish(trade_id, mark)
+                self.bridge.publish('total', self.mtm.total_pnl)
+
+    # Trades are changed on the feed thread so MarkToMarket needs no locking
+    def add_trade(self, trade):
+        self.call(self.mtm.add_trade, dict(trade))
+
+    def remove_trade(self, trade_id):
+        if not self.call(self.drop_trade, trade_id):
+            self.drop_trade(trade_id)  # Feed finished, so nothing else touches mtm
+
+    def drop_trade(self, trade_id):
+        # The total goes out with the removal, so the window never keeps a closed trade's P&L in it
+        self.mtm.remove_trade(trade_id)
+        self.bridge.publish(trade_id, None)
+        self.bridge.publish('total', self.mtm.total_pnl)
+
+    def call(self, function, *args):
+        # False when the feed already finished
+        try:
+            self.loop.call_soon_threadsafe(function, *args)
+            return True
+        except RuntimeError:
+            return False
+
+    def stop(self):
+        if self.task is not None:
+            self.call(self.task.cancel)
@@ -0,0 +1,127 @@
+from position_sizing import calculate_position_size
+
+# Keystrokes within one frame are coalesced into a single recompute
+FRAME_MS = 16
+
+
+class Graph:
+    """A small dependency graph of input and derived values.
+
+    set() only marks what depends on the input as dirty. flush() recomputes
+    the dirty nodes once each, in the order they were defined (which is a
+    valid topological order, since a node can only depend on earlier ones),
+    skips nodes whose dependencies came out unchanged, and returns the names
+    whose value actually changed.
+    """
+
+    def __init__(self):
+        self.order = []
+        self.values = {}
+        self.functions = {}
+        self.dependencies = {}
+        self.dependents = {}
+        self.dirty = set()
+        self.changed = set()
+
+    def input(self, name, value=None):
+        self.add(name, None, [])
+        self.values[name] = value
+
+    def derive(self, name, dependencies, function):
+        self.add(name, function, dependencies)
+        self.dirty.add(name)
+        self.changed.update(dependencies)
+
+    def add(self, name, function, dependencies):
+        self.order.append(name)
+        self.functions[name] = function
+        self.dependencies[name] = dependencies
+        self.dependents[name] = []
+        for dependency in dependencies:
+            self.dependents[dependency].append(name)
+
+    def set(self, name, value):
+        # Returns whether anything became dirty
+        if self.values.get(name) == value:
+            return False
+        self.values[name] = value
+        self.changed.add(name)
+        self.mark(name)
+        return True
+
+    def mark(self, name):
+        stack = list(self.dependents[name])
+        while stack:
+            node = stack.pop()
+            if node not in self.dirty:
+                self.dirty.add(node)
+                stack.extend(self.dependents[node])
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def flush(self):
+        changed, self.changed = self.changed, set()
+        for name in self.order:
+            if name not in self.dirty:
+                continue
+            # A dirty node whose dependencies all came out the same is skipped
+            if name in self.values and not any(d in changed for d in self.dependencies[name]):
+                continue
+            value = self.functions[name](*(self.values[d] for d in self.dependencies[name]))
+            if name not in self.values or self.values[name] != value:
+                self.values[name] = value
+                changed.add(name)
+        self.dirty.clear()
+        return changed
+
+
+def parse_number(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def suggested_leverage(rules, account, symbol, stop_loss):
+    # No suggestion past the widest tier, or before the rules are set
+    if rules is None:
+        return None
+    return rules.max_leverage(stop_loss, symbol, account)
+
+
+def position(capital, risk_percent, stop_loss, leverage):
+    if None in (capital, risk_percent, stop_loss, leverage) or min(capital, stop_loss, leverage) <= 0:
+        return None
+    return calculate_position_size(capital, risk_percent, stop_loss, leverage)
+
+
+def parse_symbol(text):
+    return (text or '').strip().upper()
+
+
+def order(specs, symbol, direction, entry_price, stop_loss, position):
+    # Orderable quantity for the sized position, once there is a price and a spec
+    if specs is None or position is None or entry_price is None:
+        return None
+    return specs.order(symbol, direction, position[0], entry_price, stop_loss)
+
+
+def calculator_graph():
+    # Entry text -> parsed numbers -> suggested leverage, position and order
+    graph = Graph()
+    for name in ['risk', 'capital', 'stop_loss', 'leverage', 'entry_price']:
+        graph.input(name + '_text', '')
+        graph.derive(name, [name + '_text'], parse_number)
+    graph.input('symbol_text', '')
+    graph.derive('symbol', ['symbol_text'], parse_symbol)
+    graph.input('direction', 'LONG')
+    # A ContractSpecs; a reload sets a new one
+    graph.input('specs', None)
+    # A LeverageRules and the account whose tiers apply; a reload sets new rules
+    graph.input('rules', None)
+    graph.input('account', None)
+    graph.derive('suggested_leverage', ['rules', 'account', 'symbol', 'stop_loss'], suggested_leverage)
+    graph.derive('position', ['capital', 'risk', 'stop_loss', 'leverage'], position)
+    graph.derive('order', ['specs', 'symbol', 'direction', 'entry_price', 'stop_loss', 'position'], order)
+    return graph
@@ -0,0 +1,152 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_RISK_GRID = [0.5, 1, 2, 3, 4, 5]
+DRAWDOWN_PERCENTILES = [50, 95, 99]
+
+# Drawdowns and terminal equity are collected into fixed histograms, so
+# memory stays the same whether we run 10k paths or 10M
+DRAWDOWN_BINS = np.linspace(0, 1, 10001)
+EQUITY_BINS = np.linspace(-6, 6, 12001)  # log10 of terminal equity / start
+
+
+def journal_r_multiples(journal):
+    # Realized R-multiples of every closed trade with a known risk amount
+    from journal_cache import JournalCache
+
+    return np.array(JournalCache(journal).open().r_multiples())
+
+
+def win_payoff_outcomes(win_rate, payoff):
+    # A win pays `payoff` R, a loss costs 1R
+    return np.array([payoff, -1.0]), np.array([win_rate, 1 - win_rate])
+
+
+def simulate_chunk(outcomes, probabilities, risk_fractions, n_paths, n_trades, ruin_level, seed):
+    rng = np.random.default_rng(seed)
+    draws = outcomes[rng.choice(len(outcomes), size=(n_paths, n_trades), p=probabilities)]
+    steps = np.arange(n_trades)
+
+    ruined = np.zeros(len(risk_fractions), dtype=np.int64)
+    drawdown_hist = np.zeros((len(risk_fractions), len(DRAWDOWN_BINS) - 1), dtype=np.int64)
+    equity_hist = np.zeros((len(risk_fractions), len(EQUITY_BINS) - 1), dtype=np.int64)
+
+    # Every risk level sees the same trade sequence, so the grid is comparable
+    for i, risk in enumerate(risk_fractions):
+        equity = np.cumprod(np.maximum(1 + risk * draws, 0), axis=1)
+
+        # Trading stops at ruin: freeze each ruined path from that trade on
+        hit = equity <= 1 - ruin_level
+        is_ruined = hit.any(axis=1)
+        first = np.where(is_ruined, hit.argmax(axis=1), n_trades)
+        frozen = equity[np.arange(n_paths), np.minimum(first, n_trades - 1)]
+        equity = np.where(steps > first[:, None], frozen[:, None], equity)
+
+        peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+        max_drawdown = (1 - equity / peak).max(axis=1)
+
+        ruined[i] = is_ruined.sum()
+        drawdown_hist[i] = np.histogram(np.clip(max_drawdown, 0, 1), DRAWDOWN_BINS)[0]
+        with np.errstate(divide='ignore'):
+            log_equity = np.log10(equity[:, -1])
+        equity_hist[i] = np.histogram(np.clip(log_equity, EQUITY_BINS[0], EQUITY_BINS[-1]), EQUITY_BINS)[0]
+
+    return ruined, drawdown_hist, equity_hist
+
+
+def histogram_percentile(counts, edges, q):
+    cumulative = np.cumsum(counts)
+    index = np.searchsorted(cumulative, q / 100 * cumulative[-1])
+    return edges[min(index + 1, len(edges) - 1)]
+
+
+def simulate(outcomes, probabilities=None, risk_percents=DEFAULT_RISK_GRID, n_paths=100000,
+             n_trades=100, ruin_level=0.5, seed=0, chunk_size=20000, workers=None):
+    """Risk of ruin for each risk % in the grid.
+
+    Paths draw trade outcomes (in R) with replacement from `outcomes`,
+    weighted by `probabilities` if given. A path is ruined once equity falls
+    to 1 - ruin_level of the start. Chunks are seeded from one SeedSequence,
+    so results depend only on the seed, not on the number of workers.
+    """
+    outcomes = np.asarray(outcomes, dtype=float)
+    if not len(outcomes):
+        raise ValueError("No trade outcomes to sample from")
+    risk_fractions = np.asarray(risk_percents, dtype=float) / 100
+
+    sizes = [chunk_size] * (n_paths // chunk_size)
+    if n_paths % chunk_size:
+        sizes.append(n_paths % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    ruined = np.zeros(len(risk_fractions), dtype=np.int64)
+    drawdown_hist = np.zeros((len(risk_fractions), len(DRAWDOWN_BINS) - 1), dtype=np.int64)
+    equity_hist = np.zeros((len(risk_fractions), len(EQUITY_BINS) - 1), dtype=np.int64)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(simulate_chunk, outcomes, probabilities, risk_fractions, size, n_trades, ruin_level, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+        for future in futures:
+            chunk_ruined, chunk_drawdowns, chunk_equity = future.result()
+            ruined += chunk_ruined
+            drawdown_hist += chunk_drawdowns
+            equity_hist += chunk_equity
+
+    results = []
+    for i, risk in enumerate(risk_percents):
+        row = {
+            'risk_percent': risk,
+            'ruin_probability': ruined[i] / n_paths,
+            'median_terminal_equity': 10 ** histogram_percentile(equity_hist[i], EQUITY_BINS, 50)
+        }
+        for q in DRAWDOWN_PERCENTILES:
+            row[f'drawdown_p{q}'] = histogram_percentile(drawdown_hist[i], DRAWDOWN_BINS, q)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo risk of ruin for a grid of risk per trade")
+    parser.add_argument('--win-rate', type=float, help="Use a fixed win rate (0-1) instead of the journal")
+    parser.add_argument('--payoff', type=float, default=2.0, help="R won on a winning trade, with --win-rate")
+    parser.add_argument('--journal', default='trade_journal.db', help="Journal to bootstrap R-multiples from")
+    parser.add_argument('--risk', type=float, nargs='+', default=DEFAULT_RISK_GRID, help="Risk per trade, %%")
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--trades', type=int, default=100, help="Trades per path")
+    parser.add_argument('--ruin', type=float, default=0.5, help="Drawdown from start that counts as ruin (0-1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    # Opening a missing journal would create an empty one
+    if args.win_rate is None and not os.path.exists(args.journal):
+        parser.error(f"No journal at {args.journal}")
+
+    if args.win_rate is not None:
+        outcomes, probabilities = win_payoff_outcomes(args.win_rate, args.payoff)
+        source = f"win rate {args.win_rate:.0%}, payoff {args.payoff}R"
+    else:
+        from trade_journal import TradeJournal
+
+        outcomes, probabilities = journal_r_multiples(TradeJournal(args.journal)), None
+        source = f"{len(outcomes)} closed trades in {args.journal}"
+
+    start = time.perf_counter()
+    results = simulate(outcomes, probabilities, args.risk, args.paths, args.trades, args.ruin, args.seed,
+                       workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.paths:,} paths x {args.trades} trades from {source} ({elapsed:.1f}s)")
+    print(f"{'Risk %':>7} {'P(ruin)':>9} {'DD p50':>8} {'DD p95':>8} {'DD p99':>8} {'Median equity':>14}")
+    for row in results:
+        print(f"{row['risk_percent']:>7.2f} {row['ruin_probability']:>9.2%} {row['drawdown_p50']:>8.1%} "
+              f"{row['drawdown_p95']:>8.1%} {row['drawdown_p99']:>8.1%} {row['median_terminal_equity']:>13.2f}x")
+
+
+if __name__ == "__main__":
+    main()
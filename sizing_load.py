@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+from instrumentation import Histogram, QUANTILES
+
+
+def size_request(rng):
+    return {
+        'capital': rng.uniform(1000, 100000),
+        'risk_percent': rng.uniform(0.5, 5),
+        'stop_loss_percent': rng.uniform(0.2, 4),
+        'leverage': rng.choice([None, 5, 8, 10])
+    }
+
+
+def journal_request(rng):
+    return {
+        'Symbol': rng.choice(['BTCUSDT', 'ETHUSDT', 'SOLUSDT']),
+        'Direction': rng.choice(['LONG', 'SHORT']),
+        'Entry Price': rng.uniform(1, 1000),
+        'Position Size': rng.uniform(100, 10000),
+        'Notes': 'load test'
+    }
+
+
+async def client(host, port, path, make_body, deadline, stats, seed):
+    # One keep-alive connection sending requests back to back
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            body = json.dumps(make_body(rng)).encode() if make_body else b''
+            method = 'POST' if make_body else 'GET'
+            start = time.perf_counter()
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            stats['latency'].observe(time.perf_counter() - start)
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(url, connections, duration, endpoint):
+    parts = urlsplit(url)
+    path, make_body = {
+        'size': ('/size', size_request),
+        'leverage': ('/leverage?stop_loss_percent=2', None),
+        'journal': ('/journal', journal_request)
+    }[endpoint]
+    stats = {'latency': Histogram(), 'statuses': {}}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(parts.hostname, parts.port or 80, path, make_body, deadline, stats, seed)
+        for seed in range(connections)
+    ))
+    return stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running sizing_service.py")
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--endpoint', choices=['size', 'leverage', 'journal'], default='size')
+    parser.add_argument('-c', '--connections', type=int, default=64, help="Concurrent keep-alive clients")
+    parser.add_argument('-d', '--duration', type=float, default=10, help="Seconds to run")
+    parser.add_argument('--max-p99-ms', type=float, help="Exit 1 if p99 latency is above this")
+    args = parser.parse_args()
+
+    stats, elapsed = asyncio.run(run(args.url, args.connections, args.duration, args.endpoint))
+    latency = stats['latency']
+    print(f"{latency.count:,} requests in {elapsed:.1f}s over {args.connections} connections: "
+          f"{latency.count / elapsed:,.0f} req/s")
+    print("Latency " + ", ".join(f"p{int(q * 100)} {latency.quantile(q) * 1000:.2f} ms" for q in QUANTILES)
+          + f", max {latency.max * 1000:.2f} ms")
+    print("Statuses " + ", ".join(f"{status}: {count:,}" for status, count in sorted(stats['statuses'].items())))
+
+    failed = sum(count for status, count in stats['statuses'].items() if status != 200)
+    if failed or (args.max_p99_ms is not None and latency.quantile(0.99) * 1000 > args.max_p99_ms):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
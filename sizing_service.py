@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from position_sizing import size_positions, INPUT_COLUMNS
+from trade_journal import TradeJournal, JOURNAL_COLUMNS, COLUMN_TYPES
+from contract_specs import ContractSpecFile
+from leverage_rules import shared_rules
+
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# Extra /size response fields when a request names a symbol, from ContractSpecs.quantities
+ORDER_FIELDS = {'quantity': 'quantity', 'order_price': 'price', 'order_notional': 'notional',
+                'exchange_max_leverage': 'max_leverage'}
+
+# A journal append must name at least these; the rest default like the window's
+REQUIRED_TRADE_FIELDS = ['Symbol', 'Direction', 'Entry Price', 'Position Size']
+# Journal columns stored as numbers, and those that must be above 0 when given
+NUMERIC_TRADE_FIELDS = [c for c in JOURNAL_COLUMNS if COLUMN_TYPES[c] == 'REAL']
+POSITIVE_TRADE_FIELDS = ['Entry Price', 'Position Size', 'Stop Loss', 'Leverage', 'Exit Price']
+DIRECTIONS = ['LONG', 'SHORT']
+STATUSES = ['OPEN', 'CLOSED']
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Collects concurrent submissions and hands them to `process` as one list.
+
+    A batch is sent when it reaches max_batch or max_delay seconds after its
+    first item, whichever comes first; with max_delay=0 it goes on the next
+    loop iteration, which batches whatever arrived together at no extra
+    latency. `process` maps a list of items to a list of results. With
+    in_thread it runs in the default executor, for blocking work like
+    journal writes.
+    """
+
+    def __init__(self, process, max_batch=1024, max_delay=0.0, in_thread=False):
+        self.process = process
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.in_thread = in_thread
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = (loop.call_later(self.max_delay, self.flush) if self.max_delay
+                          else loop.call_soon(self.flush))
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        items = [item for item, _ in batch]
+        if self.in_thread:
+            task = asyncio.ensure_future(self.run_in_thread(batch, items))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            return
+        try:
+            results = self.process(items)
+        except Exception as e:
+            results = e
+        self.resolve(batch, results)
+
+    async def run_in_thread(self, batch, items):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(None, self.process, items)
+        except Exception as e:
+            results = e
+        self.resolve(batch, results)
+
+    def resolve(self, batch, results):
+        # An exception fails every request in the batch
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue  # The client went away
+            if isinstance(results, Exception):
+                future.set_exception(results)
+            else:
+                future.set_result(results[index])
+
+
+def number(value, name):
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name} must be a number")
+
+
+def journal_trade(item):
+    # A trade as the window would log it, or HttpError 400; bad values never reach the journal
+    missing = [f for f in REQUIRED_TRADE_FIELDS if item.get(f) is None]
+    if missing:
+        raise HttpError(400, f"Missing fields: {', '.join(missing)}")
+    trade = {c: item.get(c) for c in JOURNAL_COLUMNS}
+    for field in NUMERIC_TRADE_FIELDS:
+        if trade[field] is None:
+            continue
+        value = number(trade[field], field)
+        if not np.isfinite(value):
+            raise HttpError(400, f"{field} must be a finite number")
+        if field in POSITIVE_TRADE_FIELDS and value <= 0:
+            raise HttpError(400, f"{field} must be above 0")
+        trade[field] = value
+    trade['Symbol'] = str(trade['Symbol']).strip().upper()
+    trade['Direction'] = str(trade['Direction']).strip().upper()
+    if trade['Direction'] not in DIRECTIONS:
+        raise HttpError(400, f"Direction must be one of {', '.join(DIRECTIONS)}")
+    trade['Status'] = str(trade['Status'] or 'OPEN').strip().upper()
+    if trade['Status'] not in STATUSES:
+        raise HttpError(400, f"Status must be one of {', '.join(STATUSES)}")
+    if trade['Status'] == 'CLOSED' and (trade['Exit Price'] is None or trade['Profit/Loss'] is None):
+        raise HttpError(400, "A CLOSED trade needs Exit Price and Profit/Loss")
+    trade['Date'] = str(trade['Date'] or datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    if trade['Notes'] is not None:
+        trade['Notes'] = str(trade['Notes'])
+    return trade
+
+
+def size_batch(requests, specs=None, rules=None, account=None):
+    # One size_positions call for the whole batch; leverage left out means
+    # the largest the stop loss allows for the symbol
+    if rules is None:
+        rules = shared_rules().current()
+    capital, risk, stop, leverage = (np.array([r[c] for r in requests]) for c in INPUT_COLUMNS)
+    symbols = None
+    if any(r.get('symbol') for r in requests):
+        symbols = np.array([r.get('symbol') for r in requests], dtype=object)
+    leverage = np.where(np.isnan(leverage), rules.max_leverage_array(stop, symbols, account), leverage)
+    result = size_positions(capital, risk, stop, leverage, rules, symbols, account)
+    columns = {name: values.tolist() for name, values in result.items()}
+    columns['leverage'] = leverage.tolist()
+    ordered = [i for i, r in enumerate(requests) if r.get('symbol')]
+    if specs is not None and ordered:
+        # Orderable quantities for the requests that name a symbol and price
+        orders = specs.quantities([requests[i]['symbol'] for i in ordered], result['position_size'][ordered],
+                                  [requests[i]['entry_price'] for i in ordered])
+        for name, key in ORDER_FIELDS.items():
+            values = [None] * len(requests)
+            for i, value in zip(ordered, orders[key].tolist()):
+                values[i] = value
+            columns[name] = values
+    return [
+        {name: (None if value != value else value) for name, value in zip(columns, row)}
+        for row in zip(*columns.values())
+    ]
+
+
+def leverage_for(stop_loss, rules, symbol=None, account=None):
+    if stop_loss != stop_loss:
+        return None
+    return rules.max_leverage(stop_loss, symbol, account)
+
+
+class SizingService:
+    """Position sizing, leverage caps and journal appends over HTTP/JSON.
+
+    POST /size           {"capital", "risk_percent", "stop_loss_percent", "leverage"?} or a list of them;
+                         with "symbol" and "entry_price" also the orderable quantity
+    GET  /leverage       ?stop_loss_percent=2&symbol=BTCUSDT  (or POST the same as JSON; symbol optional)
+    POST /journal        a trade with journal column names, or a list, checked like the window's;
+                         returns the new ids
+    GET  /health
+
+    Sizing requests from all connections are micro-batched into vectorized
+    calls, journal appends into one transaction per batch. At most
+    max_concurrency requests are handled at once; once max_waiting more are
+    queued behind them, new ones get 503 straight away, which keeps latency
+    bounded under overload instead of letting the queue grow.
+    """
+
+    def __init__(self, journal=None, max_concurrency=256, max_waiting=4096, max_batch=1024, max_delay=0.0,
+                 metrics=None, specs=None, rules=None, account=None):
+        self.journal = journal
+        self.metrics = metrics
+        # A ContractSpecFile, so spec edits apply without a restart
+        self.specs = specs
+        # A LeverageRuleFile, the same way; account picks its tiers and limits
+        self.rules = rules or shared_rules()
+        self.account = account
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.sizer = MicroBatcher(self.size_batch, max_batch, max_delay)
+        self.writer = MicroBatcher(self.append_batch, max_batch, max_delay, in_thread=True)
+        self.routes = {
+            '/size': self.size,
+            '/leverage': self.leverage,
+            '/journal': self.append,
+            '/health': self.health
+        }
+
+    async def size(self, method, query, body):
+        if method != 'POST':
+            raise HttpError(405, "Use POST")
+        items = body if isinstance(body, list) else [body]
+        requests = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise HttpError(400, "Expected a JSON object")
+            request = {c: number(item.get(c), c) for c in INPUT_COLUMNS}
+            if item.get('symbol') is not None:
+                request['symbol'] = str(item['symbol']).strip().upper()
+                request['entry_price'] = number(item.get('entry_price'), 'entry_price')
+            requests.append(request)
+        results = await asyncio.gather(*(self.sizer.submit(r) for r in requests))
+        return results if isinstance(body, list) else results[0]
+
+    async def leverage(self, method, query, body):
+        if method == 'GET':
+            body = {k: v[0] for k, v in query.items()}
+        body = body or {}
+        stop_loss = number(body.get('stop_loss_percent'), 'stop_loss_percent')
+        symbol = str(body['symbol']).strip().upper() if body.get('symbol') is not None else None
+        rules = self.rules.current()
+        suggested = leverage_for(stop_loss, rules, symbol, self.account)
+        if suggested is None:
+            max_stop = rules.table(symbol, self.account).max_stop_loss
+            raise HttpError(400, f"stop_loss_percent must be above 0 and at most {max_stop:g}")
+        return {'stop_loss_percent': stop_loss, 'suggested_leverage': suggested, 'max_leverage': suggested}
+
+    async def append(self, method, query, body):
+        if method != 'POST':
+            raise HttpError(405, "Use POST")
+        if self.journal is None:
+            raise HttpError(404, "Journal appends are disabled")
+        items = body if isinstance(body, list) else [body]
+        trades = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise HttpError(400, "Expected a JSON object")
+            trades.append(journal_trade(item))
+        ids = await asyncio.gather(*(self.writer.submit(t) for t in trades))
+        return {'ids': ids} if isinstance(body, list) else {'id': ids[0]}
+
+    def size_batch(self, requests):
+        return size_batch(requests, self.specs.current() if self.specs is not None else None,
+                          self.rules.current(), self.account)
+
+    def append_batch(self, trades):
+        # Executor thread: every append from the batch in one transaction
+        return self.journal.append_many(trades)
+
+    async def health(self, method, query, body):
+        return {'status': 'ok', 'batches': self.sizer.batches, 'sized': self.sizer.items,
+                'waiting': self.waiting}
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            raise HttpError(404, f"No route {url.path}")
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+
+        if self.semaphore.locked() and self.waiting >= self.max_waiting:
+            raise HttpError(503, "Too many requests in flight")
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            start = time.perf_counter()
+            result = await handler(method, parse_qs(url.query), payload)
+            if self.metrics is not None:
+                self.metrics.observe('service' + url.path.replace('/', '.'), time.perf_counter() - start)
+            return result
+        finally:
+            self.semaphore.release()
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive; one request at a time per connection
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 413, {'error': "Headers too large"}, False)
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "Bad request line"}, False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, {'error': "Bad Content-Length"}, False)
+                    return
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {'error': "Body too large"}, False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, result = 200, await self.dispatch(method, target, body)
+                except HttpError as e:
+                    status, result = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, result = 500, {'error': str(e)}
+                await self.respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, result, keep_alive):
+        body = json.dumps(result).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES,
+                                            backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve position sizing, leverage caps and journal appends over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--journal', default='trade_journal.db', help="Journal for POST /journal")
+    parser.add_argument('--no-journal', action='store_true', help="Disable POST /journal")
+    parser.add_argument('--specs', default='contract_specs.json', help="Contract specs for orderable quantities")
+    parser.add_argument('--rules', default='leverage_rules.json', help="Leverage tiers and input limits")
+    parser.add_argument('--account', help="Use this account's tiers and limits from the rule file")
+    parser.add_argument('--max-concurrency', type=int, default=256, help="Requests handled at once")
+    parser.add_argument('--max-waiting', type=int, default=4096, help="Requests queued before answering 503")
+    parser.add_argument('--max-batch', type=int, default=1024, help="Largest micro-batch")
+    parser.add_argument('--max-delay-ms', type=float, default=0.0,
+                        help="How long a batch waits for company; 0 batches what arrives together")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="Serve per-route latency in Prometheus format on localhost:PORT")
+    args = parser.parse_args()
+
+    metrics = None
+    if args.metrics_port:
+        from instrumentation import Metrics
+
+        metrics = Metrics()
+        metrics.serve(args.metrics_port)
+
+    journal = None if args.no_journal else TradeJournal(args.journal)
+
+    async def run():
+        service = SizingService(journal, args.max_concurrency, args.max_waiting, args.max_batch,
+                                args.max_delay_ms / 1000, metrics, ContractSpecFile(args.specs),
+                                shared_rules(args.rules), args.account)
+        print(f"Serving on http://{args.host}:{args.port}")
+        await service.serve(args.host, args.port)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == "__main__":
+    main()
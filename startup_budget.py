@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Libraries the calculator only needs after the window is up
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'PIL']
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import Trading_calculator
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed * 1000, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+WINDOW_PROBE = """
+import json, time
+start = time.perf_counter()
+import tkinter as tk
+import Trading_calculator
+root = tk.Tk()
+app = Trading_calculator.PositionSizeCalculator(root)
+root.update()
+print(json.dumps([(time.perf_counter() - start) * 1000, []]))
+root.destroy()
+"""
+
+
+def run_probe(code):
+    # Run from an empty directory so the probe never touches the real journal
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here)
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=workdir, env=env, capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def measure(probe, runs):
+    # Best of several runs, so a busy machine doesn't fail the budget
+    best, heavy = None, set()
+    for _ in range(runs):
+        elapsed, modules = run_probe(probe)
+        best = elapsed if best is None else min(best, elapsed)
+        heavy.update(modules)
+    return best, sorted(heavy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if starting the calculator got slower")
+    parser.add_argument('--import-budget', type=float, default=100, help="Max import time in ms")
+    parser.add_argument('--window-budget', type=float, default=200, help="Max time until the window is drawn, in ms")
+    parser.add_argument('--runs', type=int, default=5, help="Best of this many fresh interpreters")
+    args = parser.parse_args()
+
+    failures = []
+
+    import_ms, heavy = measure(IMPORT_PROBE.format(heavy=HEAVY_MODULES), args.runs)
+    print(f"import Trading_calculator: {import_ms:.1f} ms (budget {args.import_budget:.0f} ms)")
+    if import_ms > args.import_budget:
+        failures.append("import time over budget")
+    if heavy:
+        failures.append("imported at startup: " + ', '.join(heavy))
+
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        window_ms, _ = measure(WINDOW_PROBE, args.runs)
+        print(f"window ready: {window_ms:.1f} ms (budget {args.window_budget:.0f} ms)")
+        if window_ms > args.window_budget:
+            failures.append("window startup over budget")
+    else:
+        print("window ready: skipped, no display")
+
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
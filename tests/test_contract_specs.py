@@ -0,0 +1,35 @@
+import numpy as np
+
+from contract_specs import ContractSpecs
+
+SPECS = ContractSpecs({
+    'BTCUSDT': {'Tick Size': 0.1, 'Lot Size': 0.001, 'Min Qty': 0.001, 'Max Leverage': 125},
+    'PEPEUSDT': {'Tick Size': 0.0000001, 'Lot Size': 100, 'Min Qty': 100, 'Max Leverage': 50},
+    'SOLUSDT': {'Tick Size': 0.01, 'Lot Size': 0.1, 'Min Qty': 0.1, 'Max Leverage': 75},
+    'ETHUSDT': {'Tick Size': 0.5, 'Lot Size': 0.01, 'Min Qty': 0.01, 'Max Leverage': 100}
+})
+
+
+def test_quantities_match_order_row_for_row():
+    # Symbols with different decimals, one without a spec, and prices below half a tick
+    rng = np.random.default_rng(0)
+    rows = 20000
+    symbols = rng.choice(SPECS.symbols + ['NOSPECUSDT'], rows).tolist()
+    position_size = rng.uniform(1, 1e5, rows)
+    price = 10 ** rng.uniform(-8, 5, rows)
+    batch = SPECS.quantities(symbols, position_size, price)
+
+    for i, symbol in enumerate(symbols):
+        order = SPECS.order(symbol, 'LONG', position_size[i], price[i], 1.0)
+        got = tuple(batch[key][i].item() for key in ('quantity', 'price', 'notional'))
+        if order is None:
+            assert np.isnan(got[0]), (symbol, price[i])
+        else:
+            assert got == (order['quantity'], order['price'], order['notional']), (symbol, price[i])
+
+
+def test_quantity_rounds_to_lot_decimals():
+    # 0.3 / 0.1 must not floor to 2 lots, nor come out as 0.30000000000000004
+    batch = SPECS.quantities(['SOLUSDT'], [30.0], [100.0])
+    assert batch['quantity'].tolist() == [0.3]
+    assert batch['notional'].tolist() == [30.0]
@@ -0,0 +1,28 @@
+import threading
+
+import pytest
+
+from file_lock import FileLock
+
+
+def test_failed_acquire_releases_the_thread_lock(tmp_path):
+    lock = FileLock(str(tmp_path / 'missing' / 'journal.lock'))
+    with pytest.raises(OSError):
+        lock.acquire()
+
+    # Another thread must not block on the lock the failed call took
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(lock.thread_lock.acquire(timeout=1)))
+    thread.start()
+    thread.join()
+    assert acquired == [True]
+
+
+def test_lock_is_reentrant(tmp_path):
+    lock = FileLock(str(tmp_path / 'journal.lock'))
+    with lock:
+        with lock:
+            assert lock.depth == 2
+    assert lock.depth == 0
+    assert lock.counts['acquired'] == 1
+    lock.close()
@@ -0,0 +1,48 @@
+import pytest
+
+from import_trades import FORMATS, import_file, parse_optional_number
+from trade_journal import TradeJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TradeJournal(str(tmp_path / 'journal.db'), str(tmp_path / 'journal.xlsx'))
+    yield journal
+    journal.close()
+
+
+def test_parse_optional_number():
+    assert parse_optional_number('12.5 USDT') == 12.5
+    assert parse_optional_number('1,234.5') == 1234.5
+    assert parse_optional_number('') is None
+    assert parse_optional_number('  ') is None
+    assert parse_optional_number('--') is None
+
+
+def test_blank_pnl_cell_falls_back_to_prices(journal, tmp_path):
+    path = tmp_path / 'fills.csv'
+    path.write_text(
+        'time,symbol,side,price,quantity,fee,pnl\n'
+        '2024-01-01T00:00:00,BTCUSDT,BUY,100,2,1,\n'
+        '2024-01-01T01:00:00,BTCUSDT,SELL,110,2,1,\n'
+    )
+    stats = import_file(journal, str(path), FORMATS['generic'], order='asc')
+
+    assert stats['trades'] == 1
+    (trade,) = journal.iter_rows()
+    assert trade['Status'] == 'CLOSED'
+    # (110 - 100) * 2 from the prices, less both fees
+    assert trade['Profit/Loss'] == pytest.approx(18.0)
+
+
+def test_pnl_column_is_used_when_filled(journal, tmp_path):
+    path = tmp_path / 'fills.csv'
+    path.write_text(
+        'time,symbol,side,price,quantity,fee,pnl\n'
+        '2024-01-01T00:00:00,BTCUSDT,BUY,100,2,1,0\n'
+        '2024-01-01T01:00:00,BTCUSDT,SELL,110,2,1,25\n'
+    )
+    import_file(journal, str(path), FORMATS['generic'], order='asc')
+
+    (trade,) = journal.iter_rows()
+    assert trade['Profit/Loss'] == pytest.approx(23.0)
@@ -0,0 +1,54 @@
+import pytest
+
+from journal_analytics import JournalStats
+from trade_journal import TradeJournal
+
+TRADE = {'Date': '2024-01-01 00:00:00', 'Symbol': 'BTCUSDT', 'Direction': 'LONG', 'Entry Price': 100.0,
+         'Position Size': 1000.0, 'Risk Amount': 10.0, 'Status': 'OPEN'}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TradeJournal(str(tmp_path / 'journal.db'), str(tmp_path / 'journal.xlsx'))
+    yield journal
+    journal.close()
+
+
+def sync(stats, journal):
+    stats.catch_up(list(journal.iter_rows('id > ?', (stats.last_id,))), journal.updates_since(stats.update_seq))
+
+
+def test_out_of_order_closes_match_a_recompute(journal):
+    # Closed out of id order, with a trade logged already closed between them
+    stats = JournalStats()
+    first, second, third = journal.append_many([dict(TRADE) for _ in range(3)])
+    sync(stats, journal)
+    journal.close_trade(third, 90.0)  # -100
+    sync(stats, journal)
+    journal.append(dict(TRADE, Status='CLOSED', **{'Exit Price': 105.0, 'Profit/Loss': 50.0}))
+    sync(stats, journal)
+    journal.close_trade(first, 115.0)  # +150
+    journal.close_trade(second, 95.0)  # -50
+    sync(stats, journal)
+
+    expected = JournalStats.recompute(list(journal.iter_rows()), journal.updates_since(0))
+    assert stats.state() == expected.state()
+    # Close order: -100, +50, +150, -50; in id order the drawdown would be 150
+    assert stats.max_drawdown == pytest.approx(100.0)
+
+
+def test_batching_does_not_change_the_fold(journal):
+    ids = journal.append_many([dict(TRADE) for _ in range(4)])
+    for trade_id, exit_price in zip(reversed(ids), [95.0, 120.0, 80.0, 101.0]):
+        journal.close_trade(trade_id, exit_price)
+
+    one_shot = JournalStats()
+    sync(one_shot, journal)
+    expected = JournalStats.recompute(list(journal.iter_rows()), journal.updates_since(0))
+    assert one_shot.state() == expected.state()
+
+
+def test_breakeven_only_has_no_profit_factor():
+    stats = JournalStats()
+    stats.add_trade(dict(TRADE, id=1, Status='CLOSED', **{'Profit/Loss': 0.0}))
+    assert stats.summary()['profit_factor'] is None
@@ -0,0 +1,30 @@
+import pytest
+
+from journal_cache import JournalCache
+from journal_export import filter_condition
+from trade_journal import TradeJournal
+
+DATES = ['2024-02-29 23:59:59', '2024-03-01 00:00:00', '2024-03-01', '2024-03-15T12:00:00', '2024-03-31 23:59:59',
+         '2024-04-01 00:00:00', None, 'not a date', '2024-04-02 08:30:00']
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TradeJournal(str(tmp_path / 'journal.db'), str(tmp_path / 'journal.xlsx'))
+    journal.append_many([{'Date': date, 'Symbol': 'BTCUSDT', 'Direction': 'LONG', 'Entry Price': 100.0,
+                          'Position Size': 1000.0, 'Status': 'OPEN'} for date in DATES])
+    yield journal
+    journal.close()
+
+
+@pytest.mark.parametrize('start, end', [('2024-03', '2024-04'), ('2024-03-01 00:00', None), (None, '2024-03-15 12:00'),
+                                        ('2024-03-15', '2024-04-01 00:00:01')])
+def test_export_filter_matches_the_viewer(journal, tmp_path, start, end):
+    cache = JournalCache(journal, str(tmp_path / 'cache')).open()
+    shown = cache.column('id')[cache.select(start=start, end=end)].tolist()
+    exported = [trade['id'] for trade in journal.iter_rows(*filter_condition(start=start, end=end))]
+    assert sorted(shown) == exported
+
+
+def test_export_never_replaces_the_migration_source(journal):
+    assert journal.export_file != journal.excel_file
@@ -0,0 +1,393 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+
+from file_lock import FileLock
+
+# Journal columns, in the order the Excel export uses
+JOURNAL_COLUMNS = [
+    'Date', 'Symbol', 'Direction', 'Entry Price', 'Position Size',
+    'Stop Loss', 'Risk Amount', 'Leverage', 'Status',
+    'Exit Price', 'Profit/Loss', 'Notes'
+]
+
+COLUMN_TYPES = {
+    'Date': 'TEXT',
+    'Symbol': 'TEXT',
+    'Direction': 'TEXT',
+    'Entry Price': 'REAL',
+    'Position Size': 'REAL',
+    'Stop Loss': 'REAL',
+    'Risk Amount': 'REAL',
+    'Leverage': 'REAL',
+    'Status': 'TEXT',
+    'Exit Price': 'REAL',
+    'Profit/Loss': 'REAL',
+    'Notes': 'TEXT'
+}
+
+# Where insert_rows finds whether a row is logged already closed
+STATUS_INDEX = JOURNAL_COLUMNS.index('Status')
+PNL_INDEX = JOURNAL_COLUMNS.index('Profit/Loss')
+
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def trade_pnl(direction, entry_price, position_size, exit_price):
+    # Position Size is the dollar notional at entry
+    if not entry_price or position_size is None or exit_price is None:
+        return None
+    sign = 1 if direction == 'LONG' else -1
+    return sign * position_size * (exit_price / entry_price - 1)
+
+
+def clean_value(value):
+    # pandas hands back NaN for empty cells and numpy scalars for numbers
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+        if isinstance(value, float) and value != value:
+            return None
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+class TradeJournal:
+    """SQLite trade store; the Excel workbook is only an export.
+
+    Trades are appended with stable ids. The only change made afterwards is
+    closing a trade, which updates that one row and records the id in
+    trade_updates, so caches can replay closes made by other processes. A
+    trade appended already closed gets its trade_updates entry on insert,
+    so every close has a seq and the seqs give the order trades closed in.
+
+    Several processes can share one journal: the database runs in WAL mode,
+    so readers never block, and every write transaction holds write_lock,
+    a lock file next to the database, so writers queue in the OS instead of
+    retrying on SQLITE_BUSY. write_lock.counts has the wait and hold times.
+    """
+
+    def __init__(self, db_file='trade_journal.db', excel_file='trade_journal.xlsx'):
+        self.db_file = db_file
+        # Only read, to migrate older journals; exports go to export_file so they never replace it
+        self.excel_file = excel_file
+        self.export_file = os.path.splitext(excel_file)[0] + '_export.xlsx'
+        self.lock = threading.RLock()
+        self.write_lock = FileLock(db_file + '.lock', 'journal')
+        self.conn = None
+
+    def initialize(self):
+        with self.lock:
+            if self.conn is not None:
+                return
+            # The busy timeout only matters for writers that skip write_lock
+            conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+            try:
+                with self.write_lock:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    columns = ', '.join(f'{quote(c)} {COLUMN_TYPES[c]}' for c in JOURNAL_COLUMNS)
+                    conn.execute(f'CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY, {columns})')
+                    conn.execute('CREATE INDEX IF NOT EXISTS trades_status ON trades (Status)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS trades_symbol_date ON trades (Symbol, Date)')
+                    conn.execute('CREATE TABLE IF NOT EXISTS trade_updates '
+                                 '(seq INTEGER PRIMARY KEY, trade_id INTEGER NOT NULL)')
+                    conn.commit()
+                    self.conn = conn
+
+                    # The import runs in one transaction, so an interrupted migration
+                    # leaves the table empty and is simply retried on the next start.
+                    # Holding the lock means only one process migrates
+                    empty = conn.execute('SELECT 1 FROM trades LIMIT 1').fetchone() is None
+                    if empty and os.path.exists(self.excel_file):
+                        self.migrate_excel()
+            except Exception:
+                self.conn = None
+                conn.close()
+                raise
+
+    def migrate_excel(self):
+        # One-off import of a journal written by older versions
+        import pandas as pd
+
+        df = pd.read_excel(self.excel_file)
+        for column in JOURNAL_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+        rows = ([clean_value(v) for v in row] for row in df[JOURNAL_COLUMNS].itertuples(index=False))
+        self.insert_rows(rows)
+
+    def insert_rows(self, rows):
+        # All rows go in one transaction; returns the new trade ids in order
+        placeholders = ', '.join('?' for _ in JOURNAL_COLUMNS)
+        columns = ', '.join(quote(c) for c in JOURNAL_COLUMNS)
+        sql = f'INSERT INTO trades ({columns}) VALUES ({placeholders})'
+        with self.lock, self.write_lock, self.conn:
+            ids = []
+            closed = []
+            for row in rows:
+                ids.append(self.conn.execute(sql, row).lastrowid)
+                if row[STATUS_INDEX] != 'OPEN' and row[PNL_INDEX] is not None:
+                    closed.append((ids[-1],))
+            self.conn.executemany('INSERT INTO trade_updates (trade_id) VALUES (?)', closed)
+            return ids
+
+    def append(self, trade):
+        return self.append_many([trade])[0]
+
+    def append_many(self, trades):
+        # Each trade dict gets its new 'id'
+        self.initialize()
+        ids = self.insert_rows([clean_value(trade.get(c)) for c in JOURNAL_COLUMNS] for trade in trades)
+        for trade, trade_id in zip(trades, ids):
+            trade['id'] = trade_id
+        return ids
+
+    def count(self, condition='', params=()):
+        self.initialize()
+        where = f'WHERE {condition}' if condition else ''
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM trades {where}', params).fetchone()[0]
+
+    def contains(self, trade):
+        # Same open time, symbol, direction and entry price counts as the same trade
+        self.initialize()
+        with self.lock:
+            return self.conn.execute(
+                'SELECT 1 FROM trades WHERE Symbol = ? AND Date = ? AND Direction = ? AND "Entry Price" = ? LIMIT 1',
+                (trade['Symbol'], trade['Date'], trade['Direction'], trade['Entry Price'])
+            ).fetchone() is not None
+
+    def max_id(self):
+        self.initialize()
+        with self.lock:
+            return self.conn.execute('SELECT MAX(id) FROM trades').fetchone()[0] or 0
+
+    def iter_rows(self, condition='', params=(), page_size=10000):
+        # Streams rows in id order a page at a time, so huge journals never
+        # sit in memory at once and the lock is only held per page
+        self.initialize()
+        columns = ', '.join(quote(c) for c in JOURNAL_COLUMNS)
+        where = f'AND ({condition})' if condition else ''
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f'SELECT id, {columns} FROM trades WHERE id > ? {where} ORDER BY id LIMIT ?',
+                    (last_id, *params, page_size)
+                ).fetchall()
+            for row in rows:
+                yield dict(zip(['id'] + JOURNAL_COLUMNS, row))
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+    def open_trades(self):
+        return list(self.iter_rows('Status = ?', ('OPEN',)))
+
+    def get(self, trade_id):
+        # Primary key lookup
+        self.initialize()
+        columns = ', '.join(quote(c) for c in JOURNAL_COLUMNS)
+        with self.lock:
+            row = self.conn.execute(f'SELECT id, {columns} FROM trades WHERE id = ?', (trade_id,)).fetchone()
+        return dict(zip(['id'] + JOURNAL_COLUMNS, row)) if row else None
+
+    def close_trade(self, trade_id, exit_price):
+        """Closes one open trade at exit_price and returns (seq, trade).
+
+        P&L comes from the direction, entry price and size. Only this row
+        and one trade_updates entry are written; seq is that entry's number.
+        """
+        self.initialize()
+        with self.lock, self.write_lock, self.conn:
+            trade = self.get(trade_id)
+            if trade is None:
+                raise KeyError(f"No trade with id {trade_id}")
+            if trade['Status'] != 'OPEN':
+                raise ValueError(f"Trade {trade_id} is already {trade['Status']}")
+            trade['Status'] = 'CLOSED'
+            trade['Exit Price'] = exit_price
+            trade['Profit/Loss'] = trade_pnl(trade['Direction'], trade['Entry Price'], trade['Position Size'],
+                                             exit_price)
+            # Still OPEN is re-checked here, in case another process closed it meanwhile
+            updated = self.conn.execute(
+                'UPDATE trades SET Status = ?, "Exit Price" = ?, "Profit/Loss" = ? WHERE id = ? AND Status = ?',
+                (trade['Status'], trade['Exit Price'], trade['Profit/Loss'], trade_id, 'OPEN')
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Trade {trade_id} is already closed")
+            seq = self.conn.execute('INSERT INTO trade_updates (trade_id) VALUES (?)', (trade_id,)).lastrowid
+        return seq, trade
+
+    def max_update_seq(self):
+        self.initialize()
+        with self.lock:
+            return self.conn.execute('SELECT MAX(seq) FROM trade_updates').fetchone()[0] or 0
+
+    def updates_since(self, seq):
+        # (seq, trade as it is now) for every change after seq, oldest first
+        self.initialize()
+        columns = ', '.join('t.' + quote(c) for c in JOURNAL_COLUMNS)
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT u.seq, t.id, {columns} FROM trade_updates u JOIN trades t ON t.id = u.trade_id '
+                'WHERE u.seq > ? ORDER BY u.seq',
+                (seq,)
+            ).fetchall()
+        return [(row[0], dict(zip(['id'] + JOURNAL_COLUMNS, row[1:]))) for row in rows]
+
+    def months(self, condition='', params=()):
+        # Distinct YYYY-MM of the matching trades' dates, oldest first
+        self.initialize()
+        where = f'WHERE {condition}' if condition else ''
+        with self.lock:
+            rows = self.conn.execute(f'SELECT DISTINCT substr(Date, 1, 7) FROM trades {where} ORDER BY 1',
+                                     params).fetchall()
+        return [row[0] for row in rows]
+
+    def export_excel(self, path=None, **filters):
+        # Streams the journal into the workbook; filters are those of journal_export.export_journal
+        from journal_export import export_journal
+
+        path = path or self.export_file
+        export_journal(self, path, **filters)
+        return path
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            self.write_lock.close()
+
+
+class JournalWriter:
+    """Writes queued trades on a background thread, one transaction per batch.
+
+    Results are reported on the results queue as (event, payload) pairs for
+    the UI to pick up: ('ready', result of on_ready), ('saved', trades),
+    ('closed', (seq, trade)), ('synced', result of on_change) and
+    ('error', (trades, exc)). Saved trades carry their new 'id'. Closes run
+    in submission order with the appends.
+
+    on_ready runs on the writer thread right after the journal is opened.
+    on_change runs after each batch that wrote something, or when
+    request_sync() asks, to pick up changes from this and other processes;
+    a falsy result is not reported.
+    """
+
+    STOP = object()
+
+    def __init__(self, journal, max_batch=500, on_ready=None, on_change=None):
+        self.journal = journal
+        self.on_ready = on_ready
+        self.on_change = on_change
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.results = queue.Queue()
+        self.closed = False
+        self.submit_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name='journal-writer', daemon=True)
+        self.thread.start()
+        # Flush whatever is queued even if the window was never closed cleanly
+        atexit.register(self.close)
+
+    def submit(self, trade):
+        with self.submit_lock:
+            if self.closed:
+                raise RuntimeError("Journal writer is closed")
+            self.queue.put(trade)
+
+    def submit_close(self, trade_id, exit_price):
+        self.submit(('close', trade_id, exit_price))
+
+    def request_sync(self):
+        self.submit(('sync',))
+
+    def run(self):
+        try:
+            self.journal.initialize()
+            self.results.put(('ready', self.on_ready() if self.on_ready else None))
+        except Exception as e:
+            self.results.put(('error', ([], e)))
+
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is self.STOP:
+                break
+
+            # Take everything else already waiting, up to one batch
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self.STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # Appends between two closes go in as one transaction
+            changed = False
+            trades = []
+            for item in batch:
+                if isinstance(item, tuple):
+                    changed |= self.write(trades)
+                    trades = []
+                    if item[0] == 'close':
+                        changed |= self.close_trade(*item[1:])
+                    else:
+                        changed = True
+                else:
+                    trades.append(item)
+            changed |= self.write(trades)
+
+            # The writes are already safe, so a failure here is only reported
+            if changed and self.on_change:
+                try:
+                    result = self.on_change()
+                except Exception as e:
+                    self.results.put(('error', ([], e)))
+                    continue
+                if result:
+                    self.results.put(('synced', result))
+
+    def write(self, batch):
+        if not batch:
+            return False
+        try:
+            self.journal.append_many(batch)
+        except Exception as e:
+            self.results.put(('error', (batch, e)))
+            return False
+        self.results.put(('saved', batch))
+        return True
+
+    def close_trade(self, trade_id, exit_price):
+        try:
+            seq, trade = self.journal.close_trade(trade_id, exit_price)
+        except Exception as e:
+            self.results.put(('error', ([], e)))
+            return False
+        self.results.put(('closed', (seq, trade)))
+        return True
+
+    def close(self):
+        # Blocks until every submitted trade has been written
+        with self.submit_lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(self.STOP)
+        self.thread.join()
+        self.journal.close()
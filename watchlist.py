@@ -0,0 +1,122 @@
+import bisect
+import json
+import os
+
+from file_lock import atomic_write_json
+
+DEFAULT_CATEGORY = "Crypto Pairs"
+DEFAULT_SYMBOLS = [
+    "BTCUSDT", "ETHUSDT", "SUIUSDT", "SEIUSDT", "INJUSDT",
+    "AEVOUSDT", "PYTHUSDT", "BNBUSDT", "APTUSDT",
+    "ZKUSDT", "ZROUSDT",
+    "BSUSDT", "WUSDT", "TIAUSDT", "JUPUSDT"
+]
+
+# Type-ahead shows at most this many matches, however many symbols there are
+MAX_MATCHES = 50
+
+# Older files kept everything under one key
+LEGACY_KEY = "Symbols"
+
+
+class Watchlist:
+    """Symbols grouped by category, each kept in a sorted list.
+
+    Prefix search is two bisects into the sorted list, so it stays well under
+    a millisecond with thousands of symbols. Every symbol belongs to exactly
+    one category.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = {}
+        self.category_of = {}
+        for category, symbols in (categories or {}).items():
+            members = self.categories.setdefault(category, [])
+            for symbol in symbols:
+                symbol = symbol.strip().upper()
+                if symbol and symbol not in self.category_of:
+                    self.category_of[symbol] = category
+                    members.append(symbol)
+            members.sort()
+        self.index = sorted(self.category_of)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, symbol):
+        return symbol in self.category_of
+
+    def add(self, symbol, category=DEFAULT_CATEGORY):
+        symbol = symbol.strip().upper()
+        if not symbol or symbol in self.category_of:
+            return False
+        self.category_of[symbol] = category
+        bisect.insort(self.index, symbol)
+        bisect.insort(self.categories.setdefault(category, []), symbol)
+        return True
+
+    def remove(self, symbol):
+        category = self.category_of.pop(symbol, None)
+        if category is None:
+            return False
+        for symbols in (self.index, self.categories[category]):
+            del symbols[bisect.bisect_left(symbols, symbol)]
+        return True
+
+    def search(self, prefix='', category=None, limit=MAX_MATCHES):
+        # The first `limit` symbols starting with prefix, sorted
+        symbols = self.index if category is None else self.categories.get(category, [])
+        prefix = prefix.strip().upper()
+        start = bisect.bisect_left(symbols, prefix)
+        end = bisect.bisect_left(symbols, prefix + '\U0010ffff', start) if prefix else len(symbols)
+        return symbols[start:min(end, start + limit)]
+
+    def to_json(self):
+        return {category: list(symbols) for category, symbols in self.categories.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        categories = {key: value for key, value in data.items() if key != LEGACY_KEY}
+        if LEGACY_KEY in data:
+            categories.setdefault(DEFAULT_CATEGORY, [])
+            categories[DEFAULT_CATEGORY] = categories[DEFAULT_CATEGORY] + data[LEGACY_KEY]
+        return cls(categories)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            watchlist = cls({DEFAULT_CATEGORY: DEFAULT_SYMBOLS})
+            watchlist.save(path)
+            return watchlist
+        with open(path, 'r') as f:
+            return cls.from_json(json.load(f))
+
+    def save(self, path):
+        # Write then rename, so a crash never leaves half a watchlist
+        atomic_write_json(path, self.to_json(), indent=4)
+
+
+class DebouncedSaver:
+    """Runs save once Tk has been quiet for delay_ms, however many changes came in."""
+
+    def __init__(self, root, save, delay_ms=1000):
+        self.root = root
+        self.save = save
+        self.delay_ms = delay_ms
+        self.pending = None
+
+    def schedule(self):
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+        self.pending = self.root.after(self.delay_ms, self.flush)
+
+    def flush(self):
+        # Also called on exit, so nothing scheduled is lost
+        if self.pending is None:
+            return
+        self.root.after_cancel(self.pending)
+        self.pending = None
+        self.save()